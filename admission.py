@@ -0,0 +1,252 @@
+"""Admission control and priority queueing of model calls under overload.
+
+When Gemini is slow or the quota is tight, every session used to block in
+the analysis call on an equal footing, so someone whose answers look like a
+crisis waited behind casual check-ins. ``AdmissionQueue`` lets at most
+``workers`` model calls run at once and queues the rest, most urgent first
+by a cheap pre-score from the local heuristic (``pre_score``):
+
+- ``crisis``: a pre-score of at least ``CRISIS_SCORE`` or severe symptoms,
+- ``elevated``: at least ``ELEVATED_SCORE`` or moderate discomfort,
+- ``routine``: everything else.
+
+Within a tier, higher pre-scores go first, then arrival order.
+
+With a ``guard`` (the model's ``rate_limit.ApiGuard``), a request is only
+admitted once the quota has a token for it too. Otherwise, when the quota is
+the bottleneck, admitted calls would queue first-come first-served inside the
+guard and the priority order would be lost. Each admission holds its token
+in the guard's bucket (``TokenBucket.hold``) until the call takes it, so
+waiters polling for tokens at the same time, and background work on the
+same quota such as the mail pool, cannot claim more tokens than there are.
+
+Admitted calls run on the caller's own thread (Streamlit only lets a session
+write to its page from its script thread, and streamed fields are painted as
+they arrive), so the worker pool is a pool of slots rather than of threads.
+
+Under overload a request is shed, i.e. ``Overloaded`` is raised and the
+caller answers with the instant local fallback instead:
+
+- on arrival, when the estimated wait (requests ahead of it, divided by the
+  throughput of the workers or of the quota, whichever is lower) is over its
+  tier's wait budget,
+- when the queue is full (``max_queue``): the lowest priority request, queued
+  or arriving, makes room,
+- when it has waited out its budget.
+
+Crisis requests get ``crisis_wait`` (long), elevated ones twice ``max_wait``
+and routine ones ``max_wait``. ``stats()`` reports the queue wait of
+admitted requests per tier (p50/p95 from a ``telemetry.Histogram``).
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import registry
+import telemetry
+from rate_limit import RateLimitExceeded
+
+TIERS = ("crisis", "elevated", "routine")
+
+# Roughly the top 10% and the next 20% of a typical day's answers
+CRISIS_SCORE = 160
+ELEVATED_SCORE = 130
+SYMPTOM_POINTS = {"Severe symptoms": 60, "Moderate discomfort": 25}
+
+
+class Overloaded(RateLimitExceeded):
+    """The request was shed by admission control; answer it with the local fallback"""
+
+
+def pre_score(data):
+    """How urgently someone seems to need an answer: the wellness points the
+    local heuristic (``scoring.score``) takes off for stress, low energy and
+    little sleep, without its clamp (which lumps most real answers together
+    at the minimum score), plus points for physical symptoms."""
+    stress_factor = (data['work_pressure'] + data['personal_stress']) / 2
+    points = stress_factor * 10 + (10 - data['energy']) * 8 + (10 - data['sleep']) * 6
+    return points + SYMPTOM_POINTS.get(data.get('physical_symptoms'), 0)
+
+
+def classify(data):
+    """(tier, pre-score) of a questionnaire"""
+    points = pre_score(data)
+    symptoms = data.get('physical_symptoms')
+    if points >= CRISIS_SCORE or symptoms == "Severe symptoms":
+        tier = "crisis"
+    elif points >= ELEVATED_SCORE or symptoms == "Moderate discomfort":
+        tier = "elevated"
+    else:
+        tier = "routine"
+    return tier, points
+
+
+class _Ticket:
+    def __init__(self, tier, points, seq):
+        self.tier = tier
+        self.key = (TIERS.index(tier), -points, seq)
+        self.ready = threading.Event()
+        self.admitted = False
+        self.shed = None  # reason, once shed
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class AdmissionQueue:
+    """Bounded priority queue in front of ``workers`` concurrent model calls."""
+
+    def __init__(self, workers=4, max_queue=32, max_wait=4.0, crisis_wait=30.0, guard=None, poll_interval=0.05):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.guard = guard
+        self.poll_interval = poll_interval  # how often waiters check for new quota tokens
+        self.budgets = {"crisis": crisis_wait, "elevated": 2 * max_wait, "routine": max_wait}
+        self._queue = []  # heap of waiting tickets
+        self._running = 0
+        self._service_time = None  # moving average of call durations, seconds
+        self._seq = itertools.count()
+        self._waits = {tier: telemetry.Histogram() for tier in TIERS}
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "admitted": 0, "queued": 0,
+                          "shed_estimate": 0, "shed_full": 0, "shed_timeout": 0}
+        for tier in TIERS:
+            self._counters[f"{tier}_requests"] = 0
+            self._counters[f"{tier}_shed"] = 0
+
+    def _count(self, name):
+        self._counters[name] += 1
+
+    def _shed(self, ticket, reason):
+        ticket.shed = reason
+        self._count(f"shed_{reason}")
+        self._count(f"{ticket.tier}_shed")
+        ticket.ready.set()
+
+    def _hold_token(self):
+        # With a guard, a call is only admitted with a token held for it
+        return self.guard is None or self.guard.bucket.hold()
+
+    def _admit(self, ticket):
+        ticket.admitted = True
+        self._running += 1
+        ticket.ready.set()
+
+    def _interval(self):
+        # Seconds between admissions at full load
+        interval = (self._service_time or 0.0) / self.workers
+        if self.guard is not None:
+            interval = max(interval, 1.0 / self.guard.bucket.rate)
+        return interval
+
+    def _dispatch(self):
+        while self._queue and self._running < self.workers and self._hold_token():
+            self._admit(heapq.heappop(self._queue))
+
+    def _enqueue(self, data):
+        tier, points = classify(data)
+        ticket = _Ticket(tier, points, next(self._seq))
+        with self._lock:
+            self._count("requests")
+            self._count(f"{tier}_requests")
+            if self._running < self.workers and not self._queue and self._hold_token():
+                self._admit(ticket)
+                return ticket
+            ahead = sum(1 for queued in self._queue if queued < ticket)
+            estimate = (ahead + 1) * self._interval()
+            if estimate > self.budgets[tier]:
+                self._shed(ticket, "estimate")
+                return ticket
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue)
+                if worst < ticket:
+                    self._shed(ticket, "full")
+                    return ticket
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                self._shed(worst, "full")
+            heapq.heappush(self._queue, ticket)
+            self._count("queued")
+        return ticket
+
+    def _wait(self, ticket):
+        deadline = time.monotonic() + self.budgets[ticket.tier]
+        while not ticket.ready.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if self.guard is None:
+                ticket.ready.wait(remaining)
+            elif not ticket.ready.wait(min(remaining, self.poll_interval)):
+                # Tokens come back with time, not with released slots
+                with self._lock:
+                    self._dispatch()
+        with self._lock:
+            if not ticket.admitted and ticket.shed is None:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._shed(ticket, "timeout")
+
+    def _release(self, duration):
+        with self._lock:
+            self._running -= 1
+            if self._service_time is None:
+                self._service_time = duration
+            else:
+                self._service_time = 0.8 * self._service_time + 0.2 * duration
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, data):
+        """Hold one of the call slots for the enclosed model call.
+
+        Blocks in priority order until a slot (and, with a guard, a quota
+        token) is free; raises ``Overloaded``
+        if the request is shed instead. Yields the request's tier.
+        """
+        queued_at = time.perf_counter()
+        ticket = self._enqueue(data)
+        self._wait(ticket)
+        if ticket.shed:
+            raise Overloaded(f"Busy: {ticket.tier} request shed ({ticket.shed})")
+        with self._lock:
+            self._count("admitted")
+        started = time.perf_counter()
+        self._waits[ticket.tier].observe(started - queued_at)
+        bucket = self.guard.bucket if self.guard is not None else None
+        if bucket is not None:
+            # The held token is handed over when the guard takes it for this call
+            bucket.on_next_reserve(bucket.unhold)
+        try:
+            yield ticket.tier
+        finally:
+            if bucket is not None and bucket.on_next_reserve(None) is not None:
+                bucket.unhold()  # the call never reached the guard
+            self._release(time.perf_counter() - started)
+
+    def waiting(self):
+        """Requests queued for a slot or a token"""
+        with self._lock:
+            return len(self._queue)
+
+    def stats(self):
+        """Counters, current depth and running calls, shed ratio and queue wait per tier."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["depth"] = len(self._queue)
+            stats["running"] = self._running
+            stats["reserved"] = self.guard.bucket.held if self.guard is not None else 0
+            stats["service_time_s"] = self._service_time or 0.0
+        shed = stats["shed_estimate"] + stats["shed_full"] + stats["shed_timeout"]
+        stats["shed_ratio"] = shed / stats["requests"] if stats["requests"] else 0.0
+        for tier, waits in self._waits.items():
+            stats[f"{tier}_wait_p50_s"] = waits.quantile(0.5)
+            stats[f"{tier}_wait_p95_s"] = waits.quantile(0.95)
+        return stats
+
+
+def get_admission(name, **kwargs):
+    """The process's admission queue called ``name``"""
+    return registry.shared("admission queue", name, AdmissionQueue, **kwargs)
@@ -0,0 +1,179 @@
+"""Persistent, content-addressed cache for Gemini wellness analyses.
+
+Questionnaire answers come from a small discrete space (1-10 sliders and fixed
+selectbox options), so identical submissions are common. Results are stored in
+SQLite (WAL mode) so several worker processes can share one cache file. ``SharedAnalysisCache``
+keeps it on a ``shared_state`` backend, for replicas on several hosts.
+"""
+import hashlib
+import json
+import threading
+import time
+from functools import partial
+
+import registry
+import shared_state
+from db import ThreadLocalConnections
+
+
+def bucket_weather(weather):
+    """Coarse weather bucket so near-identical forecasts share cache entries"""
+    condition = weather.get('condition', '').lower()
+    if 'rain' in condition or 'shower' in condition or 'storm' in condition:
+        sky = 'rain'
+    elif 'cloud' in condition or 'overcast' in condition:
+        sky = 'cloud'
+    elif 'sun' in condition or 'clear' in condition:
+        sky = 'clear'
+    else:
+        sky = 'other'
+    return {
+        'temp_high': int(weather.get('temp_high', 0)) // 3 * 3,
+        'temp_low': int(weather.get('temp_low', 0)) // 3 * 3,
+        'sky': sky,
+        'rain_chance': int(weather.get('rain_chance', 0)) // 20 * 20,
+    }
+
+
+def cache_key(data, weather, prompt_version):
+    """Canonical hash of the questionnaire, bucketed weather and prompt version"""
+    payload = {
+        'v': prompt_version,
+        'data': data,
+        'weather': bucket_weather(weather),
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed cache with TTL expiry and LRU eviction beyond ``max_entries``."""
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=50000, evict_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+        self._connections = ThreadLocalConnections(path)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS analyses_last_access ON analyses(last_access)")
+
+    def _conn(self):
+        return self._connections.get()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM analyses WHERE key = ? AND created_at > ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        conn.execute("UPDATE analyses SET last_access = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(row[0])
+
+    def put(self, key, value):
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO analyses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now, now),
+        )
+        with self._lock:
+            self._counters["writes"] += 1
+            self._writes += 1
+            due = self._writes % self.evict_every == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Drop expired rows, then least-recently-used rows beyond ``max_entries``"""
+        conn = self._conn()
+        removed = conn.execute(
+            "DELETE FROM analyses WHERE created_at <= ?", (time.time() - self.ttl,)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM analyses WHERE key IN ("
+            " SELECT key FROM analyses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self._count("evictions", removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["entries"] = self._conn().execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class SharedAnalysisCache:
+    """AnalysisCache on a shared_state backend; entries expire after ``ttl``.
+
+    ``max_entries`` is not enforced here: bounding the size is left to the
+    backend (e.g. Redis' maxmemory policy). While the backend is unavailable
+    lookups miss and writes are dropped, so analyses still go to the model.
+    """
+
+    def __init__(self, backend, ttl=7 * 24 * 3600, max_entries=None):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "writes": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def get(self, key):
+        try:
+            value = self.backend.get(f"analysis:{key}")
+        except shared_state.STORAGE_ERRORS:
+            self._count("errors")
+            value = None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def put(self, key, value):
+        try:
+            self.backend.set(f"analysis:{key}", value, ttl=self.ttl)
+        except shared_state.STORAGE_ERRORS:
+            self._count("errors")
+            return
+        self._count("writes")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+def _open(path, **kwargs):
+    if shared_state.is_url(path):
+        return SharedAnalysisCache(shared_state.get_backend(path), **kwargs)
+    return AnalysisCache(path, **kwargs)
+
+
+def get_cache(path, **kwargs):
+    """The process's analysis cache for ``path``, a SQLite file or a shared_state URL"""
+    return registry.shared("analysis cache", path, partial(_open, path), **kwargs)
@@ -1,12 +1,32 @@
 import streamlit as st
 import streamlit.components.v1 as components
-import google.generativeai as genai
-import pandas as pd
-import plotly.graph_objects as go
-import requests
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
+from functools import partial
+import hashlib
 import time
+import uuid
+
+import admission
+import backends
+import leave_analysis
+import pipeline
+import shared_state
+import structured_output
+import telemetry
+import token_usage
+import ui_html
+import weather_service
+from analysis_cache import get_cache
+from history_store import get_store
+from mail_pool import get_mail_pool
+from pipeline import run_pipeline
+from questionnaire import OPTIONS
+from rollups import get_rollups
+from rate_limit import get_guard
+from scoring import fallback_analysis
+from single_flight import get_single_flight
+from trends import get_trend_store
+from weather_cache import FORECAST_CACHE
 
 # Page config
 st.set_page_config(
@@ -15,118 +35,10 @@ st.set_page_config(
     layout="centered"
 )
 
-# Simple CSS with dark text on white background
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Lexend+Deca:wght@300;400;500;600;700&display=swap');
-    
-    .stApp {
-        background-color: white;
-        font-family: 'Lexend Deca', sans-serif;
-    }
-    
-    .main-title {
-        font-size: 2.5rem;
-        font-weight: 600;
-        text-align: center;
-        color: #1a1a1a;
-        margin-bottom: 0.5rem;
-        font-family: 'Lexend Deca', sans-serif;
-    }
-    
-    .subtitle {
-        font-size: 1.2rem;
-        text-align: center;
-        color: #666;
-        margin-bottom: 3rem;
-        font-family: 'Lexend Deca', sans-serif;
-    }
-    
-    .decision-card {
-        background: #007aff;
-        border-radius: 16px;
-        padding: 2rem;
-        color: white;
-        text-align: center;
-        margin: 2rem 0;
-        box-shadow: 0 4px 20px rgba(0, 122, 255, 0.15);
-    }
-    
-    .recommendation {
-        background: #f8f9fa;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        color: #1a1a1a;
-        border: 1px solid #dee2e6;
-        font-weight: 500;
-    }
-    
-    .do-item {
-        background: #d4edda;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-        color: #1a1a1a;
-        font-weight: 500;
-        border-left: 3px solid #28a745;
-    }
-    
-    .dont-item {
-        background: #f8d7da;
-        border-radius: 8px;
-        padding: 1rem;
-        margin: 0.5rem 0;
-        color: #1a1a1a;
-        font-weight: 500;
-        border-left: 3px solid #dc3545;
-    }
-    
-    .weather-card {
-        background: #f8f9fa;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin: 1rem 0;
-        color: #1a1a1a;
-        text-align: center;
-        border: 1px solid #dee2e6;
-    }
-    
-    .stButton > button {
-        width: 100%;
-        background: #007aff;
-        color: white;
-        border: none;
-        border-radius: 12px;
-        padding: 1rem;
-        font-weight: 600;
-        font-size: 1rem;
-        margin-top: 1.5rem;
-        font-family: 'Lexend Deca', sans-serif;
-    }
-    
-    /* Fix for input labels to be black */
-    .stSelectbox label,
-    .stSlider label,
-    .stSelectbox > div > label,
-    .stSlider > div > label,
-    label[data-testid="stWidgetLabel"] {
-        color: #1a1a1a !important;
-        font-family: 'Lexend Deca', sans-serif !important;
-        font-weight: 500 !important;
-    }
-    
-    /* Additional targeting for labels */
-    .stSelectbox > label,
-    .stSlider > label {
-        color: #1a1a1a !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# One shared CSS class block; the HTML fragments below only reference its classes
+st.markdown(ui_html.page_css(), unsafe_allow_html=True)
 
 # Initialize session state
-if 'assessments' not in st.session_state:
-    st.session_state.assessments = []
 if 'analysis' not in st.session_state:
     st.session_state.analysis = None
 if 'generated_leave_mail' not in st.session_state:
@@ -134,459 +46,449 @@ if 'generated_leave_mail' not in st.session_state:
 
 # API Configuration
 try:
-    GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"]
-    WEATHER_API_KEY = st.secrets.get("PIRATE_WEATHER_API_KEY", "")
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-1.5-flash')
+    # "gemini" in production; "stub" (offline, for load tests) and "local" need no API key
+    MODEL_BACKEND = st.secrets.get("MODEL_BACKEND", "gemini")
+    GEMINI_API_KEY = st.secrets["GEMINI_API_KEY"] if MODEL_BACKEND == "gemini" else st.secrets.get("GEMINI_API_KEY", "")
 except:
     st.error("🔑 Please add GEMINI_API_KEY to Streamlit secrets")
     st.stop()
 
-def get_weather_tomorrow():
-    """Get tomorrow's weather forecast"""
+MODEL_BACKEND_OPTIONS = dict(st.secrets.get("MODEL_BACKEND_OPTIONS", {}))
+WEATHER_API_KEY = st.secrets.get("PIRATE_WEATHER_API_KEY", "")
+WEATHER_API_URL = st.secrets.get("WEATHER_API_URL", "https://api.pirateweather.net")
+GEMINI_RPM = int(st.secrets.get("GEMINI_RPM", 15))
+# USD per million tokens, for the cost estimate in token_usage.METER
+token_usage.METER.input_price = float(st.secrets.get("GEMINI_INPUT_PRICE", 0))
+token_usage.METER.output_price = float(st.secrets.get("GEMINI_OUTPUT_PRICE", 0))
+FORECAST_CACHE.ttl = int(st.secrets.get("WEATHER_CACHE_TTL", FORECAST_CACHE.ttl))
+SPECULATIVE_LEAVE_MAIL = bool(st.secrets.get("SPECULATIVE_LEAVE_MAIL", True))
+LEAVE_MAIL_POOL_SIZE = int(st.secrets.get("LEAVE_MAIL_POOL_SIZE", 2))  # per reason; 0 disables the pool
+LEAVE_MAIL_MAX_AGE = int(st.secrets.get("LEAVE_MAIL_MAX_AGE", 6 * 3600))
+STREAM_ANALYSIS = bool(st.secrets.get("STREAM_ANALYSIS", True))
+WEATHER_REFRESH = st.secrets.get("WEATHER_REFRESH", "15m")
+# Office locations users can pick from: name -> [lat, lon]
+WEATHER_LOCATIONS = {
+    name: tuple(coordinates)
+    for name, coordinates in st.secrets.get("WEATHER_LOCATIONS", weather_service.LOCATIONS).items()
+}
+DEFAULT_LOCATION = st.secrets.get("DEFAULT_LOCATION", weather_service.DEFAULT_LOCATION)
+WEATHER_PREFETCH_AT = tuple(st.secrets.get("WEATHER_PREFETCH_AT", ["07:30"]))  # local times, before the morning peak
+# memory://, sqlite:///path or redis://host:port/db to share history and caches between replicas
+STATE_BACKEND = st.secrets.get("STATE_BACKEND", "")
+ANALYSIS_CACHE_PATH = st.secrets.get("ANALYSIS_CACHE_PATH", ".cache/analyses.sqlite3")
+ANALYSIS_CACHE_TTL = int(st.secrets.get("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+ANALYSIS_CACHE_MAX_ENTRIES = int(st.secrets.get("ANALYSIS_CACHE_MAX_ENTRIES", 50000))
+ADMISSION_WORKERS = int(st.secrets.get("ADMISSION_WORKERS", 8))  # concurrent analysis calls; 0 = no admission control
+ADMISSION_QUEUE = int(st.secrets.get("ADMISSION_QUEUE", 32))
+ADMISSION_MAX_WAIT = float(st.secrets.get("ADMISSION_MAX_WAIT", 4.0))  # routine requests' wait budget, seconds
+ADMISSION_CRISIS_WAIT = float(st.secrets.get("ADMISSION_CRISIS_WAIT", 30.0))
+METRICS_PORT = int(st.secrets.get("METRICS_PORT", 0))  # serve /metrics on this port; 0 = off
+METRICS_FILE = st.secrets.get("METRICS_FILE", "")  # or write the same text to this file
+PROFILE_RERUNS = st.secrets.get("PROFILE_RERUNS", "")  # "cprofile" or "pyinstrument" to dump a profile per rerun
+PROFILE_DIR = st.secrets.get("PROFILE_DIR", ".profiles")
+HISTORY_DB_PATH = st.secrets.get("HISTORY_DB_PATH", ".data/history.sqlite3")
+# With sign-in ([auth] in the secrets) history is kept between visits; without it, for one session
+AUTH_ENABLED = "auth" in st.secrets
+# Team -> department; when set, people can pick their team and HR sees team rollups (org_dashboard.py)
+ORG_TEAMS = dict(st.secrets.get("ORG_TEAMS", {}))
+ROLLUP_MIN_GROUP = int(st.secrets.get("ROLLUP_MIN_GROUP", 5))
+ROLLUP_SALT = st.secrets.get("ROLLUP_SALT", "")
+
+# Caches, history, trends and team rollups, on STATE_BACKEND when it is set
+try:
+    SHARED_STATE = shared_state.get_backend(STATE_BACKEND) if STATE_BACKEND else None
+    FORECAST_CACHE.shared = SHARED_STATE
+    ANALYSIS_CACHE = get_cache(STATE_BACKEND or ANALYSIS_CACHE_PATH, ttl=ANALYSIS_CACHE_TTL, max_entries=ANALYSIS_CACHE_MAX_ENTRIES)
+    HISTORY_STORE = get_store(STATE_BACKEND or HISTORY_DB_PATH)
+    TREND_STORE = get_trend_store(STATE_BACKEND or HISTORY_DB_PATH)
+    ROLLUPS = get_rollups(STATE_BACKEND or HISTORY_DB_PATH, min_group=ROLLUP_MIN_GROUP, salt=ROLLUP_SALT)
+except Exception as e:
+    st.error(f"🗄️ Could not open the app's storage (check STATE_BACKEND and HISTORY_DB_PATH): {e}")
+    st.stop()
+
+@st.cache_resource(show_spinner=False)
+def get_model(api_key, requests_per_minute, system_instruction=None):
+    """Model client (MODEL_BACKEND), created on first use and shared by every session in the process
+
+    The analysis uses its own client carrying leave_analysis.SYSTEM_INSTRUCTION;
+    both share the same guard.
+    """
+    # All sessions in this process share one quota, backoff state and circuit breaker
+    guard = get_guard("gemini", requests_per_minute=requests_per_minute)
+    return backends.create_model(MODEL_BACKEND, api_key, guard, system_instruction, **MODEL_BACKEND_OPTIONS)
+
+# Identical submissions that arrive together share one analysis call
+ANALYSIS_FLIGHTS = get_single_flight("analysis")
+# Under overload, the analyses of people who seem to need them most are made first
+ANALYSIS_ADMISSION = admission.get_admission(
+    "analysis",
+    workers=ADMISSION_WORKERS,
+    max_queue=ADMISSION_QUEUE,
+    max_wait=ADMISSION_MAX_WAIT,
+    crisis_wait=ADMISSION_CRISIS_WAIT,
+    guard=get_guard("gemini", requests_per_minute=GEMINI_RPM)
+) if ADMISSION_WORKERS > 0 else None
+
+# Leave mails are pre-generated by a background worker (which creates its own client on its thread)
+MAIL_POOL = get_mail_pool(
+    "leave-mail",
+    partial(backends.create_model, MODEL_BACKEND, GEMINI_API_KEY,
+            get_guard("gemini", requests_per_minute=GEMINI_RPM), **MODEL_BACKEND_OPTIONS),
+    size=LEAVE_MAIL_POOL_SIZE,
+    max_age=LEAVE_MAIL_MAX_AGE,
+    admission=ANALYSIS_ADMISSION  # users' queued analyses go first
+)
+
+def signed_in():
+    """Whether the user signed in with the app's identity provider ([auth] in the secrets)"""
+    try:
+        return bool(st.user.is_logged_in)
+    except Exception:  # no [auth] section
+        return False
+
+def get_user_id():
+    """Whose history this is: the signed-in account, or else only this browser session
+
+    Nothing in the URL identifies the user, since anyone holding such a link
+    could read that person's history.
+    """
+    if signed_in():
+        subject = st.user.get("sub") or st.user.get("email")
+        return "user:" + hashlib.sha256(subject.encode()).hexdigest()
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = "session:" + uuid.uuid4().hex
+    return st.session_state.user_id
+
+# A signed-in user whose session reconnects to another replica picks up their latest results
+if SHARED_STATE is not None and signed_in() and 'restored' not in st.session_state:
+    st.session_state.restored = True
+    if st.session_state.analysis is None:
+        try:
+            results = SHARED_STATE.get(f"results:{get_user_id()}")
+        except shared_state.STORAGE_ERRORS:
+            results = None
+            st.info("Your latest results could not be loaded right now.")
+        if results:
+            st.session_state.analysis = results['analysis']
+            st.session_state.generated_leave_mail = results['leave_mail']
+
+# Forecasts for every office (and every cell users look up) are fetched in bulk ahead of time
+WEATHER_PREFETCHER = weather_service.get_prefetcher(
+    WEATHER_API_KEY,
+    base_url=WEATHER_API_URL,
+    locations=WEATHER_LOCATIONS,
+    times=WEATHER_PREFETCH_AT
+) if WEATHER_API_KEY else None
+
+# Span histograms plus every component's counters, exported as Prometheus text
+telemetry.register_collector("analysis_cache", ANALYSIS_CACHE.stats)
+telemetry.register_collector("forecast_cache", FORECAST_CACHE.stats)
+telemetry.register_collector("pipeline", pipeline.stats)
+telemetry.register_collector("coalescing", ANALYSIS_FLIGHTS.stats)
+if ANALYSIS_ADMISSION is not None:
+    telemetry.register_collector("admission", ANALYSIS_ADMISSION.stats)
+telemetry.register_collector("parse", structured_output.stats)
+telemetry.register_collector("tokens", token_usage.METER.stats)
+telemetry.register_collector("mail_pool", MAIL_POOL.stats)
+telemetry.register_collector("guard", get_guard("gemini", requests_per_minute=GEMINI_RPM).stats)
+if WEATHER_PREFETCHER is not None:
+    telemetry.register_collector("weather_prefetch", WEATHER_PREFETCHER.stats)
+if METRICS_PORT:
+    telemetry.start_http_server(METRICS_PORT)
+if METRICS_FILE:
+    telemetry.start_file_writer(METRICS_FILE)
+
+@telemetry.traced("get_weather_tomorrow")
+def get_weather_tomorrow(location):
+    """Get tomorrow's weather forecast for an office location (served from the process-wide cache)"""
     try:
-        if WEATHER_API_KEY:
-            url = f"https://api.pirateweather.net/forecast/{WEATHER_API_KEY}/23.8103,90.4125"
-            response = requests.get(url, timeout=3)
-            data = response.json()
-            tomorrow = data["daily"]["data"][1] if "daily" in data else data["currently"]
-            return {
-                "temp_high": round((tomorrow.get("temperatureHigh", 85) - 32) * 5/9),
-                "temp_low": round((tomorrow.get("temperatureLow", 75) - 32) * 5/9),
-                "condition": tomorrow.get("summary", "Partly cloudy"),
-                "rain_chance": round(tomorrow.get("precipProbability", 0) * 100)
-            }
+        if WEATHER_PREFETCHER is not None:
+            lat, lon = WEATHER_LOCATIONS[location]
+            return weather_service.get_forecast(WEATHER_PREFETCHER.client, lat, lon)
     except:
         pass
     
-    return {
-        "temp_high": 30,
-        "temp_low": 24,
-        "condition": "Partly cloudy",
-        "rain_chance": 20
-    }
-
-def generate_leave_mail():
-    """Generate a concise, first-person leave mail with a personal or access-related reason."""
-
-    # Personal medical reasons (first-person only)
-    medical_reasons = [
-        "acute dysentery",
-        "severe migraine",
-        "high fever",
-        "acute food poisoning",
-        "debilitating headache"
-    ]
-
-    # Non-medical personal access issues near home
-    access_reasons = [
-        "a blockade near my house due to a student movement",
-        "a political demonstration blocking the roads in my neighborhood",
-        "major road construction in front of my house causing access issues",
-        "urgent utility maintenance in my building causing disruptions"
-    ]
-
-    # Pick one reason at random each time
-    import random
-    all_reasons = medical_reasons + access_reasons
-    chosen_reason = random.choice(all_reasons)
-
-    prompt = f"""
-Generate a professional, concise leave application email for one day of leave tomorrow.
-Use first-person and the following single reason: {chosen_reason}.
-
-Requirements:
-- 2–3 sentences max
-- Subject line must be: "Subject: Leave Application for Tomorrow"
-- Keep the tone polite and professional
-- Do not mention family members; it is my personal situation
-- Do not add any text outside the email
-"""
-
+    return dict(weather_service.DEFAULT_FORECAST)
+
+@telemetry.traced("generate_leave_mail")
+def generate_leave_mail(model, on_chunk=None):
+    """Generate a concise, first-person leave mail with a personal or access-related reason.
+
+    Served from the pre-generated pool when it has stock, otherwise a live call.
+    """
+    text = MAIL_POOL.take()
+    if text is None:
+        return leave_analysis.generate_leave_mail(model, on_chunk=on_chunk)
+    if on_chunk is not None:
+        on_chunk(text)
+    return text
+
+def cached_leave_decision(data, weather):
+    """The analysis if it is already cached (no model call needed), else None"""
     try:
-        response = model.generate_content(prompt)
-        text = (response.text or "").strip()
-        # Ensure 'Best regards' is present
-        if text:
-            if "best regards".lower() not in text.lower():
-                # Add 'Best regards' before [Your Name] or at the end
-                if "[Your Name]" in text:
-                    text = text.replace("[Your Name]", "Best regards,\n[Your Name]")
-                else:
-                    text = text.strip() + "\n\nBest regards,\n[Your Name]"
-            return text
-        else:
-            return f"Subject: Leave Application for Tomorrow\n\nDear Manager,\n\nI would like to request leave for tomorrow due to {chosen_reason}. I will ensure any urgent tasks are handed over and remain reachable for critical matters if needed.\n\nThank you for your understanding.\n\nBest regards,\n[Your Name]"
-    except Exception:
-        # Fallback email (deterministic, still varies via chosen_reason)
-        return f"""Subject: Leave Application for Tomorrow
-
-Dear Manager,
-
-I would like to request leave for tomorrow due to {chosen_reason}. I will ensure urgent items are handed over today and remain reachable for any critical matters if needed.
-
-Thank you for your understanding.
+        return leave_analysis.cached_analysis(data, weather, ANALYSIS_CACHE)
+    except shared_state.STORAGE_ERRORS:
+        return None
 
-Best regards,
-[Your Name]"""
-
-def analyze_leave_decision(data, weather):
-    """Enhanced AI analysis for leave recommendation"""
-    
-    prompt = f"""You are an intelligent work-life balance advisor. Analyze if this person should take leave tomorrow based on their mental state, workload, and external factors.
-
-CURRENT STATE:
-- Overall feeling: {data['mood']}
-- Energy level: {data['energy']}/10
-- Sleep quality: {data['sleep']}/10
-- Work pressure: {data['work_pressure']}/10
-- Personal life stress: {data['personal_stress']}/10
-- Physical symptoms: {data['physical_symptoms']}
-- Last break taken: {data['last_break']}
-- Tomorrow's work importance: {data['tomorrow_importance']}
-- Support system: {data['support']}
-- Leave balance remaining: {data['leave_balance']}
-
-WEATHER TOMORROW: {weather['temp_high']}°C/{weather['temp_low']}°C, {weather['condition']}, {weather['rain_chance']}% rain chance
-
-DECISION FRAMEWORK:
-- Full Day Leave: For burnout, severe stress, or mental health crisis
-- Half Day/Early Leave: For moderate stress with manageable work
-- Work Normally: For good mental state with support strategies
-- Consider weather impact on mood and recovery opportunities
-- Consider leave balance - if low, be more conservative
-
-Respond in this EXACT JSON format (ensure valid JSON):
-{{
-    "wellness_score": 45,
-    "leave_type": "full_day_leave",
-    "confidence": 82,
-    "main_reason": "Primary reason for recommendation",
-    "decision_summary": "Brief 2-sentence explanation of the decision",
-    "work_activities": ["3 things to do if working"],
-    "work_avoid": ["3 things to avoid if working"],
-    "leave_activities": ["4 recovery activities for leave day"],
-    "leave_avoid": ["3 things to avoid during leave"],
-    "warning_signs": ["signs requiring immediate attention"],
-    "recovery_estimate": "Expected recovery timeframe"
-}}
-
-Leave types: "full_day_leave", "half_day_leave", "work_with_care", "work_normally"
-
-SCORING GUIDE:
-- 80-100: Excellent state, work normally
-- 60-79: Good state, minor support needed
-- 40-59: Moderate stress, consider half day
-- 20-39: High stress, likely needs full day
-- 0-19: Crisis level, definitely needs leave
-
-Weather considerations:
-- Rainy/gloomy: May worsen mood, indoor recovery activities
-- Sunny/pleasant: Good for outdoor recovery, mood boost
-- Extreme weather: Affects commute stress and recovery options
-
-Leave balance considerations:
-- High balance (>15 days): More flexible with recommendations
-- Medium balance (5-15 days): Moderate recommendations
-- Low balance (<5 days): Conservative recommendations"""
+@telemetry.traced("analyze_leave_decision")
+def analyze_leave_decision(data, weather, on_event=None):
+    """Enhanced AI analysis for leave recommendation, after cached_leave_decision() found nothing
 
+    If on_event is given the response is streamed and on_event(kind, key, value)
+    is called for every field (and list item) as soon as it has been parsed.
+    """
     try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean up the response text
-        if response_text.startswith('```json'):
-            response_text = response_text.replace('```json', '').replace('```', '').strip()
-        
-        result = json.loads(response_text)
-        
-        # Validate required fields
-        required_fields = ['wellness_score', 'leave_type', 'confidence', 'main_reason', 'decision_summary']
-        for field in required_fields:
-            if field not in result:
-                raise ValueError(f"Missing required field: {field}")
-        
-        return result
-        
+        model = get_model(GEMINI_API_KEY, GEMINI_RPM, leave_analysis.SYSTEM_INSTRUCTION)
+        return leave_analysis.analyze(
+            model, data, weather, cache=ANALYSIS_CACHE, on_event=on_event,
+            flights=ANALYSIS_FLIGHTS, admission=ANALYSIS_ADMISSION, lookup=False
+        )
     except Exception as e:
         error_text = str(e)
-        if '429' in error_text or 'quota' in error_text.lower():
+        if isinstance(e, admission.Overloaded):
+            st.info("Lots of people are checking in right now – here is an instant recommendation instead of the AI analysis.")
+        elif leave_analysis.is_rate_limit_error(e):
             st.info("Rate limit reached for AI analysis – using fallback recommendation. Please try again later.")
         else:
             st.warning(f"AI analysis failed, using fallback logic: {error_text}")
         
         # Enhanced fallback logic
-        stress_factor = (data['work_pressure'] + data['personal_stress']) / 2
-        energy_factor = data['energy']
-        sleep_factor = data['sleep']
-        
-        # Parse leave balance
-        leave_balance_text = data['leave_balance']
-        if '20+' in leave_balance_text:
-            leave_days = 20
-        elif '15-20' in leave_balance_text:
-            leave_days = 15
-        elif '10-15' in leave_balance_text:
-            leave_days = 10
-        elif '5-10' in leave_balance_text:
-            leave_days = 5
-        else:
-            leave_days = 2
-        
-        # Calculate wellness score with leave balance consideration
-        wellness = 100 - (stress_factor * 10) - ((10 - energy_factor) * 8) - ((10 - sleep_factor) * 6)
-        
-        # Adjust based on leave balance
-        if leave_days < 5:
-            wellness += 10  # More conservative if low leave balance
-        elif leave_days > 15:
-            wellness -= 5   # More flexible if high leave balance
-        
-        wellness = max(5, min(100, int(wellness)))
-        
-        # Decision logic based on multiple factors
-        if wellness < 25 or (stress_factor > 8 and energy_factor < 3):
-            leave_type = "full_day_leave"
-            decision = "Your stress levels are critically high and energy is depleted. A full day of rest is essential to prevent burnout."
-        elif wellness < 45 or (stress_factor > 6 and sleep_factor < 5):
-            leave_type = "half_day_leave"
-            decision = "Moderate stress levels suggest you need some recovery time. Consider taking half day or leaving early."
-        elif wellness < 65:
-            leave_type = "work_with_care"
-            decision = "You can work tomorrow but need to be very careful with your energy and stress management."
-        else:
-            leave_type = "work_normally"
-            decision = "You're in good shape to work tomorrow. Focus on maintaining your current positive state."
-        
-        return {
-            "wellness_score": wellness,
-            "leave_type": leave_type,
-            "confidence": 75,
-            "main_reason": f"Stress level {stress_factor:.1f}/10, Energy {energy_factor}/10, Leave balance: {leave_days} days",
-            "decision_summary": decision,
-            "work_activities": ["Take regular breaks every hour", "Prioritize only essential tasks", "Stay hydrated and eat well"],
-            "work_avoid": ["Overtime or extra commitments", "Perfectionism on minor tasks", "Skipping lunch break"],
-            "leave_activities": ["Sleep until naturally awake", "Light exercise or walk", "Do something you enjoy", "Connect with supportive people"],
-            "leave_avoid": ["Checking work emails", "Intensive physical activities", "Making major decisions"],
-            "warning_signs": ["Panic attacks", "Complete inability to focus", "Persistent physical symptoms"],
-            "recovery_estimate": "1-3 days with proper rest"
-        }
+        return fallback_analysis(data)
+
+LEAVE_TYPE_MAP = {
+    "full_day_leave": ("Take Full Day Off", "#e74c3c"),
+    "half_day_leave": ("Take Half Day / Leave Early", "#f39c12"),
+    "work_with_care": ("Work With Extra Self-Care", "#f1c40f"),
+    "work_normally": ("Work Normally", "#27ae60")
+}
+LEAVE_TYPE_LABELS = {key: label for key, (label, _) in LEAVE_TYPE_MAP.items()}
 
+@telemetry.traced("render_analysis_ui")
 def render_analysis_ui(analysis, leave_mail):
-    # Display results
-    leave_type_map = {
-        "full_day_leave": ("Take Full Day Off", "#e74c3c"),
-        "half_day_leave": ("Take Half Day / Leave Early", "#f39c12"),
-        "work_with_care": ("Work With Extra Self-Care", "#f1c40f"),
-        "work_normally": ("Work Normally", "#27ae60")
-    }
-    decision_text, decision_color = leave_type_map.get(analysis['leave_type'], ("Work With Care", "#007aff"))
-
-    # Decision card with inline styles
-    st.markdown(f"""
-    <div style="background: #007aff; border-radius: 16px; padding: 2rem; color: white; text-align: center; margin: 2rem 0; box-shadow: 0 4px 20px rgba(0, 122, 255, 0.15); font-family: Lexend Deca, sans-serif;">
-        <h2 style="margin: 0; font-weight: 600; color: white; font-family: Lexend Deca, sans-serif;">{decision_text}</h2>
-        <p style="font-size: 1.1rem; opacity: 0.9; margin: 1rem 0; color: white; font-family: Lexend Deca, sans-serif;">{analysis['decision_summary']}</p>
-        <p style="font-size: 0.9rem; opacity: 0.8; color: white; font-family: Lexend Deca, sans-serif;">Confidence: {analysis['confidence']}%</p>
-    </div>
-    """, unsafe_allow_html=True)
+    # Display results (HTML is built once per distinct analysis and reused on reruns)
+    decision_text, decision_color = LEAVE_TYPE_MAP.get(analysis['leave_type'], ("Work With Care", "#007aff"))
+    html = ui_html.analysis_html(analysis, decision_text, leave_mail)
+
+    st.markdown(html.card, unsafe_allow_html=True)
 
     # Recommendations based on decision
     col1, col2 = st.columns(2)
-    if analysis['leave_type'] in ['full_day_leave', 'half_day_leave']:
-        with col1:
-            st.markdown('<p style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600;">Recovery Activities:</p>', unsafe_allow_html=True)
-            for item in analysis.get('leave_activities', []):
-                st.markdown(f'<div style="background: #d4edda; border-radius: 8px; padding: 1rem; margin: 0.5rem 0; color: #1a1a1a; font-weight: 500; border-left: 3px solid #28a745; font-family: Lexend Deca, sans-serif;">{item}</div>', unsafe_allow_html=True)
-        with col2:
-            st.markdown('<p style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600;">Avoid During Leave:</p>', unsafe_allow_html=True)
-            for item in analysis.get('leave_avoid', []):
-                st.markdown(f'<div style="background: #f8d7da; border-radius: 8px; padding: 1rem; margin: 0.5rem 0; color: #1a1a1a; font-weight: 500; border-left: 3px solid #dc3545; font-family: Lexend Deca, sans-serif;">{item}</div>', unsafe_allow_html=True)
-    else:
-        with col1:
-            st.markdown('<p style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600;">If You Work Tomorrow:</p>', unsafe_allow_html=True)
-            for item in analysis.get('work_activities', []):
-                st.markdown(f'<div style="background: #d4edda; border-radius: 8px; padding: 1rem; margin: 0.5rem 0; color: #1a1a1a; font-weight: 500; border-left: 3px solid #28a745; font-family: Lexend Deca, sans-serif;">{item}</div>', unsafe_allow_html=True)
-        with col2:
-            st.markdown('<p style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600;">Avoid While Working:</p>', unsafe_allow_html=True)
-            for item in analysis.get('work_avoid', []):
-                st.markdown(f'<div style="background: #f8d7da; border-radius: 8px; padding: 1rem; margin: 0.5rem 0; color: #1a1a1a; font-weight: 500; border-left: 3px solid #dc3545; font-family: Lexend Deca, sans-serif;">{item}</div>', unsafe_allow_html=True)
+    col1.markdown(html.left, unsafe_allow_html=True)
+    col2.markdown(html.right, unsafe_allow_html=True)
 
     # Warning signs and recovery time
-    if analysis.get('warning_signs'):
-        st.markdown(f"""
-        <div style="background: #f8f9fa; border-radius: 12px; padding: 1.5rem; margin: 1rem 0; color: #1a1a1a; border: 1px solid #dee2e6; font-weight: 500; font-family: Lexend Deca, sans-serif;">
-            <strong style="color: #1a1a1a; font-family: Lexend Deca, sans-serif;">Watch for these warning signs:</strong><br>
-            {' • '.join(analysis['warning_signs'])}
-        </div>
-        """, unsafe_allow_html=True)
-
-    if analysis.get('recovery_estimate'):
-        st.markdown(f"""
-        <div style="background: #f8f9fa; border-radius: 12px; padding: 1.5rem; margin: 1rem 0; color: #1a1a1a; border: 1px solid #dee2e6; font-weight: 500; font-family: Lexend Deca, sans-serif;">
-            <strong style="color: #1a1a1a; font-family: Lexend Deca, sans-serif;">Expected recovery time:</strong> {analysis['recovery_estimate']}
-        </div>
-        """, unsafe_allow_html=True)
+    if html.warnings:
+        st.markdown(html.warnings, unsafe_allow_html=True)
+
+    if html.recovery:
+        st.markdown(html.recovery, unsafe_allow_html=True)
 
     # AI Generated Leave Mail (use provided leave_mail)
-    if analysis['leave_type'] in ['full_day_leave', 'half_day_leave'] and leave_mail:
-        st.markdown('<h4 style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600; margin-top: 2rem;">📧 AI-Generated Leave Application</h4>', unsafe_allow_html=True)
-        st.markdown(f"""
-        <div style="background: #f8f9fa; border-radius: 12px; padding: 1.5rem; margin: 1rem 0; border: 1px solid #dee2e6; font-family: 'Courier New', monospace; font-size: 0.9rem; color: #1a1a1a; white-space: pre-line;">
-{leave_mail}
-        </div>
-        """, unsafe_allow_html=True)
+    if html.mail:
+        st.markdown(html.mail, unsafe_allow_html=True)
         render_copy_button(leave_mail)
 
+class StreamingAnalysisView:
+    """Paints the analysis progressively while Gemini streams it.
+
+    The decision card appears as soon as leave_type and decision_summary are
+    parsed; confidence, the lists and the leave mail fill in afterwards.
+    """
+
+    CARD_FIELDS = ('leave_type', 'decision_summary')
+
+    def __init__(self, loading_placeholder):
+        self.loading_placeholder = loading_placeholder
+        self.fields = {}
+        self.root = st.empty()
+        with self.root.container():
+            self.card = st.empty()
+            col1, col2 = st.columns(2)
+            self.left = col1.empty()
+            self.right = col2.empty()
+            self.mail = st.empty()
+
+    def on_event(self, kind, key, value):
+        if kind == 'item':
+            self.fields.setdefault(key, []).append(value)
+        else:
+            self.fields[key] = value
+        if not all(field in self.fields for field in self.CARD_FIELDS):
+            return
+        self.loading_placeholder.empty()
+        if key in self.CARD_FIELDS or key == 'confidence':
+            self._render_card()
+        elif key.endswith('_activities') or key.endswith('_avoid'):
+            self._render_lists()
+
+    def on_mail(self, text):
+        self.mail.markdown(ui_html.mail_box_html(text), unsafe_allow_html=True)
+
+    def _render_card(self):
+        decision_text = LEAVE_TYPE_LABELS.get(self.fields['leave_type'], "Work With Care")
+        self.card.markdown(ui_html.decision_card_html(decision_text, self.fields['decision_summary'], self.fields.get('confidence')), unsafe_allow_html=True)
+
+    def _render_lists(self):
+        if self.fields['leave_type'] in ['full_day_leave', 'half_day_leave']:
+            do_key, avoid_key = 'leave_activities', 'leave_avoid'
+        else:
+            do_key, avoid_key = 'work_activities', 'work_avoid'
+        self.left.markdown(ui_html.item_list_html('do', self.fields.get(do_key, [])), unsafe_allow_html=True)
+        self.right.markdown(ui_html.item_list_html('avoid', self.fields.get(avoid_key, [])), unsafe_allow_html=True)
+
+    def clear(self):
+        self.root.empty()
+
 def render_copy_button(text_to_copy: str) -> None:
-    safe_text = json.dumps(text_to_copy)
-    components.html(
-        f"""
-        <div>
-          <button id=\"copyBtn\" style=\"background:#007aff;color:#fff;border:none;border-radius:8px;padding:8px 12px;font-weight:600;cursor:pointer;\">📋 Copy Email</button>
-          <span id=\"copyStatus\" style=\"margin-left:8px;color:#1a1a1a;font-size:0.9rem;\"></span>
-        </div>
-        <script>
-          const text = {safe_text};
-          const btn = document.getElementById('copyBtn');
-          const status = document.getElementById('copyStatus');
-          btn.addEventListener('click', async () => {{
-            try {{
-              await navigator.clipboard.writeText(text);
-              status.textContent = 'Copied!';
-              setTimeout(() => status.textContent = '', 2000);
-            }} catch (e) {{
-              status.textContent = 'Copy failed. Please select and copy manually.';
-            }}
-          }});
-        </script>
-        """,
-        height=60,
-    )
+    components.html(ui_html.copy_button_html(text_to_copy), height=60)
 
-def main():
-    # Header with inline styles to ensure visibility
-    st.markdown('<h1 style="font-size: 2.5rem; font-weight: 600; text-align: center; color: #1a1a1a; margin-bottom: 0.5rem; font-family: Lexend Deca, sans-serif;">Should I Take Leave Tomorrow?</h1>', unsafe_allow_html=True)
-    st.markdown('<p style="font-size: 1.2rem; text-align: center; color: #666; margin-bottom: 3rem; font-family: Lexend Deca, sans-serif;">AI-powered decision making for your work-life balance</p>', unsafe_allow_html=True)
-    
-    # Get tomorrow's weather
-    weather = get_weather_tomorrow()
-    
-    # Weather display with inline styles and animation
-    # Determine weather icon and animation based on condition
-    weather_condition_lower = weather['condition'].lower()
-    if 'rain' in weather_condition_lower or 'shower' in weather_condition_lower:
-        weather_icon = "🌧️"
-        animation_class = "rain-animation"
-    elif 'cloud' in weather_condition_lower:
-        weather_icon = "☁️"
-        animation_class = "cloud-animation"
-    elif 'sun' in weather_condition_lower or 'clear' in weather_condition_lower:
-        weather_icon = "☀️"
-        animation_class = "sun-animation"
-    else:
-        weather_icon = "🌤️"
-        animation_class = "default-animation"
+def render_trends(user_id):
+    """Trend chart and counters, drawn from the precomputed aggregates only"""
+    try:
+        snapshot = TREND_STORE.latest(user_id)
+        if not snapshot:
+            return
+        points = TREND_STORE.series(user_id, days=90)
+    except shared_state.STORAGE_ERRORS:
+        st.caption("📈 Your wellness trends are unavailable right now.")
+        return
+    averages = snapshot['moving_averages']
     
-    st.markdown(f'''
-    <style>
-        @keyframes rain-drop {{
-            0% {{ transform: translateY(-5px); opacity: 0.7; }}
-            50% {{ transform: translateY(2px); opacity: 1; }}
-            100% {{ transform: translateY(-5px); opacity: 0.7; }}
-        }}
-        
-        @keyframes cloud-drift {{
-            0% {{ transform: translateX(-3px); }}
-            50% {{ transform: translateX(3px); }}
-            100% {{ transform: translateX(-3px); }}
-        }}
-        
-        @keyframes sun-glow {{
-            0% {{ transform: scale(1); opacity: 0.8; }}
-            50% {{ transform: scale(1.05); opacity: 1; }}
-            100% {{ transform: scale(1); opacity: 0.8; }}
-        }}
+    with st.expander("📈 Your wellness trends"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("7-day wellness", averages[7]['wellness'] if averages[7]['count'] else "–")
+        col2.metric("30-day wellness", averages[30]['wellness'] if averages[30]['count'] else "–")
+        col3.metric("Burnout streak", f"{snapshot['burnout_streak']} days")
+        if snapshot['date'] != datetime.now().strftime('%Y-%m-%d'):
+            st.caption(f"Last assessment on {snapshot['date']}; the figures above cover the days up to today.")
         
-        @keyframes gentle-float {{
-            0% {{ transform: translateY(-2px); }}
-            50% {{ transform: translateY(2px); }}
-            100% {{ transform: translateY(-2px); }}
-        }}
+        if len(points) > 1:
+            import plotly.graph_objects as go  # only loaded when there is a chart to draw
+            dates = [point['date'] for point in points]
+            fig = go.Figure()
+            fig.add_trace(go.Scatter(x=dates, y=[point['wellness_7'] for point in points], name="Wellness (7-day)"))
+            fig.add_trace(go.Scatter(x=dates, y=[point['wellness_30'] for point in points], name="Wellness (30-day)"))
+            fig.add_trace(go.Scatter(x=dates, y=[point['stress_7'] for point in points], name="Stress (7-day)", yaxis="y2"))
+            fig.add_trace(go.Scatter(x=dates, y=[point['sleep_7'] for point in points], name="Sleep (7-day)", yaxis="y2"))
+            fig.update_layout(
+                height=320,
+                margin=dict(l=10, r=10, t=10, b=10),
+                yaxis=dict(title="Wellness", range=[0, 100]),
+                yaxis2=dict(title="Stress / Sleep", range=[0, 10], overlaying="y", side="right"),
+                legend=dict(orientation="h")
+            )
+            st.plotly_chart(fig, use_container_width=True)
         
-        .rain-animation {{
-            animation: rain-drop 2s ease-in-out infinite;
-        }}
-        
-        .cloud-animation {{
-            animation: cloud-drift 4s ease-in-out infinite;
-        }}
-        
-        .sun-animation {{
-            animation: sun-glow 3s ease-in-out infinite;
-        }}
-        
-        .default-animation {{
-            animation: gentle-float 3s ease-in-out infinite;
-        }}
-    </style>
-    <div style="background: #f8f9fa; border-radius: 12px; padding: 1.5rem; margin: 1rem 0; color: #1a1a1a; text-align: center; border: 1px solid #dee2e6; font-family: Lexend Deca, sans-serif;">
-        <h3 style="margin: 0; color: #1a1a1a; font-weight: 600; font-family: Lexend Deca, sans-serif;">Tomorrow's Weather in Dhaka</h3>
-        <div style="font-size: 2rem; margin: 0.5rem 0;" class="{animation_class}">{weather_icon}</div>
-        <p style="font-size: 1.1rem; margin: 0.5rem 0; color: #1a1a1a; font-family: Lexend Deca, sans-serif;">
-            <strong style="color: #1a1a1a; font-family: Lexend Deca, sans-serif;">{weather['temp_high']}°C / {weather['temp_low']}°C</strong><br>
-            {weather['condition']} • {weather['rain_chance']}% chance of rain
-        </p>
-    </div>
-    ''', unsafe_allow_html=True)
+        frequencies = snapshot['recommendations']
+        st.caption(" • ".join(
+            f"{LEAVE_TYPE_LABELS.get(leave_type, leave_type)}: {count}"
+            for leave_type, count in sorted(frequencies.items(), key=lambda item: -item[1])
+        ))
+
+NO_TEAM = "Prefer not to say"
+
+def record_cpu(kind, started):
+    """Accumulate script-thread CPU time for this session, split into full runs and fragment runs"""
+    cpu_stats = st.session_state.setdefault('cpu_stats', {})
+    runs, seconds = cpu_stats.get(kind, (0, 0.0))
+    cpu_stats[kind] = (runs + 1, seconds + time.thread_time() - started)
+
+@st.fragment(run_every=WEATHER_REFRESH)
+def weather_panel():
+    """Weather card; refreshes on its own without rerunning the rest of the page"""
+    started = time.thread_time()
+    if 'location' not in st.session_state:
+        location = st.query_params.get("loc")
+        st.session_state.location = location if location in WEATHER_LOCATIONS else DEFAULT_LOCATION
+    location = st.selectbox("Your office location", list(WEATHER_LOCATIONS), key="location")
+    st.query_params["loc"] = location
+    weather = get_weather_tomorrow(location)
+    st.markdown(ui_html.weather_card_html(weather['temp_high'], weather['temp_low'], weather['condition'], weather['rain_chance'], location), unsafe_allow_html=True)
+    record_cpu('fragment', started)
+
+@st.fragment
+def results_panel():
+    """Latest analysis for this session; interactions in here only rerun this fragment"""
+    started = time.thread_time()
+    if st.session_state.analysis:
+        render_analysis_ui(st.session_state.analysis, st.session_state.generated_leave_mail)
+    record_cpu('fragment', started)
+
+@telemetry.traced("rerun")
+def main():
+    started = time.thread_time()
     
-    # Input section header
-    st.markdown('<h3 style="color: #1a1a1a; font-family: Lexend Deca, sans-serif; font-weight: 600;">How are you feeling today?</h3>', unsafe_allow_html=True)
+    # Header with inline styles to ensure visibility
+    st.markdown(ui_html.header_html(), unsafe_allow_html=True)
     
-    col1, col2 = st.columns(2)
+    # Tomorrow's weather
+    weather_panel()
     
-    with col1:
-        mood = st.selectbox(
-            "Overall mood",
-            ["Excellent", "Good", "Okay", "Struggling", "Overwhelmed", "Exhausted"],
-            help="How would you describe your general state today?"
-        )
-        
-        energy = st.slider("Energy level", 1, 10, 5, help="1 = Completely drained, 10 = Highly energized")
-        sleep = st.slider("Last night's sleep quality", 1, 10, 6, help="1 = Terrible, 10 = Perfect rest")
+    # Input section header
+    st.markdown(ui_html.section_heading_html("How are you feeling today?"), unsafe_allow_html=True)
+    
+    # The questionnaire is a form: moving sliders and picking options does not
+    # rerun the script, everything is sent in one go on submit
+    with st.form("questionnaire", border=False):
+        team = None
+        if ORG_TEAMS:
+            if 'team' not in st.session_state:
+                st.session_state.team = st.query_params.get("team") if st.query_params.get("team") in ORG_TEAMS else NO_TEAM
+            team = st.selectbox(
+                "Your team",
+                [NO_TEAM, *ORG_TEAMS],
+                key="team",
+                help="Only counted in team totals, which HR sees for groups of at least a few people"
+            )
+            team = None if team == NO_TEAM else team
         
-        leave_balance = st.selectbox(
-            "Leave balance remaining",
-            ["20+ days", "15-20 days", "10-15 days", "5-10 days", "1-5 days", "No leave left"],
-            help="How many days of leave do you have remaining?"
-        )
+        col1, col2 = st.columns(2)
         
-    with col2:
-        work_pressure = st.slider("Work pressure level", 1, 10, 5, help="1 = Very light, 10 = Overwhelming")
-        personal_stress = st.slider("Personal life stress", 1, 10, 4, help="1 = Very peaceful, 10 = Major issues")
+        with col1:
+            mood = st.selectbox(
+                "Overall mood",
+                OPTIONS['mood'],
+                help="How would you describe your general state today?"
+            )
+            
+            energy = st.slider("Energy level", 1, 10, 5, help="1 = Completely drained, 10 = Highly energized")
+            sleep = st.slider("Last night's sleep quality", 1, 10, 6, help="1 = Terrible, 10 = Perfect rest")
+            
+            leave_balance = st.selectbox(
+                "Leave balance remaining",
+                OPTIONS['leave_balance'],
+                help="How many days of leave do you have remaining?"
+            )
+            
+        with col2:
+            work_pressure = st.slider("Work pressure level", 1, 10, 5, help="1 = Very light, 10 = Overwhelming")
+            personal_stress = st.slider("Personal life stress", 1, 10, 4, help="1 = Very peaceful, 10 = Major issues")
+            
+            physical_symptoms = st.selectbox(
+                "Physical symptoms",
+                OPTIONS['physical_symptoms']
+            )
+            
+            last_break = st.selectbox(
+                "When did you last take a day off?",
+                OPTIONS['last_break']
+            )
         
-        physical_symptoms = st.selectbox(
-            "Physical symptoms",
-            ["None", "Mild tension/headache", "Moderate discomfort", "Severe symptoms"]
+        tomorrow_importance = st.selectbox(
+            "How critical is tomorrow's work?",
+            OPTIONS['tomorrow_importance']
         )
         
-        last_break = st.selectbox(
-            "When did you last take a day off?",
-            ["Never", "6+ months ago", "2-6 months ago", "1-2 months ago", "Within last month"]
+        support = st.selectbox(
+            "Your support system",
+            OPTIONS['support']
         )
+        
+        # Analysis button
+        submitted = st.form_submit_button("Get My Personalized Recommendation", type="primary")
     
-    tomorrow_importance = st.selectbox(
-        "How critical is tomorrow's work?",
-        ["Low priority - routine tasks", "Medium - some important items", "High - major deadlines", "Critical - cannot be postponed"]
-    )
-    
-    support = st.selectbox(
-        "Your support system",
-        ["Strong - great family/friend support", "Good - some supportive people", "Limited - few people to talk to", "Weak - feeling quite isolated"]
-    )
-    
-    # Analysis button
-    if st.button("Get My Personalized Recommendation", type="primary"):
+    if submitted:
+        submit_started = time.perf_counter()
         data = {
             'mood': mood,
             'energy': energy,
@@ -599,23 +501,36 @@ def main():
             'support': support,
             'leave_balance': leave_balance
         }
+        weather = get_weather_tomorrow(st.session_state.location)
         
         # Minimal loading animation
         loading_placeholder = st.empty()
-        loading_placeholder.markdown("""
-        <div style="text-align: center; padding: 1rem; background: #f8f9fa; border-radius: 8px; margin: 1rem 0; border: 1px solid #dee2e6;">
-            <div style="display: inline-block; width: 16px; height: 16px; border: 2px solid #007aff; border-radius: 50%; border-top-color: transparent; animation: spin 1s linear infinite; margin-right: 8px;"></div>
-            <span style="color: #1a1a1a; font-family: 'Lexend Deca', sans-serif; font-size: 0.9rem;">Analyzing...</span>
-        </div>
-        <style>
-        @keyframes spin {
-            to { transform: rotate(360deg); }
-        }
-        </style>
-        """, unsafe_allow_html=True)
+        loading_placeholder.markdown(ui_html.loading_html(), unsafe_allow_html=True)
         
-        time.sleep(1.0)  # Reduced delay for better UX
-        analysis = analyze_leave_decision(data, weather)
+        # Leave mail comes from the pool, or if it is empty is generated speculatively
+        # alongside the analysis. The model is resolved here because the mail runs on a worker thread.
+        model = get_model(GEMINI_API_KEY, GEMINI_RPM)
+        speculative = SPECULATIVE_LEAVE_MAIL and not MAIL_POOL.available()
+        # A cached analysis is instant, so the mail then waits until it is known to be needed
+        cached = partial(cached_leave_decision, data, weather)
+        if STREAM_ANALYSIS:
+            stream_view = StreamingAnalysisView(loading_placeholder)
+            analysis, leave_mail = run_pipeline(
+                lambda: analyze_leave_decision(data, weather, on_event=stream_view.on_event),
+                partial(generate_leave_mail, model),
+                speculative=speculative,
+                on_mail_progress=stream_view.on_mail,
+                ready=cached
+            )
+            # The results panel below replaces the partial render
+            stream_view.clear()
+        else:
+            analysis, leave_mail = run_pipeline(
+                lambda: analyze_leave_decision(data, weather),
+                partial(generate_leave_mail, model),
+                speculative=speculative,
+                ready=cached
+            )
         
         # Clear loading animation
         loading_placeholder.empty()
@@ -627,23 +542,41 @@ def main():
             'wellness_score': analysis['wellness_score'],
             'recommendation': analysis['leave_type']
         }
-        st.session_state.assessments.insert(0, entry)
-        st.session_state.assessments = st.session_state.assessments[:30]
+        user_id = get_user_id()
+        with telemetry.span("save_assessment"):
+            try:
+                HISTORY_STORE.append(user_id, entry)
+                TREND_STORE.record(user_id, entry)
+                ROLLUPS.record(user_id, entry, team=team, department=ORG_TEAMS.get(team))
+            except shared_state.STORAGE_ERRORS:
+                st.info("Your history is unavailable right now, so this assessment was not saved.")
+        telemetry.histogram("submit").observe(time.perf_counter() - submit_started)
         
-        # Persist analysis and mail in session, then render via a pure function so buttons don't collapse the UI
+        # Persist analysis and mail in session; the results panel renders them on every run
         st.session_state.analysis = analysis
-        st.session_state.generated_leave_mail = generate_leave_mail() if analysis['leave_type'] in ['full_day_leave', 'half_day_leave'] else None
-        render_analysis_ui(st.session_state.analysis, st.session_state.generated_leave_mail)
+        st.session_state.generated_leave_mail = leave_mail
+        if SHARED_STATE is not None and signed_in():
+            try:
+                SHARED_STATE.set(f"results:{user_id}", {'analysis': analysis, 'leave_mail': leave_mail}, ttl=24 * 3600)
+            except shared_state.STORAGE_ERRORS:
+                pass  # only needed if the session moves to another replica
+    
+    results_panel()
+    
+    render_trends(get_user_id())
+    if AUTH_ENABLED and not signed_in():
+        st.button("🔐 Sign in to keep your history between visits", on_click=st.login)
     
     # Footer
     st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #666; font-size: 0.9rem; padding: 1.5rem; font-family: Lexend Deca, sans-serif;">
-        <strong style="color: #666; font-family: Lexend Deca, sans-serif;">Your wellbeing matters.</strong> This tool provides guidance, not medical advice.<br>
-        For serious mental health concerns, please consult a healthcare professional.
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(ui_html.footer_html(), unsafe_allow_html=True)
+    
+    record_cpu('full', started)
 
 if __name__ == "__main__":
-    main()
+    if PROFILE_RERUNS:
+        with telemetry.profile_rerun(PROFILE_DIR, PROFILE_RERUNS):
+            main()
+    else:
+        main()
 
@@ -0,0 +1,164 @@
+"""Pluggable model backends.
+
+Everything that talks to a model only needs ``generate_content(prompt,
+stream=False, generation_config=None)`` returning objects with ``.text``
+(and optionally ``.usage_metadata``), which is the ``genai.GenerativeModel``
+interface. ``create_model()`` builds one of:
+
+- ``gemini``: the real API (``leave_analysis.create_model``),
+- ``stub``: a local, deterministic model answering from the scoring
+  heuristic, with configurable latency, jitter and injected errors, for load
+  tests and benchmarks on machines without network access,
+- ``local``: a small instruction-tuned model on CPU through ``transformers``
+  (optional dependency, loaded on first use and shared by every client of the
+  process).
+
+All backends are wrapped in the given ApiGuard, so the quota, retry and
+circuit-breaker behaviour under test is the production one.
+"""
+import json
+import random
+import re
+import threading
+import time
+from functools import partial
+from types import SimpleNamespace
+
+import leave_analysis
+import registry
+from rate_limit import GuardedModel
+from scoring import fallback_analysis
+
+BACKENDS = ("gemini", "stub", "local")
+
+# build_prompt() label -> questionnaire field
+_PAYLOAD_FIELDS = {
+    'mood': 'mood',
+    'energy': 'energy',
+    'sleep': 'sleep',
+    'work_pressure': 'work_pressure',
+    'personal_stress': 'personal_stress',
+    'symptoms': 'physical_symptoms',
+    'last_break': 'last_break',
+    'tomorrow': 'tomorrow_importance',
+    'support': 'support',
+    'leave_balance': 'leave_balance',
+}
+_NUMERIC = ('energy', 'sleep', 'work_pressure', 'personal_stress')
+_REASON = re.compile(r'single reason: (.+?)\.\n')
+
+
+class StubError(Exception):
+    """Error injected by the stub backend (worded like the real API's)"""
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class StubModel:
+    """Deterministic offline stand-in for Gemini.
+
+    Analysis prompts are answered with ``scoring.fallback_analysis()`` of the
+    parsed payload, mail prompts with a template mail for the requested
+    reason. ``latency`` (seconds, plus up to ``jitter``) is spent per call,
+    spread over the chunks when streaming. ``error_rate`` and
+    ``rate_limit_rate`` are the probabilities of failing with a 503 or a 429.
+    """
+
+    def __init__(self, system_instruction=None, latency=0.5, jitter=0.2, error_rate=0.0,
+                 rate_limit_rate=0.0, chunk_size=40, seed=None):
+        self.system_instruction = system_instruction
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_size = chunk_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        with self._lock:
+            roll = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if roll < self.error_rate:
+            time.sleep(delay / 2)
+            raise StubError("503 Service Unavailable (injected by stub backend)")
+        if roll < self.error_rate + self.rate_limit_rate:
+            raise StubError("429 Resource exhausted: quota exceeded (injected by stub backend)")
+
+        text = self._answer(prompt)
+        usage = SimpleNamespace(
+            prompt_token_count=_estimate_tokens((self.system_instruction or '') + prompt),
+            candidates_token_count=_estimate_tokens(text),
+        )
+        if not stream:
+            time.sleep(delay)
+            return SimpleNamespace(text=text, usage_metadata=usage)
+        return self._stream(text, delay, usage)
+
+    def _stream(self, text, delay, usage):
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or ['']
+        for index, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            yield SimpleNamespace(text=chunk, usage_metadata=usage if index == len(chunks) - 1 else None)
+
+    def _answer(self, prompt):
+        reason = _REASON.search(prompt)
+        if reason:
+            return (
+                "Subject: Leave Application for Tomorrow\n\nDear Manager,\n\n"
+                f"I am unable to come to work tomorrow due to {reason.group(1)}. "
+                "I will hand over urgent tasks today.\n\nBest regards,\n[Your Name]"
+            )
+        data = {}
+        for line in prompt.splitlines():
+            label, _, value = line.partition(': ')
+            field = _PAYLOAD_FIELDS.get(label.strip())
+            if field:
+                data[field] = int(value.split('/')[0]) if field in _NUMERIC else value.strip()
+        return json.dumps(fallback_analysis(data))
+
+
+def _load_pipeline(model_name):
+    try:
+        from transformers import pipeline
+    except ImportError as e:
+        raise RuntimeError("The local backend needs `pip install transformers torch`") from e
+    # One generation at a time on the CPU, whichever client asks
+    return pipeline("text-generation", model=model_name, device="cpu"), threading.Lock()
+
+
+class LocalModel:
+    """Small instruction-tuned model on CPU via ``transformers`` (optional dependency).
+
+    The weights and tokenizer are loaded once per process and model name
+    (``registry``) and shared by every LocalModel, whatever its system
+    instruction.
+    """
+
+    def __init__(self, system_instruction=None, model_name="Qwen/Qwen2.5-0.5B-Instruct", max_new_tokens=400):
+        self.system_instruction = system_instruction
+        self.max_new_tokens = max_new_tokens
+        self._generate, self._lock = registry.shared("local model", model_name, partial(_load_pipeline, model_name))
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        messages = [{"role": "user", "content": prompt}]
+        if self.system_instruction:
+            messages.insert(0, {"role": "system", "content": self.system_instruction})
+        with self._lock:
+            output = self._generate(messages, max_new_tokens=self.max_new_tokens, do_sample=False)
+        text = output[0]["generated_text"][-1]["content"]
+        response = SimpleNamespace(text=text, usage_metadata=None)
+        return [response] if stream else response
+
+
+def create_model(backend, api_key, guard, system_instruction=None, **options):
+    """Model for ``backend`` (one of BACKENDS) routed through ``guard``"""
+    if backend == "gemini":
+        return leave_analysis.create_model(api_key, guard, system_instruction)
+    if backend == "stub":
+        return GuardedModel(StubModel(system_instruction, **options), guard)
+    if backend == "local":
+        return GuardedModel(LocalModel(system_instruction, **options), guard)
+    raise ValueError(f"Unknown model backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
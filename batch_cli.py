@@ -0,0 +1,275 @@
+"""Headless bulk processing of questionnaire records.
+
+Reads a CSV or JSONL file whose rows use the same keys as the ``data`` dict in
+app.py's ``main()``, runs every row through the analysis pipeline with bounded
+concurrency and writes one JSON result per line, in input order. A malformed
+row (a missing field, a slider that is not a whole number) gets a result with
+``"source": "error"`` and the error message instead of an analysis.
+
+    GEMINI_API_KEY=... python batch_cli.py survey.csv results.jsonl --concurrency 8
+
+Rows are streamed, so memory use does not grow with the file size. Progress is
+checkpointed next to the output file; re-running the same command resumes
+where the previous run stopped.
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import backends
+import leave_analysis
+import structured_output
+import token_usage
+from rate_limit import ApiGuard
+from scoring import fallback_analysis
+from single_flight import SingleFlight
+
+INT_FIELDS = ('energy', 'sleep', 'work_pressure', 'personal_stress')
+# What the local fallback needs, so every valid row gets at least that analysis
+REQUIRED_FIELDS = INT_FIELDS + ('leave_balance',)
+WEATHER_FIELDS = ('temp_high', 'temp_low', 'condition', 'rain_chance')
+
+DEFAULT_WEATHER = {
+    "temp_high": 30,
+    "temp_low": 24,
+    "condition": "Partly cloudy",
+    "rain_chance": 20
+}
+
+
+def read_records(path):
+    """Yield raw rows one at a time from a CSV (dicts) or JSONL (lines) file; see ``parse_record``"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.endswith('.jsonl'):
+            yield from (line for line in handle if line.strip())
+        else:
+            yield from csv.DictReader(handle)
+
+
+def parse_record(row):
+    """Questionnaire dict from a raw row; raises ValueError if the row is malformed"""
+    if isinstance(row, str):
+        row = json.loads(row)
+        if not isinstance(row, dict):
+            raise ValueError("Expected a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if row.get(field) in ('', None)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}")
+    for field in INT_FIELDS:
+        try:
+            row[field] = int(row[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} is not a whole number: {row[field]!r}") from None
+    return row
+
+
+def split_weather(row, default_weather):
+    """Separate per-row weather columns (if any) from the questionnaire fields"""
+    if all(field in row and row[field] not in ('', None) for field in WEATHER_FIELDS):
+        weather = {field: row.pop(field) for field in WEATHER_FIELDS}
+        for field in ('temp_high', 'temp_low', 'rain_chance'):
+            weather[field] = int(float(weather[field]))
+        return row, weather
+    return row, default_weather
+
+
+class Checkpoint:
+    """Number of rows already written and the output size at that point.
+
+    Results are written in input order, so one counter is enough to resume.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                state = json.load(handle)
+            return state['rows'], state['offset']
+        except (OSError, ValueError, KeyError):
+            return 0, 0
+
+    def save(self, rows, offset):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump({'rows': rows, 'offset': offset}, handle)
+        os.replace(tmp_path, self.path)
+
+
+def analyze_or_fallback(model, data, weather, cache=None, flights=None):
+    """Analyse one record; falls back to the local model if Gemini fails.
+
+    Rate limiting and retries happen inside the GuardedModel.
+    """
+    try:
+        return leave_analysis.analyze(model, data, weather, cache=cache, flights=flights), 'gemini'
+    except Exception:
+        return fallback_analysis(data), 'fallback'
+
+
+class LatencySample:
+    """Fixed-size reservoir of latencies so percentiles use constant memory"""
+
+    def __init__(self, size=10000):
+        self.size = size
+        self.values = []
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.max = max(self.max, value)
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < self.size:
+                self.values[slot] = value
+
+    def percentile(self, fraction):
+        if not self.values:
+            return 0.0
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(args, model, cache=None, log=sys.stderr):
+    checkpoint = Checkpoint(args.checkpoint or args.output + '.ckpt')
+    done_rows, offset = checkpoint.load() if not args.restart else (0, 0)
+    default_weather = json.loads(args.weather) if args.weather else DEFAULT_WEATHER
+
+    if not os.path.exists(args.output):
+        done_rows, offset = 0, 0
+
+    # Drop anything written after the last checkpoint so resumed output has no duplicates
+    output = open(args.output, 'r+' if done_rows else 'w', encoding='utf-8')
+    output.seek(offset)
+    output.truncate()
+
+    latencies = LatencySample()
+    counts = {'gemini': 0, 'fallback': 0, 'error': 0}
+    started = time.perf_counter()
+    window = args.concurrency * 2
+    # Duplicate rows processed at the same time share one call
+    flights = SingleFlight()
+
+    def process(index, row):
+        t0 = time.perf_counter()
+        try:
+            data, weather = split_weather(parse_record(row), default_weather)
+            if args.fallback_only:
+                result, source = fallback_analysis(data), 'fallback'
+            else:
+                result, source = analyze_or_fallback(model, data, weather, cache=cache, flights=flights)
+        except Exception as e:
+            # A bad row gets an error record, so the run (and the checkpoint) moves past it
+            return {'row': index, 'source': 'error', 'latency_ms': round((time.perf_counter() - t0) * 1000, 1),
+                    'error': f"{type(e).__name__}: {e}"}
+        latency = time.perf_counter() - t0
+        return {'row': index, 'source': source, 'latency_ms': round(latency * 1000, 1),
+                'input': data, 'analysis': result}
+
+    pending = deque()
+    written = done_rows
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for index, row in enumerate(read_records(args.input)):
+                if index < done_rows:
+                    continue
+                pending.append(pool.submit(process, index, row))
+                # Write finished rows in order; once the window is full, wait for the oldest
+                # so at most 2x concurrency rows are held in memory
+                while pending and (pending[0].done() or len(pending) >= window):
+                    written = _write(pending.popleft().result(), output, latencies, counts, written)
+                    if written % args.checkpoint_every == 0:
+                        output.flush()
+                        checkpoint.save(written, output.tell())
+            while pending:
+                written = _write(pending.popleft().result(), output, latencies, counts, written)
+    finally:
+        output.flush()
+        checkpoint.save(written, output.tell())
+        output.close()
+
+    elapsed = time.perf_counter() - started
+    processed = written - done_rows
+    report = {
+        'processed': processed,
+        'resumed_from': done_rows,
+        'elapsed_s': round(elapsed, 2),
+        'records_per_s': round(processed / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(latencies.percentile(0.50) * 1000, 1),
+            'p95': round(latencies.percentile(0.95) * 1000, 1),
+            'p99': round(latencies.percentile(0.99) * 1000, 1),
+            'max': round(latencies.max * 1000, 1),
+        },
+        'sources': counts,
+        'coalescing': flights.stats(),
+        'parse': structured_output.stats(),
+        'tokens': token_usage.METER.stats(),
+    }
+    print(json.dumps(report, indent=2), file=log)
+    return report
+
+
+def _write(record, output, latencies, counts, written):
+    output.write(json.dumps(record, ensure_ascii=False) + '\n')
+    latencies.add(record['latency_ms'] / 1000)
+    counts[record['source']] += 1
+    return written + 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run questionnaire records through the leave analysis")
+    parser.add_argument("input", help="CSV or JSONL file of questionnaire records")
+    parser.add_argument("output", help="JSONL file to write results to")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel analyses (default: 4)")
+    parser.add_argument("--rpm", type=int, default=15, help="Gemini requests per minute quota (default: 15)")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per record on rate limits")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: OUTPUT.ckpt)")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Rows between checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--weather", help="Weather JSON used for rows without weather columns")
+    parser.add_argument("--cache", help="Analysis cache database (or shared_state URL) shared with the app")
+    parser.add_argument("--input-price", type=float, default=0.0, help="USD per million input tokens, for the cost report")
+    parser.add_argument("--output-price", type=float, default=0.0, help="USD per million output tokens, for the cost report")
+    parser.add_argument("--backend", choices=backends.BACKENDS, default="gemini", help="Model backend (default: gemini)")
+    parser.add_argument("--backend-options", default="{}", help='Backend options as JSON, e.g. \'{"latency": 0.2}\' for the stub')
+    parser.add_argument("--fallback-only", action="store_true", help="Score locally without calling Gemini")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    model = None
+    if not args.fallback_only:
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if args.backend == "gemini" and not api_key:
+            sys.exit("Set GEMINI_API_KEY or pass --fallback-only")
+        # Batch runs can afford to wait for quota rather than fall back
+        guard = ApiGuard(requests_per_minute=args.rpm, max_retries=args.max_retries,
+                         max_wait=300.0, max_delay=60.0)
+        model = backends.create_model(args.backend, api_key, guard, leave_analysis.SYSTEM_INSTRUCTION,
+                                      **json.loads(args.backend_options))
+        token_usage.METER.input_price = args.input_price
+        token_usage.METER.output_price = args.output_price
+
+    cache = None
+    if args.cache:
+        from analysis_cache import get_cache
+        cache = get_cache(args.cache)
+
+    run(args, model, cache=cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Open-loop overload test of admission control for analysis calls.
+
+Submissions arrive at ``--rates`` per second (Poisson arrivals, for
+``--duration`` seconds each), drawn from the realistic answer distribution of
+``eval_prompt.traffic``. Each one is a streamed ``leave_analysis.analyze()``
+call to the stub backend behind an ``ApiGuard`` with a tight quota
+(``--rpm``), so past about rpm/60 submissions per second the API is the
+bottleneck. There is no analysis cache, so every submission needs a model
+call. Every rate is run without and with an ``AdmissionQueue`` (on the same
+guard), and latency
+(until the analysis or the fallback is ready) and the share answered by the
+model are reported per admission tier.
+
+    python benchmarks/bench_admission.py --rates 1 2 4 8 --rpm 120 --latency 1.5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backends
+import leave_analysis
+from admission import TIERS, AdmissionQueue, classify
+from eval_prompt import traffic
+from rate_limit import ApiGuard
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1) if values else None
+
+
+def replay(rate, duration, rpm, latency, admission=None, seed=7):
+    guard = ApiGuard(requests_per_minute=rpm, max_wait=10.0)
+    queue = AdmissionQueue(guard=guard, **admission) if admission is not None else None
+    model = backends.create_model("stub", None, guard, leave_analysis.SYSTEM_INSTRUCTION,
+                                  latency=latency, jitter=latency / 4, seed=seed)
+    results = {tier: {"latencies": [], "model": 0} for tier in TIERS}
+    lock = threading.Lock()
+
+    def submit(data, weather):
+        tier = classify(data)[0]
+        started = time.perf_counter()
+        try:
+            leave_analysis.analyze(model, data, weather, on_event=lambda *event: None, admission=queue)
+            answered = 1
+        except Exception:
+            answered = 0  # the app shows the local fallback
+        with lock:
+            results[tier]["latencies"].append(time.perf_counter() - started)
+            results[tier]["model"] += answered
+
+    rng = random.Random(seed)
+    arrivals = traffic(int(rate * duration * 2) + 10, seed=seed)
+    threads = []
+    started = time.perf_counter()
+    next_at = 0.0
+    while next_at < duration:
+        time.sleep(max(0.0, started + next_at - time.perf_counter()))
+        thread = threading.Thread(target=submit, args=next(arrivals))
+        thread.start()
+        threads.append(thread)
+        next_at += rng.expovariate(rate)
+    for thread in threads:
+        thread.join()
+
+    report = {}
+    for tier, values in results.items():
+        count = len(values["latencies"])
+        report[tier] = {
+            'submits': count,
+            'answered_by_model': round(values["model"] / count, 3) if count else None,
+            'latency_ms_p50': percentile(values["latencies"], 0.5),
+            'latency_ms_p95': percentile(values["latencies"], 0.95),
+        }
+    if queue is not None:
+        stats = queue.stats()
+        report['shed'] = {key: stats[key] for key in ('shed_estimate', 'shed_full', 'shed_timeout', 'shed_ratio')}
+    return report
+
+
+def run(rates=(1, 2, 4, 8), duration=20.0, rpm=120, latency=1.5, workers=8, max_queue=32, max_wait=4.0):
+    admission = {'workers': workers, 'max_queue': max_queue, 'max_wait': max_wait}
+    runs = [
+        {
+            'rate_per_s': rate,
+            'without_admission': replay(rate, duration, rpm, latency),
+            'with_admission': replay(rate, duration, rpm, latency, admission),
+        }
+        for rate in rates
+    ]
+    return {'rpm': rpm, 'model_latency_s': latency, 'duration_s': duration, 'workers': workers,
+            'max_queue': max_queue, 'max_wait_s': max_wait, 'runs': runs}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rates', type=float, nargs='+', default=[1, 2, 4, 8], help='Submissions per second')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds of arrivals per run')
+    parser.add_argument('--rpm', type=int, default=120, help='Guard quota in requests per minute')
+    parser.add_argument('--latency', type=float, default=1.5, help='Stub seconds per call')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent model calls with admission control')
+    parser.add_argument('--max-queue', type=int, default=32)
+    parser.add_argument('--max-wait', type=float, default=4.0, help="Routine requests' queue wait budget, seconds")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.rates, args.duration, args.rpm, args.latency, args.workers, args.max_queue,
+                         args.max_wait), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""Offline load test of the submit pipeline with the stub model backend.
+
+Simulates ``--sessions`` concurrent users. Each one submits a questionnaire
+``--submits`` times, going through the same path as the app: a streamed
+analysis with a speculative leave mail, the ApiGuard, the analysis cache,
+the single-flight group and the history and trend stores. The model is ``backends.StubModel`` with
+the given latency and injected error rates, so no network is needed. On
+failures the app's local fallback is used and counted.
+
+``--distinct`` limits the sessions to that many different questionnaires, the
+way answers repeat at a submission spike; ``--no-coalesce`` turns off the
+sharing of identical in-flight analyses to compare the number of model calls.
+
+    python benchmarks/bench_pipeline.py --sessions 300 --latency 0.8 --error-rate 0.02
+    python benchmarks/bench_pipeline.py --sessions 300 --distinct 40 [--no-coalesce]
+
+``--state`` keeps history, trends and the analysis cache on a shared_state
+backend (e.g. redis://127.0.0.1:6390/0) instead of SQLite files in a temp
+directory; bench_replicas.py runs several of these processes against one.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backends
+import leave_analysis
+import pipeline
+from analysis_cache import AnalysisCache, get_cache
+from history_store import HistoryStore, get_store
+from rate_limit import ApiGuard
+from scoring import fallback_analysis
+from single_flight import SingleFlight
+from trends import TrendStore, get_trend_store
+
+WEATHER = {"temp_high": 31, "temp_low": 25, "condition": "Rain", "rain_chance": 70}
+LEAVE_BALANCES = ["20+ days", "15-20 days", "10-15 days", "5-10 days", "1-5 days", "No leave left"]
+
+
+def questionnaire(rng):
+    return {
+        'mood': rng.choice(["Good", "Okay", "Struggling", "Exhausted"]),
+        'energy': rng.randint(1, 10),
+        'sleep': rng.randint(1, 10),
+        'work_pressure': rng.randint(1, 10),
+        'personal_stress': rng.randint(1, 10),
+        'physical_symptoms': "None",
+        'last_break': "2-6 months ago",
+        'tomorrow_importance': "Medium - some important items",
+        'support': "Good - some supportive people",
+        'leave_balance': rng.choice(LEAVE_BALANCES),
+    }
+
+
+def run(sessions=100, submits=1, latency=0.5, jitter=0.2, error_rate=0.0, rate_limit_rate=0.0, rpm=60000,
+        distinct=None, coalesce=True, state=None, start_at=None, user_prefix=""):
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    guard = ApiGuard(requests_per_minute=rpm, max_wait=10.0)
+    options = dict(latency=latency, jitter=jitter, error_rate=error_rate, rate_limit_rate=rate_limit_rate, seed=17)
+    analysis_model = backends.create_model("stub", None, guard, leave_analysis.SYSTEM_INSTRUCTION, **options)
+    mail_model = backends.create_model("stub", None, guard, **options)
+    if state:
+        cache, history, trends = get_cache(state), get_store(state), get_trend_store(state)
+    else:
+        cache = AnalysisCache(os.path.join(workdir, 'analyses.sqlite3'))
+        history = HistoryStore(os.path.join(workdir, 'history.sqlite3'))
+        trends = TrendStore(os.path.join(workdir, 'history.sqlite3'))
+    flights = SingleFlight() if coalesce else None
+    answers = [questionnaire(random.Random(index)) for index in range(distinct)] if distinct else None
+
+    latencies, first_field = [], []
+    outcomes = {"cache": 0, "model": 0, "fallback": 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(sessions)
+
+    def session(index):
+        rng = random.Random(index)
+        start_gate.wait()
+        if start_at is not None:
+            # Several processes start together (bench_replicas.py)
+            time.sleep(max(0.0, start_at - time.time()))
+        for _ in range(submits):
+            data = dict(rng.choice(answers)) if answers else questionnaire(rng)
+            started = time.perf_counter()
+            first = []
+
+            def on_event(kind, key, value):
+                if not first:
+                    first.append(time.perf_counter() - started)
+
+            def analyze():
+                try:
+                    analysis = leave_analysis.analyze(analysis_model, data, WEATHER, cache=cache,
+                                                      on_event=on_event, flights=flights, lookup=False)
+                    return analysis, "model"
+                except Exception:
+                    return fallback_analysis(data), "fallback"
+
+            (analysis, source), _ = _run(analyze, mail_model, lambda: leave_analysis.cached_analysis(data, WEATHER, cache))
+            entry = {**data, 'date': date.today().isoformat(),
+                     'wellness_score': analysis['wellness_score'], 'recommendation': analysis['leave_type']}
+            history.append(f"{user_prefix}user-{index}", entry)
+            trends.record(f"{user_prefix}user-{index}", entry)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                outcomes[source] += 1
+                if first:
+                    first_field.append(first[0])
+
+    threads = [threading.Thread(target=session, args=(index,)) for index in range(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    finished_at = time.time()
+
+    latencies.sort()
+    report = {
+        'sessions': sessions,
+        'submits': len(latencies),
+        'elapsed_s': round(elapsed, 2),
+        'submits_per_s': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+            'p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+            'p99': round(latencies[int(len(latencies) * 0.99)] * 1000, 1),
+            'max': round(latencies[-1] * 1000, 1),
+        },
+        'first_field_ms_median': round(statistics.median(first_field) * 1000, 1) if first_field else None,
+        'outcomes': outcomes,
+        'guard': guard.stats(),
+        'pipeline': pipeline.stats(),
+        'cache': cache.stats(),
+        'coalescing': flights.stats() if flights is not None else None,
+    }
+    if start_at is not None:
+        report['finished_at'] = finished_at
+    return report
+
+
+def _run(analyze, mail_model, cached):
+    # analyze() returns (analysis, source); run_pipeline only needs the analysis to decide on the mail
+    result = {'source': "cache"}
+
+    def analysis_only():
+        result['analysis'], result['source'] = analyze()
+        return result['analysis']
+
+    analysis, mail = pipeline.run_pipeline(
+        analysis_only,
+        lambda on_chunk=None: leave_analysis.generate_leave_mail(mail_model, on_chunk=on_chunk),
+        speculative=True,
+        ready=cached,
+    )
+    return (analysis, result['source']), mail
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--submits', type=int, default=1, help='Submits per session')
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub seconds per call')
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of calls failing with a 503')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of calls failing with a 429')
+    parser.add_argument('--rpm', type=int, default=60000, help='Guard quota in requests per minute')
+    parser.add_argument('--distinct', type=int, help='Number of different questionnaires the sessions pick from')
+    parser.add_argument('--no-coalesce', action='store_true', help='Do not share identical in-flight analyses')
+    parser.add_argument('--state', help='shared_state URL for history, trends and the analysis cache')
+    parser.add_argument('--start-at', type=float, help='Wall-clock time (epoch seconds) to start submitting')
+    parser.add_argument('--user-prefix', default='', help='Prefix of the simulated user ids')
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.sessions, args.submits, args.latency, args.jitter, args.error_rate,
+                         args.rate_limit_rate, args.rpm, args.distinct, not args.no_coalesce,
+                         args.state, args.start_at, args.user_prefix), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Memory and serialized size of assessment entries: dicts vs compact records.
+
+Builds ``--entries`` history entries from the realistic answer distribution
+of ``eval_prompt.traffic`` and reports, per entry:
+
+- memory (tracemalloc) of the entries as dicts loaded from storage (every
+  entry has its own copies of the strings), as ``records.Assessment`` objects,
+  as packed bytes, and as an Arrow table (pyarrow, optional),
+- serialized size as the JSON the history used to store, as a
+  ``shared_state.encode()`` payload, packed, and in Parquet and Arrow files,
+- the time to pack and unpack one entry.
+
+    python benchmarks/bench_records.py --entries 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import records
+import shared_state
+from eval_prompt import traffic
+from scoring import score
+
+
+def entries(count):
+    start = date(2026, 1, 1)
+    for index, (data, _) in enumerate(traffic(count)):
+        heuristic = score(data)
+        yield {**data, 'date': (start + timedelta(days=index % 365)).isoformat(),
+               'wellness_score': heuristic['wellness_score'], 'recommendation': heuristic['leave_type']}
+
+
+def memory_per_entry(build, count):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del built
+    return round(used / count, 1)
+
+
+def run(count=100000):
+    source = list(entries(count))
+    stored = [json.dumps(entry, ensure_ascii=False, separators=(',', ':')) for entry in source]
+    packed = [records.pack_entry(entry) for entry in source]
+    compact = [records.Assessment.unpack(data) for data in packed]
+
+    memory = {
+        'dict': memory_per_entry(lambda: [json.loads(text) for text in stored], count),
+        'record': memory_per_entry(lambda: [records.Assessment.unpack(data) for data in packed], count),
+        'packed': memory_per_entry(lambda: [record.pack() for record in compact], count),
+    }
+    size = {
+        'json': round(sum(len(text.encode()) for text in stored) / count, 1),
+        'shared_state': round(sum(len(shared_state.encode(entry)) for entry in source) / count, 1),
+        'packed': round(sum(len(data) for data in packed) / count, 1),
+    }
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        memory['arrow'] = round(records.to_arrow(compact).nbytes / count, 1)
+        workdir = tempfile.mkdtemp(prefix='bench-records-')
+        for name, write in (('parquet', records.write_parquet), ('arrow', records.write_arrow)):
+            path = os.path.join(workdir, f"history.{name}")
+            write(path, compact)
+            size[name] = round(os.path.getsize(path) / count, 1)
+
+    number = min(count, 20000)
+    sample = source[:number]
+    return {
+        'entries': count,
+        'memory_bytes_per_entry': memory,
+        'serialized_bytes_per_entry': size,
+        'memory_reduction': round(memory['dict'] / memory['record'], 1),
+        'size_reduction': round(size['json'] / size['packed'], 1),
+        'pack_us': round(timeit.timeit(lambda: [records.pack_entry(entry) for entry in sample], number=1) / number * 1e6, 2),
+        'unpack_us': round(timeit.timeit(lambda: [records.unpack_entry(data) for data in packed[:number]], number=1) / number * 1e6, 2),
+        'json_loads_us': round(timeit.timeit(lambda: [json.loads(text) for text in stored[:number]], number=1) / number * 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.entries), indent=2))
+
+
+if __name__ == '__main__':
+    main()
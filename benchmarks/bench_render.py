@@ -0,0 +1,128 @@
+"""Render micro-benchmark: payload bytes and CPU per rerun of the results page.
+
+Runs the page with Streamlit's AppTest, with a finished analysis (and leave
+mail) already in session state, so every rerun paints the full results view
+without calling Gemini. Reported per rerun:
+
+- ``payload_bytes``: serialized size of every element the script sends, i.e.
+  what goes over the websocket to the browser,
+- ``cpu_ms``: process CPU time of the rerun,
+- ``html_build_us``: time to build the results HTML with ``ui_html`` the first
+  time (cold) and on later reruns (memoized).
+
+To compare before/after, point ``--script`` at an older checkout (for example
+one made with ``git worktree add``); ``html_build_us`` is only reported for
+the current tree.
+
+    python benchmarks/bench_render.py --reruns 50
+    python benchmarks/bench_render.py --script /tmp/old/app.py
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ANALYSIS = {
+    "wellness_score": 32,
+    "leave_type": "full_day_leave",
+    "confidence": 85,
+    "main_reason": "High stress with little sleep",
+    "decision_summary": "Your stress and sleep levels suggest a full day of rest will help you recover.",
+    "work_activities": ["Take short breaks every hour", "Focus on one task at a time", "Leave on time"],
+    "work_avoid": ["Long meetings", "Taking work home"],
+    "leave_activities": ["Sleep in without an alarm", "Take a slow walk outside", "Read something light", "Call a friend"],
+    "leave_avoid": ["Checking work email", "Doom-scrolling", "Heavy chores"],
+    "warning_signs": ["Trouble sleeping", "Irritability", "Constant fatigue"],
+    "recovery_estimate": "1-2 days of proper rest",
+}
+LEAVE_MAIL = (
+    "Subject: Leave Application for Tomorrow\n\nDear Manager,\n\n"
+    "I am not feeling well and would like to request a day of leave tomorrow.\n\n"
+    "Best regards,\n[Your Name]"
+)
+
+
+def _elements(node):
+    children = getattr(node, 'children', None)
+    if children is None:
+        yield node
+        return
+    for child in children.values():
+        yield from _elements(child)
+
+
+def payload_bytes(at):
+    return sum(element.proto.ByteSize() for element in _elements(at._tree) if getattr(element, 'proto', None) is not None)
+
+
+def run_page(script, reruns=30):
+    from streamlit.testing.v1 import AppTest
+
+    workdir = tempfile.mkdtemp(prefix='bench-render-')
+    at = AppTest.from_file(script, default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = "benchmark"
+    at.secrets["ANALYSIS_CACHE_PATH"] = os.path.join(workdir, 'analyses.sqlite3')
+    at.secrets["HISTORY_DB_PATH"] = os.path.join(workdir, 'history.sqlite3')
+    at.session_state["analysis"] = ANALYSIS
+    at.session_state["generated_leave_mail"] = LEAVE_MAIL
+    at.run()  # warm-up: imports, caches, first render
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+    cpu, sizes = [], []
+    for _ in range(reruns):
+        started = time.process_time()
+        at.run()
+        cpu.append(time.process_time() - started)
+        sizes.append(payload_bytes(at))
+    return {
+        'script': script,
+        'reruns': reruns,
+        'payload_bytes': int(statistics.median(sizes)),
+        'cpu_ms': {
+            'median': round(statistics.median(cpu) * 1000, 2),
+            'mean': round(statistics.mean(cpu) * 1000, 2),
+        },
+    }
+
+
+def html_build_us(number=2000):
+    sys.path.insert(0, ROOT)
+    import ui_html
+
+    def cold():
+        ui_html._analysis_html.cache_clear()
+        for builder in (ui_html.decision_card_html, ui_html.item_html, ui_html.warning_signs_html,
+                        ui_html.recovery_html, ui_html.list_heading_html):
+            builder.cache_clear()
+        ui_html.analysis_html(ANALYSIS, "Take Full Day Off", LEAVE_MAIL)
+
+    def warm():
+        ui_html.analysis_html(ANALYSIS, "Take Full Day Off", LEAVE_MAIL)
+
+    return {
+        'cold': round(timeit.timeit(cold, number=number) / number * 1e6, 2),
+        'memoized': round(timeit.timeit(warm, number=number) / number * 1e6, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default=os.path.join(ROOT, 'app.py'))
+    parser.add_argument('--reruns', type=int, default=30)
+    args = parser.parse_args(argv)
+    script = os.path.abspath(args.script)
+    report = run_page(script, args.reruns)
+    if script == os.path.join(ROOT, 'app.py'):
+        report['html_build_us'] = html_build_us()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Scale-out test: N app replicas sharing one state backend.
+
+Starts the local RESP stand-in (or uses ``--state``), then for each replica
+count runs that many ``bench_pipeline.py`` processes at the same moment,
+with the sessions split between them. Every replica serves the same user
+ids, so afterwards each user must have one history entry and one trend
+update per replica; that checks session continuity across replicas (no lost
+or unseen writes). Reported per replica count: cluster submits/s, speed-up
+over one replica, p95 latency and the continuity check.
+
+    python benchmarks/bench_replicas.py --replicas 1 2 4 --sessions 200
+    python benchmarks/bench_replicas.py --state sqlite:////tmp/state.sqlite3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+import shared_state
+from history_store import SharedHistoryStore
+from resp_standin import StandinServer
+from trends import SharedTrendStore
+
+
+def run_replicas(state, replicas, sessions, latency, namespace):
+    per_replica = max(1, sessions // replicas)
+    start_at = time.time() + 3.0 + 1.5 * replicas  # time for every process to import and set up
+    processes = [
+        subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'bench_pipeline.py'), '--sessions', str(per_replica),
+             '--latency', str(latency), '--state', state, '--start-at', str(start_at), '--user-prefix', namespace],
+            stdout=subprocess.PIPE, text=True, cwd=ROOT,
+        )
+        for _ in range(replicas)
+    ]
+    reports = [json.loads(process.communicate()[0]) for process in processes]
+    elapsed = max(report['finished_at'] for report in reports) - start_at
+    submits = sum(report['submits'] for report in reports)
+
+    backend = shared_state.open_backend(state)
+    history, trends = SharedHistoryStore(backend), SharedTrendStore(backend)
+    users = [f"{namespace}user-{index}" for index in range(per_replica)]
+    continuous = sum(
+        history.count(user) == replicas and (trends.latest(user) or {}).get('total') == replicas
+        for user in users
+    )
+    return {
+        'replicas': replicas,
+        'submits': submits,
+        'elapsed_s': round(elapsed, 2),
+        'submits_per_s': round(submits / elapsed, 1),
+        'latency_ms_p95_max': max(report['latency_ms']['p95'] for report in reports),
+        'users_seen_by_every_replica': f"{continuous}/{len(users)}",
+    }
+
+
+def run(replica_counts=(1, 2, 4), sessions=200, latency=0.5, state=None):
+    server = None
+    if state is None:
+        server = StandinServer().start()
+        state = server.url
+    results = []
+    try:
+        for replicas in replica_counts:
+            # Fresh user ids per run, so the continuity check only counts this run's writes
+            results.append(run_replicas(state, replicas, sessions, latency, namespace=f"r{replicas}-{time.time_ns()}-"))
+    finally:
+        if server is not None:
+            server.shutdown()
+    base = results[0]['submits_per_s'] / results[0]['replicas']
+    for result in results:
+        result['speedup'] = round(result['submits_per_s'] / base, 2)
+    return {'state': state.split('://')[0], 'sessions': sessions, 'model_latency_s': latency, 'runs': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--sessions', type=int, default=200, help='Concurrent sessions, split between the replicas')
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub model seconds per call')
+    parser.add_argument('--state', help='shared_state URL (default: a local RESP stand-in)')
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.replicas, args.sessions, args.latency, args.state), indent=2))
+
+
+if __name__ == '__main__':
+    main()
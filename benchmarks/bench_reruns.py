@@ -0,0 +1,72 @@
+"""Server CPU per rerun, measured with Streamlit's AppTest.
+
+Runs the page N times with different slider values and reports process CPU
+per full script run. When the app records its own per-session counters
+(``st.session_state.cpu_stats``), the fragment-only figures are reported too.
+
+The questionnaire is an ``st.form``, so in a browser moving a slider costs no
+rerun at all. AppTest cannot show that directly, so to compare before/after,
+point ``--script`` at an older checkout (for example one made with
+``git worktree add``) and compare the full-run numbers.
+
+    python benchmarks/bench_reruns.py --reruns 50
+    python benchmarks/bench_reruns.py --script /tmp/old/app.py
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(script, reruns=30, secrets=None):
+    from streamlit.testing.v1 import AppTest
+
+    workdir = tempfile.mkdtemp(prefix='bench-reruns-')
+    at = AppTest.from_file(script, default_timeout=60)
+    at.secrets["GEMINI_API_KEY"] = "benchmark"
+    at.secrets["ANALYSIS_CACHE_PATH"] = os.path.join(workdir, 'analyses.sqlite3')
+    at.secrets["HISTORY_DB_PATH"] = os.path.join(workdir, 'history.sqlite3')
+    for key, value in (secrets or {}).items():
+        at.secrets[key] = value
+    at.run()  # warm-up: imports, caches, first render
+
+    samples = []
+    for i in range(reruns):
+        at.slider[0].set_value(1 + i % 10)
+        started = time.process_time()
+        at.run()
+        samples.append(time.process_time() - started)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    report = {
+        'script': script,
+        'reruns': reruns,
+        'full_rerun_cpu_ms': {
+            'median': round(statistics.median(samples) * 1000, 2),
+            'mean': round(statistics.mean(samples) * 1000, 2),
+            'max': round(max(samples) * 1000, 2),
+        },
+    }
+    if 'cpu_stats' in at.session_state:
+        report['session_cpu_stats'] = {
+            kind: {'runs': runs, 'cpu_ms_per_run': round(seconds / runs * 1000, 2)}
+            for kind, (runs, seconds) in at.session_state['cpu_stats'].items()
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default=os.path.join(ROOT, 'app.py'))
+    parser.add_argument('--reruns', type=int, default=30)
+    args = parser.parse_args(argv)
+    print(json.dumps(run(os.path.abspath(args.script), args.reruns), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Load test of the organisation rollups: query latency vs organisation size.
+
+For each ``--employees`` count, simulates ``--days`` days of assessments
+(each person saves one on a share ``--participation`` of the days, about 25
+people per team and 10 teams per department) and writes them through
+``RollupStore.record_many()``. The same rows also go into a plain table of
+raw assessments. Then it times the dashboard's queries:
+
+- ``overview``: this week's bucket for every team,
+- ``series``: 12 weekly buckets of a random team,
+
+and the same team overview computed from the raw rows with GROUP BY. Reads
+are served from the store's per-week cache, so ``overview_after_record``
+times a ``record()`` followed by an overview, which recomputes the week. The
+numbers of every team the overview shows are checked against it, and the
+share of teams hidden (below ``min_group`` or by complementary suppression)
+is reported. The latency of a single ``record()`` (the app's write path) is
+reported too.
+
+    python benchmarks/bench_rollups.py --employees 1000 5000 20000 --days 28
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import shared_state
+from rollups import RollupStore, SharedRollupStore, period_start
+from scoring import score
+
+TEAM_SIZE = 25
+TEAMS_PER_DEPARTMENT = 10
+TODAY = date(2026, 10, 16)  # a Friday, so this week has five days of data
+
+
+def assessments(employees, days, participation, seed=3):
+    rng = random.Random(seed)
+    for offset in range(days - 1, -1, -1):
+        day = (TODAY - timedelta(days=offset)).isoformat()
+        for person in range(employees):
+            if rng.random() >= participation:
+                continue
+            team = person // TEAM_SIZE
+            data = {'energy': rng.randint(1, 10), 'sleep': rng.randint(2, 10), 'work_pressure': rng.randint(1, 10),
+                    'personal_stress': rng.randint(1, 8), 'leave_balance': "10-15 days"}
+            heuristic = score(data)
+            entry = {'date': day, 'wellness_score': heuristic['wellness_score'], 'recommendation': heuristic['leave_type']}
+            yield f"user-{person}", entry, f"team-{team}", f"dept-{team // TEAMS_PER_DEPARTMENT}"
+
+
+def raw_overview(conn, start, end, min_group):
+    rows = conn.execute(
+        "SELECT team, COUNT(DISTINCT user_id), COUNT(*), AVG(wellness_score),"
+        " COUNT(DISTINCT CASE WHEN recommendation = 'full_day_leave' THEN user_id END),"
+        " COUNT(DISTINCT CASE WHEN recommendation = 'half_day_leave' THEN user_id END)"
+        " FROM assessments WHERE date BETWEEN ? AND ? GROUP BY team ORDER BY team",
+        (start, end),
+    ).fetchall()
+    return {f"team:{team}": (people, count, round(wellness, 1), full, half)
+            for team, people, count, wellness, full, half in rows if people >= min_group}
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return {'p50_ms': round(durations[len(durations) // 2] * 1000, 3),
+            'p95_ms': round(durations[int(len(durations) * 0.95)] * 1000, 3)}
+
+
+def run_size(employees, days, participation, repeat, state):
+    workdir = tempfile.mkdtemp(prefix='bench-rollups-')
+    if state:
+        store = SharedRollupStore(shared_state.open_backend(state))
+    else:
+        store = RollupStore(os.path.join(workdir, 'rollups.sqlite3'))
+    raw = sqlite3.connect(os.path.join(workdir, 'raw.sqlite3'), isolation_level=None)
+    raw.execute("CREATE TABLE assessments (user_id TEXT, team TEXT, date TEXT, wellness_score INTEGER, recommendation TEXT)")
+    raw.execute("CREATE INDEX assessments_date ON assessments(date)")
+
+    rows = list(assessments(employees, days, participation))
+    started = time.perf_counter()
+    for i in range(0, len(rows), 5000):
+        store.record_many(rows[i:i + 5000])
+    write_s = time.perf_counter() - started
+    raw.execute("BEGIN")
+    raw.executemany("INSERT INTO assessments VALUES (?, ?, ?, ?, ?)",
+                    [(user, team, entry['date'], entry['wellness_score'], entry['recommendation'])
+                     for user, entry, team, _ in rows])
+    raw.execute("COMMIT")
+
+    week = period_start(TODAY, "week")
+    teams = sorted({team for _, _, team, _ in rows})
+    rng = random.Random(5)
+    overview = store.overview("team", "week", TODAY)
+    expected = raw_overview(raw, week.isoformat(), TODAY.isoformat(), store.min_group)
+    shown = {
+        row['scope']: (row['people'], row['assessments'], row['mean_wellness'], row['full_day_leave'], row['half_day_leave'])
+        for row in overview if not row['suppressed']
+    }
+    matches = all(expected.get(scope) == values for scope, values in shown.items())
+
+    single = timed(lambda: store.record(f"user-{rng.randrange(employees)}", rows[-1][1], rows[-1][2], rows[-1][3]), repeat)
+    return {
+        'employees': employees,
+        'assessments': len(rows),
+        'teams': len(teams),
+        'backfill_per_s': round(len(rows) / write_s),
+        'record_latency': single,
+        'overview_latency': timed(lambda: store.overview("team", "week", TODAY), repeat),
+        'overview_after_record_latency': timed(lambda: (store.record(f"user-{rng.randrange(employees)}", *rows[-1][1:]),
+                                                        store.overview("team", "week", TODAY)), max(5, repeat // 10)),
+        'series_latency': timed(lambda: store.series(f"team:{rng.choice(teams)}", "week", 12, TODAY), repeat),
+        'raw_group_by_latency': timed(lambda: raw_overview(raw, week.isoformat(), TODAY.isoformat(), 5), max(5, repeat // 10)),
+        'matches_raw': matches,
+        'teams_hidden_small': round(1 - len(expected) / len(overview), 3),
+        'teams_hidden_complementary': round((len(expected) - len(shown)) / len(overview), 3),
+    }
+
+
+def run(sizes=(1000, 5000, 20000), days=28, participation=0.4, repeat=200, state=None):
+    return {
+        'days': days,
+        'participation': participation,
+        'state': state.split('://')[0] if state else 'sqlite',
+        'runs': [run_size(employees, days, participation, repeat, state) for employees in sizes],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--employees', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--participation', type=float, default=0.4, help='Share of days each person saves an assessment')
+    parser.add_argument('--repeat', type=int, default=200, help='Timed calls per query')
+    parser.add_argument('--state', help='shared_state URL for a SharedRollupStore (default: SQLite)')
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.employees, args.days, args.participation, args.repeat, args.state), indent=2))
+
+
+if __name__ == '__main__':
+    main()
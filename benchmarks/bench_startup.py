@@ -0,0 +1,103 @@
+"""Cold-start benchmark: import time and resident memory of app.py's imports.
+
+Each sample runs in a fresh interpreter, the way a new Streamlit worker starts.
+Only the module-level imports of app.py are executed (not the Streamlit page
+itself). The ``eager`` scenario adds the modules app.py used to import at
+the top (pandas, plotly, google.generativeai) for a before/after comparison.
+
+    python benchmarks/bench_startup.py --repeat 5
+    python benchmarks/bench_startup.py --max-import-ms 1500 --max-rss-mb 250   # fail on regression
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'app.py')
+
+EAGER_IMPORTS = [
+    'import pandas as pd',
+    'import plotly.graph_objects as go',
+    'import google.generativeai as genai',
+    'import requests',
+]
+
+PROBE = r'''
+import json, resource, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+for statement in {statements!r}:
+    exec(statement, {{}})
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss_kb //= 1024
+print(json.dumps({{"import_ms": elapsed * 1000, "rss_mb": rss_kb / 1024}}))
+'''
+
+
+def app_imports(path=APP):
+    """Source of every module-level import statement in app.py"""
+    with open(path, encoding='utf-8') as handle:
+        source = handle.read()
+    tree = ast.parse(source)
+    return [
+        ast.get_source_segment(source, node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+def sample(statements):
+    code = PROBE.format(root=ROOT, statements=statements)
+    output = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(statements, repeat):
+    # One throwaway run so the OS file cache is warm for every scenario alike
+    sample(statements)
+    runs = [sample(statements) for _ in range(repeat)]
+    return {
+        'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+        'rss_mb': round(statistics.median(run['rss_mb'] for run in runs), 1),
+    }
+
+
+def run(repeat=5):
+    lazy = app_imports()
+    eager = lazy + [statement for statement in EAGER_IMPORTS if statement not in lazy]
+    return {
+        'repeat': repeat,
+        'app': measure(lazy, repeat),
+        'eager': measure(eager, repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, help='Fail if app import time exceeds this')
+    parser.add_argument('--max-rss-mb', type=float, help='Fail if app RSS after import exceeds this')
+    args = parser.parse_args(argv)
+
+    report = run(args.repeat)
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if args.max_import_ms is not None and report['app']['import_ms'] > args.max_import_ms:
+        failures.append(f"import time {report['app']['import_ms']} ms > {args.max_import_ms} ms")
+    if args.max_rss_mb is not None and report['app']['rss_mb'] > args.max_rss_mb:
+        failures.append(f"RSS {report['app']['rss_mb']} MB > {args.max_rss_mb} MB")
+    if failures:
+        sys.exit('Cold-start regression: ' + '; '.join(failures))
+
+
+if __name__ == '__main__':
+    main()
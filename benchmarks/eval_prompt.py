@@ -0,0 +1,253 @@
+"""Offline evaluation of the compact analysis prompt against the original one.
+
+Runs a fixed, seeded set of questionnaire fixtures through a deterministic
+local stub that stands in for Gemini, once with the original single-message
+prompt (kept below as ``legacy_prompt``) and once through
+``leave_analysis.analyze()`` with the compact payload plus
+``SYSTEM_INSTRUCTION``. The stub reads the inputs from whichever prompt it
+gets and only applies a guidance rule (crisis scores, low leave balance,
+gloomy weather) when the rule's text is present, so guidance lost in the
+compaction shows up as disagreement. As a sensitivity check the compact
+payload is also run without the system instruction.
+
+Reports decision agreement and estimated input tokens per request (about
+4 characters per token); exits non-zero below ``--min-agreement``.
+
+    python benchmarks/eval_prompt.py --fixtures 500
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import leave_analysis
+import token_usage
+from questionnaire import OPTIONS
+from scoring import parse_leave_days, score
+from structured_output import parse_analysis
+
+CONDITIONS = ["Partly cloudy", "Rain throughout the day", "Clear", "Thunderstorms", "Overcast"]
+
+
+def legacy_prompt(data, weather):
+    """The original single-message analysis prompt (PROMPT_VERSION 1), the evaluation baseline"""
+    return f"""You are an intelligent work-life balance advisor. Analyze if this person should take leave tomorrow based on their mental state, workload, and external factors.
+
+CURRENT STATE:
+- Overall feeling: {data['mood']}
+- Energy level: {data['energy']}/10
+- Sleep quality: {data['sleep']}/10
+- Work pressure: {data['work_pressure']}/10
+- Personal life stress: {data['personal_stress']}/10
+- Physical symptoms: {data['physical_symptoms']}
+- Last break taken: {data['last_break']}
+- Tomorrow's work importance: {data['tomorrow_importance']}
+- Support system: {data['support']}
+- Leave balance remaining: {data['leave_balance']}
+
+WEATHER TOMORROW: {weather['temp_high']}°C/{weather['temp_low']}°C, {weather['condition']}, {weather['rain_chance']}% rain chance
+
+DECISION FRAMEWORK:
+- Full Day Leave: For burnout, severe stress, or mental health crisis
+- Half Day/Early Leave: For moderate stress with manageable work
+- Work Normally: For good mental state with support strategies
+- Consider weather impact on mood and recovery opportunities
+- Consider leave balance - if low, be more conservative
+
+Respond in this EXACT JSON format (ensure valid JSON):
+{{
+    "wellness_score": 45,
+    "leave_type": "full_day_leave",
+    "confidence": 82,
+    "main_reason": "Primary reason for recommendation",
+    "decision_summary": "Brief 2-sentence explanation of the decision",
+    "work_activities": ["3 things to do if working"],
+    "work_avoid": ["3 things to avoid if working"],
+    "leave_activities": ["4 recovery activities for leave day"],
+    "leave_avoid": ["3 things to avoid during leave"],
+    "warning_signs": ["signs requiring immediate attention"],
+    "recovery_estimate": "Expected recovery timeframe"
+}}
+
+Leave types: "full_day_leave", "half_day_leave", "work_with_care", "work_normally"
+
+SCORING GUIDE:
+- 80-100: Excellent state, work normally
+- 60-79: Good state, minor support needed
+- 40-59: Moderate stress, consider half day
+- 20-39: High stress, likely needs full day
+- 0-19: Crisis level, definitely needs leave
+
+Weather considerations:
+- Rainy/gloomy: May worsen mood, indoor recovery activities
+- Sunny/pleasant: Good for outdoor recovery, mood boost
+- Extreme weather: Affects commute stress and recovery options
+
+Leave balance considerations:
+- High balance (>15 days): More flexible with recommendations
+- Medium balance (5-15 days): Moderate recommendations
+- Low balance (<5 days): Conservative recommendations"""
+
+
+
+def fixtures(count, seed=14):
+    rng = random.Random(seed)
+    for _ in range(count):
+        data = {key: rng.choice(values) for key, values in OPTIONS.items()}
+        for key in ('energy', 'sleep', 'work_pressure', 'personal_stress'):
+            data[key] = rng.randint(1, 10)
+        high = rng.randint(22, 38)
+        weather = {
+            'temp_high': high,
+            'temp_low': high - rng.randint(3, 9),
+            'condition': rng.choice(CONDITIONS),
+            'rain_chance': rng.choice([0, 10, 20, 40, 60, 80, 95]),
+        }
+        yield data, weather
+
+
+def slider(rng, mean):
+    return max(1, min(10, round(rng.gauss(mean, 1.8))))
+
+
+def traffic(count, offices=5, seed=21):
+    """Realistic-ish submissions: sliders clustered around typical values, popular
+    selectbox answers, one forecast per office with small day-to-day drift"""
+    rng = random.Random(seed)
+    forecasts = []
+    for _ in range(offices):
+        high = rng.randint(26, 34)
+        forecasts.append({'temp_high': high, 'temp_low': high - 6,
+                          'condition': rng.choice(CONDITIONS), 'rain_chance': rng.choice([10, 40, 70])})
+    for _ in range(count):
+        # Earlier options are the more common answers (each half as likely as the one before)
+        data = {key: rng.choices(values, weights=[0.5 ** i for i in range(len(values))])[0] for key, values in OPTIONS.items()}
+        data.update(energy=slider(rng, 5), sleep=slider(rng, 6), work_pressure=slider(rng, 6), personal_stress=slider(rng, 4))
+        weather = dict(rng.choice(forecasts))
+        weather['temp_high'] += rng.choice([-1, 0, 0, 1])
+        yield data, weather
+
+
+def estimate_tokens(text):
+    return max(1, round(len(text) / 4))
+
+
+# Inputs as labelled in either prompt format
+FIELD_PATTERNS = {
+    'energy': r'(?:Energy level|energy): (\d+)/10',
+    'sleep': r'(?:Sleep quality|sleep): (\d+)/10',
+    'work_pressure': r'(?:Work pressure|work_pressure): (\d+)/10',
+    'personal_stress': r'(?:Personal life stress|personal_stress): (\d+)/10',
+    'leave_balance': r'(?:Leave balance remaining|leave_balance): (.+)',
+    'rain_chance': r'(\d+)% rain',
+}
+
+# Guidance the stub only follows when the prompt actually contains it
+RULES = {
+    'crisis': r'0-19: crisis',
+    'low_balance': r'<5 days\)?:? conservative',
+    'gloomy_weather': r'rainy/gloomy:? may worsen mood',
+}
+
+
+class StubModel:
+    """Deterministic stand-in for a Gemini model with an optional system instruction."""
+
+    def __init__(self, system_instruction=None):
+        self.system_instruction = system_instruction
+
+    def generate_content(self, prompt, stream=False, generation_config=None):
+        context = f"{self.system_instruction or ''}\n{prompt}"
+        text = json.dumps(self.decide(context))
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(context),
+                                candidates_token_count=estimate_tokens(text))
+        response = SimpleNamespace(text=text, usage_metadata=usage)
+        return [response] if stream else response
+
+    @staticmethod
+    def decide(context):
+        values = {key: re.search(pattern, context).group(1).strip() for key, pattern in FIELD_PATTERNS.items()}
+        data = {key: int(value) for key, value in values.items() if key != 'leave_balance'}
+        data['leave_balance'] = values['leave_balance']
+        result = score(data)
+        wellness, leave_type = result['wellness_score'], result['leave_type']
+        follows = {rule: re.search(pattern, context, re.I) is not None for rule, pattern in RULES.items()}
+
+        if follows['crisis'] and wellness < 20:
+            leave_type = "full_day_leave"
+        elif follows['low_balance'] and parse_leave_days(data['leave_balance']) < 5 and leave_type == "full_day_leave":
+            leave_type = "half_day_leave"
+        if follows['gloomy_weather'] and data['rain_chance'] >= 60 and leave_type == "work_normally" and wellness < 75:
+            leave_type = "work_with_care"
+
+        return {
+            "wellness_score": wellness,
+            "leave_type": leave_type,
+            "confidence": 80,
+            "main_reason": "stub",
+            "decision_summary": "stub",
+            "work_activities": [], "work_avoid": [], "leave_activities": [], "leave_avoid": [],
+            "warning_signs": [],
+            "recovery_estimate": "",
+        }
+
+
+def run(count=300):
+    legacy_model = StubModel()
+    compact_model = StubModel(system_instruction=leave_analysis.SYSTEM_INSTRUCTION)
+    bare_model = StubModel()
+
+    token_usage.METER.reset()
+    agree = bare_agree = 0
+    legacy_tokens = payload_tokens = 0
+    mismatches = []
+    for data, weather in fixtures(count):
+        prompt = legacy_prompt(data, weather)
+        legacy = parse_analysis(legacy_model.generate_content(prompt).text)
+        compact = leave_analysis.analyze(compact_model, data, weather)
+        bare = parse_analysis(bare_model.generate_content(leave_analysis.build_prompt(data, weather)).text)
+
+        legacy_tokens += estimate_tokens(prompt)
+        payload_tokens += estimate_tokens(leave_analysis.build_prompt(data, weather))
+        if (legacy['leave_type'], legacy['wellness_score']) == (compact['leave_type'], compact['wellness_score']):
+            agree += 1
+        elif len(mismatches) < 5:
+            mismatches.append({'data': data, 'weather': weather,
+                               'legacy': legacy['leave_type'], 'compact': compact['leave_type']})
+        bare_agree += legacy['leave_type'] == bare['leave_type']
+
+    system_tokens = estimate_tokens(leave_analysis.SYSTEM_INSTRUCTION)
+    return {
+        'fixtures': count,
+        'agreement': agree / count,
+        'agreement_without_system_instruction': bare_agree / count,
+        'mismatches': mismatches,
+        'input_tokens_per_request': {
+            'legacy_prompt': round(legacy_tokens / count, 1),
+            'compact_payload': round(payload_tokens / count, 1),
+            'system_instruction': system_tokens,
+            'compact_total': round(payload_tokens / count + system_tokens, 1),
+        },
+        'metered': token_usage.METER.stats(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', type=int, default=300)
+    parser.add_argument('--min-agreement', type=float, default=1.0)
+    args = parser.parse_args(argv)
+    report = run(args.fixtures)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report['agreement'] < args.min_agreement:
+        sys.exit(f"Compact prompt agreement {report['agreement']:.3f} < {args.min_agreement}")
+
+
+if __name__ == '__main__':
+    main()
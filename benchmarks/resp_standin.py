@@ -0,0 +1,232 @@
+"""Local stand-in for a Redis server, for benchmarks without a real one.
+
+Speaks RESP and implements the commands ``shared_state.RespBackend`` uses
+(GET, SET with PX, DEL, WATCH/MULTI/EXEC, ZADD, Z[REV]RANGEBYSCORE with
+LIMIT, ZREMRANGEBYSCORE, ZCARD, plus PING, SELECT, FLUSHDB). Each
+connection gets a thread; all commands run under one lock, so the server is
+as serial as Redis is.
+
+    python benchmarks/resp_standin.py --port 6390
+"""
+import argparse
+import bisect
+import socketserver
+import threading
+import time
+
+
+class _Error(Exception):
+    pass
+
+
+def _bound(text):
+    text = text.decode()
+    exclusive = text.startswith('(')
+    value = float(text.lstrip('('))
+    return value, exclusive
+
+
+class Store:
+    def __init__(self):
+        self.values = {}  # key -> (expires_at or None, bytes | sorted [(score, member)])
+        self.versions = {}  # key -> write counter, for WATCH
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self.values.get(key)
+        if entry is not None and entry[0] is not None and entry[0] <= time.time():
+            del self.values[key]
+            self._touch(key)
+            return None
+        return entry
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _zset(self, key, create=False):
+        entry = self._live(key)
+        if entry is None:
+            if not create:
+                return []
+            entry = self.values[key] = (None, [])
+        if not isinstance(entry[1], list):
+            raise _Error("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return entry[1]
+
+    def _select(self, members, low, high):
+        (lo_value, lo_exclusive), (hi_value, hi_exclusive) = low, high
+        return [
+            (score, member) for score, member in members
+            if (score > lo_value if lo_exclusive else score >= lo_value)
+            and (score < hi_value if hi_exclusive else score <= hi_value)
+        ]
+
+    def execute(self, args):
+        name = args[0].upper()
+        if name == b'PING':
+            return 'PONG'
+        if name in (b'SELECT', b'AUTH'):
+            return 'OK'
+        if name == b'FLUSHDB':
+            for key in self.values:
+                self._touch(key)
+            self.values.clear()
+            return 'OK'
+        if name == b'GET':
+            entry = self._live(args[1])
+            if entry is not None and isinstance(entry[1], list):
+                raise _Error("WRONGTYPE Operation against a key holding the wrong kind of value")
+            return entry[1] if entry is not None else None
+        if name == b'SET':
+            expires = None
+            if len(args) >= 5 and args[3].upper() == b'PX':
+                expires = time.time() + int(args[4]) / 1000
+            self.values[args[1]] = (expires, args[2])
+            self._touch(args[1])
+            return 'OK'
+        if name == b'DEL':
+            removed = 0
+            for key in args[1:]:
+                if self._live(key) is not None:
+                    del self.values[key]
+                    removed += 1
+                self._touch(key)
+            return removed
+        if name == b'ZADD':
+            members = self._zset(args[1], create=True)
+            score, member = float(args[2]), args[3]
+            existing = [i for i, (_, m) in enumerate(members) if m == member]
+            for i in reversed(existing):
+                del members[i]
+            bisect.insort(members, (score, member))
+            self._touch(args[1])
+            return 0 if existing else 1
+        if name in (b'ZRANGEBYSCORE', b'ZREVRANGEBYSCORE'):
+            members = self._zset(args[1])
+            if name == b'ZRANGEBYSCORE':
+                selected = self._select(members, _bound(args[2]), _bound(args[3]))
+            else:
+                selected = self._select(members, _bound(args[3]), _bound(args[2]))[::-1]
+            if len(args) >= 7 and args[4].upper() == b'LIMIT':
+                offset, count = int(args[5]), int(args[6])
+                selected = selected[offset:offset + count] if count >= 0 else selected[offset:]
+            return [member for _, member in selected]
+        if name == b'ZREMRANGEBYSCORE':
+            members = self._zset(args[1])
+            selected = set(self._select(members, _bound(args[2]), _bound(args[3])))
+            members[:] = [item for item in members if item not in selected]
+            self._touch(args[1])
+            return len(selected)
+        if name == b'ZCARD':
+            return len(self._zset(args[1]))
+        raise _Error(f"ERR unknown command '{args[0].decode()}'")
+
+
+def _encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, _Error):
+        return b'-%s\r\n' % str(reply).encode()
+    if isinstance(reply, str):
+        return b'+%s\r\n' % reply.encode()
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, bytes):
+        return b'$%d\r\n%s\r\n' % (len(reply), reply)
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(_encode(item) for item in reply)
+    raise TypeError(type(reply))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store = self.server.store
+        watched = {}  # key -> version when WATCHed
+        queued = None  # commands after MULTI
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            name = args[0].upper()
+            with store.lock:
+                try:
+                    if name == b'WATCH':
+                        for key in args[1:]:
+                            watched[key] = store.versions.get(key, 0)
+                        reply = 'OK'
+                    elif name == b'UNWATCH':
+                        watched.clear()
+                        reply = 'OK'
+                    elif name == b'MULTI':
+                        queued = []
+                        reply = 'OK'
+                    elif name == b'DISCARD':
+                        queued, reply = None, 'OK'
+                        watched.clear()
+                    elif name == b'EXEC':
+                        if queued is None:
+                            raise _Error("ERR EXEC without MULTI")
+                        if any(store.versions.get(key, 0) != version for key, version in watched.items()):
+                            reply = None
+                        else:
+                            reply = []
+                            for command in queued:
+                                try:
+                                    reply.append(store.execute(command))
+                                except _Error as e:
+                                    reply.append(e)
+                        queued = None
+                        watched.clear()
+                    elif queued is not None:
+                        queued.append(args)
+                        reply = 'QUEUED'
+                    else:
+                        reply = store.execute(args)
+                except _Error as e:
+                    reply = e
+            self.wfile.write(_encode(reply))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            return line.split()  # inline command (e.g. from telnet)
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+
+class StandinServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 511  # Redis' default backlog; socketserver's 5 stalls bursts of new connections
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.store = Store()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="resp-standin", daemon=True).start()
+        return self
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args(argv)
+    server = StandinServer(args.host, args.port)
+    print(f"Listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
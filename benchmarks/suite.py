@@ -0,0 +1,357 @@
+"""Reproducible benchmark suite for the request path, fully offline.
+
+Runs with the stub model backend and a local stand-in for the Pirate Weather
+API, so the numbers do not depend on the network or on API quota. Sections:
+
+- ``startup``: cold import time and RSS of app.py's imports (bench_startup),
+- ``reruns``: CPU per full script rerun (bench_reruns),
+- ``scoring``: fallback-scoring throughput, one record at a time (``score``)
+  and vectorized (``score_batch``),
+- ``parse``: cost of ``parse_analysis`` on a clean, a wrapped and a truncated
+  model answer,
+- ``submit``: end-to-end submit latency with ``--sessions`` concurrent
+  AppTest sessions, all in this process, sharing the app's caches, guard and
+  pools the way sessions of one Streamlit server do.
+
+The report is JSON with the commit it was measured on. Save one per commit
+and compare them; ``--max-regression`` makes the comparison fail CI when a
+timing gets worse by more than the given fraction.
+
+    python benchmarks/suite.py --output bench-main.json
+    python benchmarks/suite.py --compare bench-main.json --max-regression 0.2
+    python benchmarks/suite.py --sections scoring parse
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SECTIONS = ("startup", "reruns", "scoring", "parse", "submit")
+
+LEAVE_BALANCES = ["20+ days", "15-20 days", "10-15 days", "5-10 days", "1-5 days", "No leave left"]
+
+# Path fragments of report values where lower is better / higher is better
+LOWER_IS_BETTER = ("_ms", "_us", "_mb", "_bytes")
+HIGHER_IS_BETTER = ("per_s",)
+
+
+class StubWeatherServer:
+    """Local stand-in for the Pirate Weather forecast endpoint.
+
+    Answers ``/forecast/<key>/<lat>,<lon>`` with a fixed two-day forecast
+    after ``latency`` seconds, and counts the requests.
+    """
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith('/forecast/'):
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                day = {"temperatureHigh": 88, "temperatureLow": 77, "summary": "Rain", "precipProbability": 0.7}
+                body = json.dumps({"daily": {"data": [day, day]}}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, name="stub-weather", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def offline_secrets(weather_url, latency, workdir):
+    """App secrets for a run without network: stub model, stub weather, scratch storage"""
+    return {
+        "MODEL_BACKEND": "stub",
+        "MODEL_BACKEND_OPTIONS": {"latency": latency, "jitter": latency / 4, "seed": 17},
+        "GEMINI_RPM": 60000,
+        "PIRATE_WEATHER_API_KEY": "benchmark",
+        "WEATHER_API_URL": weather_url,
+        "ANALYSIS_CACHE_PATH": os.path.join(workdir, 'analyses.sqlite3'),
+        "HISTORY_DB_PATH": os.path.join(workdir, 'history.sqlite3'),
+    }
+
+
+def questionnaire(rng):
+    return {
+        'mood': rng.choice(["Good", "Okay", "Struggling", "Exhausted"]),
+        'energy': rng.randint(1, 10),
+        'sleep': rng.randint(1, 10),
+        'work_pressure': rng.randint(1, 10),
+        'personal_stress': rng.randint(1, 10),
+        'physical_symptoms': "None",
+        'last_break': "2-6 months ago",
+        'tomorrow_importance': "Medium - some important items",
+        'support': "Good - some supportive people",
+        'leave_balance': rng.choice(LEAVE_BALANCES),
+    }
+
+
+def _best_us(fn, number, repeat=5):
+    # Best of `repeat` batches, per call, in microseconds (the least disturbed by other processes)
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = (time.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1e6, 2)
+
+
+def bench_scoring(rows=100000):
+    import pandas as pd
+
+    from scoring import score, score_batch
+
+    rng = random.Random(3)
+    records = [questionnaire(rng) for _ in range(rows)]
+    frame = pd.DataFrame(records)
+
+    sample = records[:10000]
+    started = time.perf_counter()
+    for record in sample:
+        score(record)
+    scalar = time.perf_counter() - started
+
+    score_batch(frame.head(1000))  # warm-up
+    started = time.perf_counter()
+    score_batch(frame)
+    batch = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'score_records_per_s': round(len(sample) / scalar),
+        'score_batch_rows_per_s': round(rows / batch),
+    }
+
+
+def bench_parse(number=2000):
+    import structured_output
+    from scoring import fallback_analysis
+
+    analysis = fallback_analysis(questionnaire(random.Random(5)))
+    clean = json.dumps(analysis)
+    wrapped = "Here is the analysis:\n```json\n" + json.dumps(analysis, indent=2) + "\n```\nTake care!"
+    truncated = clean[:int(len(clean) * 0.8)]
+    results = {}
+    for name, text in (("clean", clean), ("wrapped", wrapped), ("truncated", truncated)):
+        def parse(text=text):
+            try:
+                structured_output.parse_analysis(text)
+            except structured_output.AnalysisParseError:
+                pass
+        results[f'{name}_us'] = _best_us(parse, number)
+    results['response_bytes'] = len(clean)
+    return results
+
+
+def bench_submit(weather_url, sessions=20, latency=0.5, script=None):
+    """Latency of one submit per session, ``sessions`` of them at the same time"""
+    from streamlit.testing.v1 import AppTest
+
+    script = script or os.path.join(ROOT, 'app.py')
+    secrets = offline_secrets(weather_url, latency, tempfile.mkdtemp(prefix='bench-suite-'))
+    apps = []
+    for index in range(sessions):
+        at = AppTest.from_file(script, default_timeout=120)
+        for key, value in secrets.items():
+            at.secrets[key] = value
+        at.query_params["user"] = f"bench-{index}"
+        apps.append(at)
+
+    # First page load of every session, one after another (not measured)
+    for at in apps:
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    gate = threading.Barrier(sessions)
+
+    def submit(index, at):
+        rng = random.Random(index)
+        data = questionnaire(rng)
+        at.slider[0].set_value(data['energy'])
+        at.slider[1].set_value(data['sleep'])
+        at.slider[2].set_value(data['work_pressure'])
+        at.slider[3].set_value(data['personal_stress'])
+        gate.wait()
+        started = time.perf_counter()
+        at.button[0].click().run()
+        elapsed = time.perf_counter() - started
+        with lock:
+            if at.exception:
+                errors.append(at.exception[0].message)
+            else:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=submit, args=(index, at)) for index, at in enumerate(apps)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not latencies:
+        raise RuntimeError(f"Every submit failed: {errors[:1]}")
+    latencies.sort()
+    return {
+        'sessions': sessions,
+        'model_latency_s': latency,
+        'errors': len(errors),
+        'submits_per_s': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(latencies[len(latencies) // 2] * 1000, 1),
+            'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 1),
+            'max': round(latencies[-1] * 1000, 1),
+        },
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=ROOT, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                    capture_output=True, text=True, cwd=ROOT, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run(sections=SECTIONS, repeat=5, reruns=30, rows=100000, sessions=20, latency=0.5, script=None):
+    import bench_reruns
+    import bench_startup
+
+    commit, dirty = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parameters': {'repeat': repeat, 'reruns': reruns, 'rows': rows, 'sessions': sessions, 'latency': latency},
+        },
+    }
+    script = os.path.abspath(script or os.path.join(ROOT, 'app.py'))
+    with StubWeatherServer() as weather:
+        if "startup" in sections:
+            report['startup'] = bench_startup.run(repeat)
+        if "reruns" in sections:
+            workdir = tempfile.mkdtemp(prefix='bench-suite-')
+            report['reruns'] = bench_reruns.run(script, reruns, secrets=offline_secrets(weather.url, latency, workdir))
+        if "scoring" in sections:
+            report['scoring'] = bench_scoring(rows)
+        if "parse" in sections:
+            report['parse'] = bench_parse()
+        if "submit" in sections:
+            report['submit'] = bench_submit(weather.url, sessions, latency, script)
+            report['submit']['weather_requests'] = weather.requests
+    return report
+
+
+def _flatten(values, prefix=""):
+    for key, value in values.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def _direction(path):
+    if any(marker in path for marker in HIGHER_IS_BETTER):
+        return 1
+    if any(marker in path for marker in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def compare(baseline, report):
+    """Rows of (metric, old, new, change, regression) for every timing in both reports"""
+    old = dict(_flatten({k: v for k, v in baseline.items() if k != 'meta'}))
+    rows = []
+    for path, new in _flatten({k: v for k, v in report.items() if k != 'meta'}):
+        direction = _direction(path)
+        if not direction or path not in old or not old[path]:
+            continue
+        change = (new - old[path]) / old[path]
+        rows.append((path, old[path], new, change, -change * direction))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', nargs='+', choices=SECTIONS, default=list(SECTIONS))
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters for the startup section')
+    parser.add_argument('--reruns', type=int, default=30)
+    parser.add_argument('--rows', type=int, default=100000, help='Rows for the scoring section')
+    parser.add_argument('--sessions', type=int, default=20, help='Concurrent sessions for the submit section')
+    parser.add_argument('--latency', type=float, default=0.5, help='Stub model seconds per call')
+    parser.add_argument('--script', help='app.py to measure (e.g. of an older checkout); defaults to this tree')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON report to compare against')
+    parser.add_argument('--max-regression', type=float,
+                        help='With --compare, fail if a timing is worse by more than this fraction (0.2 = 20%%)')
+    args = parser.parse_args(argv)
+
+    report = run(args.sections, args.repeat, args.reruns, args.rows, args.sessions, args.latency, args.script)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            handle.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        print(f"\nvs {baseline.get('meta', {}).get('commit') or args.compare}:")
+        worse = []
+        for path, old, new, change, regression in compare(baseline, report):
+            print(f"  {path:<45} {old:>12g} -> {new:>12g}  {change:+7.1%}")
+            if args.max_regression is not None and regression > args.max_regression:
+                worse.append(f"{path} {change:+.1%}")
+        if worse:
+            sys.exit('Benchmark regression: ' + '; '.join(worse))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""SQLite helpers shared by the on-disk stores (analysis cache, assessment history)."""
+import os
+import sqlite3
+import threading
+
+
+class ThreadLocalConnections:
+    """One sqlite3 connection per thread for a database file.
+
+    Connections use WAL mode so readers in other threads and worker processes
+    are never blocked by a writer, and autocommit so every statement is its
+    own short transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,176 @@
+"""Persistent assessment history.
+
+Every saved assessment is appended to SQLite (WAL mode) instead of being kept
+in ``st.session_state``, so history survives sessions and can grow for years
+while each session only loads the slice it displays. Rows are never updated
+or deleted by the app. Entries are stored as packed ``records.Assessment``
+records (16 bytes instead of a few hundred of JSON); rows written before that
+keep their JSON and are read as before.
+
+When several app replicas run behind a load balancer, ``SharedHistoryStore``
+keeps the same history on a ``shared_state`` backend instead.
+"""
+import json
+import time
+from datetime import date
+from functools import partial
+
+import registry
+import shared_state
+from db import ThreadLocalConnections
+from records import pack_entry, unpack_entry
+
+
+class HistoryStore:
+    """Append-only store of assessments, indexed by (user_id, date)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._connections = ThreadLocalConnections(path)
+        conn = self._connections.get()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS assessments ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " user_id TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " wellness_score INTEGER NOT NULL,"
+            " recommendation TEXT NOT NULL,"
+            " data BLOB NOT NULL)"  # a packed record (rows saved before records.py hold JSON text)
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS assessments_user_date ON assessments(user_id, date)"
+        )
+
+    def append(self, user_id, entry):
+        """Store one assessment entry (the dict built in ``main()``) and return its id"""
+        cursor = self._connections.get().execute(_INSERT, _to_row(user_id, entry, time.time()))
+        return cursor.lastrowid
+
+    def extend(self, rows):
+        """Store many ``(user_id, entry)`` pairs in one transaction (bulk import)"""
+        conn = self._connections.get()
+        created_at = time.time()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(_INSERT, (_to_row(user_id, entry, created_at) for user_id, entry in rows))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def dump(self):
+        """Every ``(user_id, entry)`` pair, in the order they were saved (bulk export)"""
+        rows = self._connections.get().execute(
+            "SELECT user_id, date, wellness_score, recommendation, data FROM assessments ORDER BY id"
+        )
+        for user_id, *row in rows:
+            yield user_id, _to_entry(row)
+
+    def range(self, user_id, start_date, end_date, limit=None):
+        """Entries with ``start_date <= date <= end_date`` (ISO strings), newest first"""
+        sql = (
+            "SELECT date, wellness_score, recommendation, data FROM assessments"
+            " WHERE user_id = ? AND date BETWEEN ? AND ? ORDER BY date DESC, id DESC"
+        )
+        params = [user_id, start_date, end_date]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [_to_entry(row) for row in self._connections.get().execute(sql, params)]
+
+    def recent(self, user_id, limit=30):
+        """The ``limit`` most recent entries, newest first"""
+        rows = self._connections.get().execute(
+            "SELECT date, wellness_score, recommendation, data FROM assessments"
+            " WHERE user_id = ? ORDER BY date DESC, id DESC LIMIT ?",
+            (user_id, limit),
+        )
+        return [_to_entry(row) for row in rows]
+
+    def count(self, user_id):
+        return self._connections.get().execute(
+            "SELECT COUNT(*) FROM assessments WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+
+_INSERT = (
+    "INSERT INTO assessments (user_id, date, created_at, wellness_score, recommendation, data)"
+    " VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def _to_row(user_id, entry, created_at):
+    # date, wellness_score and recommendation are also columns for queries; `data` holds the whole packed entry
+    return (
+        user_id,
+        entry['date'],
+        created_at,
+        int(entry['wellness_score']),
+        entry['recommendation'],
+        pack_entry(entry),
+    )
+
+
+def _to_entry(row):
+    date, wellness_score, recommendation, data = row
+    return {
+        **(unpack_entry(data) if isinstance(data, bytes) else json.loads(data)),
+        'date': date,
+        'wellness_score': wellness_score,
+        'recommendation': recommendation,
+    }
+
+
+class SharedHistoryStore:
+    """HistoryStore on a shared_state backend: one sorted set per user, scored by date."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def append(self, user_id, entry):
+        """Store one assessment entry and return its creation time"""
+        created_at = time.time()
+        # Within a day, entries are ordered by the time they were saved
+        score = date.fromisoformat(entry['date']).toordinal() + created_at % 86400 / 86400
+        self.backend.zadd(f"history:{user_id}", score, [created_at, pack_entry(entry)])
+        return created_at
+
+    def extend(self, rows):
+        for user_id, entry in rows:
+            self.append(user_id, entry)
+
+    def range(self, user_id, start_date, end_date, limit=None):
+        """Entries with ``start_date <= date <= end_date`` (ISO strings), newest first"""
+        rows = self.backend.zrange(
+            f"history:{user_id}",
+            date.fromisoformat(start_date).toordinal(),
+            date.fromisoformat(end_date).toordinal() + 1,
+            reverse=True,
+            limit=limit,
+        )
+        return [_from_member(entry) for _, entry in rows]
+
+    def recent(self, user_id, limit=30):
+        """The ``limit`` most recent entries, newest first"""
+        rows = self.backend.zrange(f"history:{user_id}", 0, float('inf'), reverse=True, limit=limit)
+        return [_from_member(entry) for _, entry in rows]
+
+    def count(self, user_id):
+        return self.backend.zcard(f"history:{user_id}")
+
+
+def _from_member(entry):
+    # Packed record, or the entry dict stored before records were packed
+    return unpack_entry(entry) if isinstance(entry, bytes) else entry
+
+
+def _open(path):
+    if shared_state.is_url(path):
+        return SharedHistoryStore(shared_state.get_backend(path))
+    return HistoryStore(path)
+
+
+def get_store(path):
+    """The process's history store for ``path``, a SQLite file or a shared_state URL"""
+    return registry.shared("history store", path, partial(_open, path))
@@ -0,0 +1,224 @@
+"""Gemini analysis core, shared by the Streamlit app and headless entry points.
+
+Nothing in here touches Streamlit: callers pass in the model and decide how
+to surface failures (the app shows a notice and uses the local fallback).
+"""
+import random
+import time
+from contextlib import nullcontext
+
+import telemetry
+import token_usage
+from analysis_cache import cache_key
+from rate_limit import GuardedModel, RateLimitExceeded
+from streaming_json import IncrementalObjectParser
+from structured_output import GENERATION_CONFIG, STREAMING_GENERATION_CONFIG, parse_analysis
+
+MODEL_NAME = 'gemini-1.5-flash'
+
+# Bump whenever the analysis prompt changes so cached analyses are not reused
+PROMPT_VERSION = 2
+
+# Static guidance, sent once as the model's system instruction instead of with every request.
+# The answer format is enforced by structured_output.RESPONSE_SCHEMA, except when streaming,
+# where the field order given at the end decides how early the decision card can be painted.
+SYSTEM_INSTRUCTION = """You are an intelligent work-life balance advisor. Decide if the person should take leave tomorrow based on their mental state, workload, and external factors.
+
+DECISION FRAMEWORK:
+- full_day_leave: burnout, severe stress, or mental health crisis
+- half_day_leave: moderate stress with manageable work
+- work_with_care / work_normally: good mental state, with support strategies
+- Consider weather impact on mood and recovery opportunities
+- Consider leave balance - if low, be more conservative
+
+SCORING GUIDE (wellness_score 0-100):
+- 80-100: Excellent state, work normally
+- 60-79: Good state, minor support needed
+- 40-59: Moderate stress, consider half day
+- 20-39: High stress, likely needs full day
+- 0-19: Crisis level, definitely needs leave
+
+Weather: rainy/gloomy may worsen mood (indoor recovery); sunny/pleasant suits outdoor recovery; extreme weather adds commute stress.
+Leave balance: >15 days more flexible; 5-15 days moderate; <5 days conservative.
+
+Answer in JSON: wellness_score, leave_type, confidence (0-100), main_reason, decision_summary (2 sentences), work_activities (3), work_avoid (3), leave_activities (4), leave_avoid (3), warning_signs, recovery_estimate. Keep list items under 10 words."""
+
+
+def create_model(api_key, guard, system_instruction=None):
+    """Gemini model routed through ``guard`` (an ApiGuard)"""
+    # Imported here: google.generativeai is slow to import and only needed once a call is made
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return GuardedModel(genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction), guard)
+
+
+def build_prompt(data, weather):
+    """Compact per-request payload: one questionnaire record and tomorrow's weather"""
+    return (
+        f"mood: {data['mood']}\n"
+        f"energy: {data['energy']}/10\n"
+        f"sleep: {data['sleep']}/10\n"
+        f"work_pressure: {data['work_pressure']}/10\n"
+        f"personal_stress: {data['personal_stress']}/10\n"
+        f"symptoms: {data['physical_symptoms']}\n"
+        f"last_break: {data['last_break']}\n"
+        f"tomorrow: {data['tomorrow_importance']}\n"
+        f"support: {data['support']}\n"
+        f"leave_balance: {data['leave_balance']}\n"
+        f"weather: {weather['temp_high']}/{weather['temp_low']}°C, {weather['condition']}, {weather['rain_chance']}% rain"
+    )
+
+
+def cached_analysis(data, weather, cache, key=None):
+    """The analysis ``analyze()`` would answer from ``cache`` without a model call, or None"""
+    if cache is None:
+        return None
+    return cache.get(key or cache_key(data, weather, PROMPT_VERSION))
+
+
+def analyze(model, data, weather, cache=None, on_event=None, flights=None, admission=None, lookup=True):
+    """Ask the model for a leave recommendation; raises if the call or parsing fails.
+
+    ``model`` must have been created with ``system_instruction=SYSTEM_INSTRUCTION``;
+    only the compact payload is sent per call. Successful answers are stored in
+    ``cache`` (an AnalysisCache) when given, and looked up first unless
+    ``lookup=False`` (the caller already did). With ``flights`` (a SingleFlight),
+    concurrent calls for the same input share one model call.
+    With ``admission`` (an AdmissionQueue), the model call waits for a slot
+    in priority order and raises ``admission.Overloaded`` if it is shed.
+    If on_event is given the response is streamed and on_event(kind, key, value)
+    is called for every field (and list item) as soon as it has been parsed.
+    """
+    key = cache_key(data, weather, PROMPT_VERSION)
+    cached = cached_analysis(data, weather, cache, key) if lookup else None
+    if cached is not None:
+        return cached
+
+    def request(on_event):
+        prompt = build_prompt(data, weather)
+        with admission.admit(data) if admission is not None else nullcontext():
+            started = time.perf_counter()
+            with telemetry.span("analysis_call"):
+                if on_event is None:
+                    response = model.generate_content(prompt, generation_config=GENERATION_CONFIG)
+                    response_text = response.text
+                    usage = token_usage.usage_of(response)
+                else:
+                    parser = IncrementalObjectParser()
+                    response_text = ""
+                    usage = None
+                    for chunk in model.generate_content(prompt, stream=True, generation_config=STREAMING_GENERATION_CONFIG):
+                        response_text += chunk.text
+                        usage = token_usage.usage_of(chunk) or usage  # the last chunk carries the totals
+                        for event in parser.feed(chunk.text):
+                            on_event(*event)
+        token_usage.record('analysis', usage, started)
+
+        with telemetry.span("parse_analysis"):
+            result = parse_analysis(response_text)
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    if flights is None:
+        return request(on_event)
+    return flights.do(key, request, on_event)
+
+
+def is_rate_limit_error(error):
+    if isinstance(error, RateLimitExceeded):
+        return True
+    error_text = str(error)
+    return '429' in error_text or 'quota' in error_text.lower()
+
+
+# Personal medical reasons (first-person only)
+MEDICAL_REASONS = [
+    "acute dysentery",
+    "severe migraine",
+    "high fever",
+    "acute food poisoning",
+    "debilitating headache"
+]
+
+# Non-medical personal access issues near home
+ACCESS_REASONS = [
+    "a blockade near my house due to a student movement",
+    "a political demonstration blocking the roads in my neighborhood",
+    "major road construction in front of my house causing access issues",
+    "urgent utility maintenance in my building causing disruptions"
+]
+
+LEAVE_REASONS = MEDICAL_REASONS + ACCESS_REASONS
+
+
+def compose_leave_mail(model, reason, on_chunk=None):
+    """Ask the model for a leave mail giving ``reason``; raises if the call fails.
+
+    Returns an empty string if the model answered with nothing. If on_chunk is
+    given the response is streamed and on_chunk receives the text so far.
+    """
+    prompt = f"""
+Generate a professional, concise leave application email for one day of leave tomorrow.
+Use first-person and the following single reason: {reason}.
+
+Requirements:
+- 2–3 sentences max
+- Subject line must be: "Subject: Leave Application for Tomorrow"
+- Keep the tone polite and professional
+- Do not mention family members; it is my personal situation
+- Do not add any text outside the email
+"""
+
+    started = time.perf_counter()
+    with telemetry.span("leave_mail_call"):
+        if on_chunk is None:
+            response = model.generate_content(prompt)
+            text = (response.text or "").strip()
+            usage = token_usage.usage_of(response)
+        else:
+            text = ""
+            usage = None
+            for chunk in model.generate_content(prompt, stream=True):
+                text += chunk.text or ""
+                usage = token_usage.usage_of(chunk) or usage
+                on_chunk(text)
+            text = text.strip()
+    token_usage.record('leave_mail', usage, started)
+    # Ensure 'Best regards' is present
+    if text and "best regards".lower() not in text.lower():
+        # Add 'Best regards' before [Your Name] or at the end
+        if "[Your Name]" in text:
+            text = text.replace("[Your Name]", "Best regards,\n[Your Name]")
+        else:
+            text = text.strip() + "\n\nBest regards,\n[Your Name]"
+    return text
+
+
+def generate_leave_mail(model, on_chunk=None, reason=None):
+    """Generate a concise, first-person leave mail with a personal or access-related reason.
+
+    The reason is picked at random unless given. Never raises: if the model
+    fails a template mail is returned. If on_chunk is given the response is
+    streamed and on_chunk receives the text so far.
+    """
+    chosen_reason = reason or random.choice(LEAVE_REASONS)
+
+    try:
+        text = compose_leave_mail(model, chosen_reason, on_chunk=on_chunk)
+        if text:
+            return text
+        else:
+            return f"Subject: Leave Application for Tomorrow\n\nDear Manager,\n\nI would like to request leave for tomorrow due to {chosen_reason}. I will ensure any urgent tasks are handed over and remain reachable for critical matters if needed.\n\nThank you for your understanding.\n\nBest regards,\n[Your Name]"
+    except Exception:
+        # Fallback email (deterministic, still varies via chosen_reason)
+        return f"""Subject: Leave Application for Tomorrow
+
+Dear Manager,
+
+I would like to request leave for tomorrow due to {chosen_reason}. I will ensure urgent items are handed over today and remain reachable for any critical matters if needed.
+
+Thank you for your understanding.
+
+Best regards,
+[Your Name]"""
@@ -0,0 +1,159 @@
+"""Per-process pool of pre-generated leave mails.
+
+A leave mail has no per-user content, only one of a handful of reasons, so
+it does not need a live Gemini call on the user's request path. A daemon
+worker keeps up to ``size`` mails per reason in stock. It fills the pool at
+startup and tops up any reason that drops to the low-water mark. Mails older
+than ``max_age`` are discarded so the variety keeps rotating. ``take()``
+pops the oldest mail of a random stocked reason instantly, and returns None
+when the pool is empty so the caller can fall back to a live call. A pool
+nobody has taken from for ``max_age`` is not refilled until the next
+``take()``, so an idle app does not regenerate it every ``max_age``.
+
+The worker only spends quota the users are not using: when the model is a
+``GuardedModel`` it waits until the guard's token bucket has more than
+``spare_tokens`` tokens that are not held for admitted calls, and, with an
+``admission`` queue on the same guard, until no user request is queued.
+It then holds a token for its call like an admitted call does. A bucket too
+small to keep ``spare_tokens`` (a low quota with a burst of 1) only has to
+have one free token.
+"""
+import random
+import threading
+import time
+from collections import deque
+
+import leave_analysis
+import registry
+
+
+class MailPool:
+    """Background-filled stock of leave mails, keyed by reason."""
+
+    def __init__(self, model_factory, reasons=None, size=2, low_water=1, max_age=6 * 3600,
+                 spare_tokens=1, retry_delay=30.0, admission=None):
+        self.model_factory = model_factory
+        self.reasons = list(reasons or leave_analysis.LEAVE_REASONS)
+        self.size = size
+        self.low_water = min(low_water, size - 1)
+        self.max_age = max_age
+        self.spare_tokens = spare_tokens
+        self.retry_delay = retry_delay
+        self.admission = admission
+        self._stock = {reason: deque() for reason in self.reasons}
+        self._filling = set(self.reasons)
+        self._last_take = time.time()  # startup counts as use, so the pool is filled once
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._counters = {"hits": 0, "misses": 0, "generated": 0, "expired": 0, "errors": 0}
+
+    def _count(self, name):
+        self._counters[name] += 1
+
+    def start(self):
+        """Start the refill worker (once per pool)"""
+        with self._lock:
+            if self._thread is None and self.size > 0:
+                self._thread = threading.Thread(target=self._run, name="leave-mail-pool", daemon=True)
+                self._thread.start()
+        return self
+
+    def take(self, reason=None):
+        """Pop a mail (for ``reason``, or any stocked reason); None if there is none"""
+        with self._lock:
+            self._last_take = time.time()
+            self._expire(self._last_take)
+            candidates = [reason] if reason is not None else [r for r, mails in self._stock.items() if mails]
+            candidates = [r for r in candidates if self._stock.get(r)]
+            if not candidates:
+                self._count("misses")
+                self._wake.set()
+                return None
+            chosen = random.choice(candidates)
+            _, text = self._stock[chosen].popleft()
+            self._count("hits")
+            if len(self._stock[chosen]) <= self.low_water:
+                self._wake.set()
+            return text
+
+    def available(self):
+        with self._lock:
+            return any(self._stock.values())
+
+    def _expire(self, now):
+        for mails in self._stock.values():
+            while mails and now - mails[0][0] > self.max_age:
+                mails.popleft()
+                self._count("expired")
+
+    def _next_reason(self):
+        # A reason at or below the low-water mark is topped up to `size` (every reason at startup)
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            if now - self._last_take > self.max_age:
+                return None  # unused: the next take() wakes the worker
+            for reason, mails in self._stock.items():
+                if len(mails) <= self.low_water:
+                    self._filling.add(reason)
+                elif len(mails) >= self.size:
+                    self._filling.discard(reason)
+            if not self._filling:
+                return None
+            return min(self._filling, key=lambda reason: len(self._stock[reason]))
+
+    def _hold_quota(self, bucket):
+        # Wait until no user needs the token, then hold it for the next call on this thread
+        spare = min(self.spare_tokens, bucket.capacity - 1)
+        while (self.admission is not None and self.admission.waiting()) or not bucket.hold(spare):
+            time.sleep(1.0 / bucket.rate if bucket.rate else 1.0)
+        bucket.on_next_reserve(bucket.unhold)
+
+    def _run(self):
+        model = None
+        while True:
+            reason = self._next_reason()
+            if reason is None:
+                # Nothing to do until a take() drains a reason, the oldest mail expires or the pool is used again
+                self._wake.wait(timeout=min(self.max_age, 300))
+                self._wake.clear()
+                continue
+            bucket = None
+            try:
+                if model is None:
+                    model = self.model_factory()
+                bucket = getattr(getattr(model, 'guard', None), 'bucket', None)
+                if bucket is not None:
+                    self._hold_quota(bucket)
+                text = leave_analysis.compose_leave_mail(model, reason)
+            except Exception:
+                text = None
+            finally:
+                if bucket is not None and bucket.on_next_reserve(None) is not None:
+                    bucket.unhold()  # the call never reached the guard
+            if not text:
+                with self._lock:
+                    self._count("errors")
+                time.sleep(self.retry_delay)
+                continue
+            with self._lock:
+                self._stock[reason].append((time.time(), text))
+                self._count("generated")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["stock"] = sum(len(mails) for mails in self._stock.values())
+        requests = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / requests if requests else 0.0
+        return stats
+
+
+def get_mail_pool(name, model_factory, **kwargs):
+    """The process's pool called ``name``, started on first use.
+
+    ``model_factory`` is only used when the pool is created, so it is not
+    compared with the first call's like the other options.
+    """
+    return registry.shared("mail pool", name, lambda **options: MailPool(model_factory, **options).start(), **kwargs)
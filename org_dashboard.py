@@ -0,0 +1,107 @@
+"""Team and department wellbeing dashboard for HR.
+
+Reads only the precomputed rollups (rollups.py), never individual
+assessments, so it stays fast for any number of employees. Groups below the
+privacy threshold, and groups whose figures would give one away, are shown
+as hidden. The page is only served with ``ORG_DASHBOARD_PASSWORD`` set and
+entered.
+
+    streamlit run org_dashboard.py
+"""
+import hmac
+
+import streamlit as st
+
+from rollups import get_rollups
+
+st.set_page_config(page_title="Team Wellbeing", page_icon="📊", layout="wide")
+
+try:
+    STATE_BACKEND = st.secrets.get("STATE_BACKEND", "")
+    HISTORY_DB_PATH = st.secrets.get("HISTORY_DB_PATH", ".data/history.sqlite3")
+    PASSWORD = st.secrets.get("ORG_DASHBOARD_PASSWORD", "")
+    ROLLUPS = get_rollups(
+        STATE_BACKEND or HISTORY_DB_PATH,
+        min_group=int(st.secrets.get("ROLLUP_MIN_GROUP", 5)),
+        salt=st.secrets.get("ROLLUP_SALT", "")
+    )
+except Exception as e:
+    st.error(f"Could not open the rollups: {e}")
+    st.stop()
+
+LEVELS = {"Teams": "team", "Departments": "department", "Whole organisation": "org"}
+PERIODS = {"Weekly": ("week", 12), "Daily": ("day", 30)}
+
+
+def label(scope):
+    return scope.split(":", 1)[1] if ":" in scope else "Organisation"
+
+
+# A week's suppression looks at every group, so share the answers between reruns and viewers for a minute
+@st.cache_data(ttl=60, show_spinner=False)
+def overview(level, period):
+    return ROLLUPS.overview(level, period)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def series(scope, period, count):
+    return ROLLUPS.series(scope, period, count)
+
+
+def main():
+    st.title("📊 Team wellbeing")
+    if not PASSWORD:
+        st.error("Set ORG_DASHBOARD_PASSWORD in the app secrets to use this dashboard.")
+        st.stop()
+    if not hmac.compare_digest(st.text_input("Password", type="password").encode(), PASSWORD.encode()):
+        st.stop()
+
+    col1, col2 = st.columns(2)
+    level = LEVELS[col1.radio("Groups", list(LEVELS), horizontal=True)]
+    period, count = PERIODS[col2.radio("Period", list(PERIODS), horizontal=True)]
+
+    rows = overview(level, period)
+    if not rows:
+        st.info("No assessments saved in this period yet.")
+        return
+    st.caption(f"{'Week of' if period == 'week' else 'Day'} {rows[0]['start']} • groups with fewer than "
+               f"{ROLLUPS.min_group} people, and some that would reveal them, are hidden")
+    st.dataframe(
+        [
+            {
+                "Group": label(row['scope']),
+                "People": row['people'],
+                "Assessments": row['assessments'],
+                "Mean wellness": row['mean_wellness'],
+                "Full day off": row['full_day_leave'],
+                "Half day off": row['half_day_leave'],
+                "Share recommended leave": row['leave_share'],
+            }
+            for row in rows
+        ],
+        use_container_width=True,
+        hide_index=True
+    )
+
+    scope = st.selectbox("Trend for", [row['scope'] for row in rows], format_func=label)
+    points = [point for point in series(scope, period, count) if not point['suppressed']]
+    if len(points) < 2:
+        st.caption("Not enough visible periods for a trend yet.")
+        return
+    import plotly.graph_objects as go  # only loaded when there is a chart to draw
+    starts = [point['start'] for point in points]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=starts, y=[point['mean_wellness'] for point in points], name="Mean wellness"))
+    fig.add_trace(go.Scatter(x=starts, y=[point['leave_share'] * 100 for point in points],
+                             name="Recommended leave (% of people)", yaxis="y2"))
+    fig.update_layout(
+        height=360,
+        margin=dict(l=10, r=10, t=10, b=10),
+        yaxis=dict(title="Wellness", range=[0, 100]),
+        yaxis2=dict(title="% of people", range=[0, 100], overlaying="y", side="right"),
+        legend=dict(orientation="h")
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+main()
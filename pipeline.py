@@ -0,0 +1,94 @@
+"""Submission pipeline: leave analysis with a speculative leave mail.
+
+The leave mail does not depend on the analysis result, only on whether it is
+needed at all, so it is started in parallel and thrown away if the decision
+turns out to be one of the "work" outcomes. End-to-end latency is then roughly
+one LLM round-trip instead of two. An analysis that needs no model call (a
+cache hit) is known at once, so then the mail is only generated if needed.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+LEAVE_TYPES = ("full_day_leave", "half_day_leave")
+
+# Shared by all sessions in the process
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="leave-mail")
+_lock = threading.Lock()
+_counters = {"submissions": 0, "ready": 0, "speculative_calls": 0, "used": 0, "wasted": 0, "cancelled": 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def run_pipeline(analyze, generate_mail, speculative=True, on_mail_progress=None, ready=None):
+    """Run ``analyze()`` and, if it recommends leave, ``generate_mail()``.
+
+    With ``speculative=True`` the mail is generated concurrently with the
+    analysis. ``analyze`` runs on the calling thread because it may write to
+    the Streamlit page. ``ready()``, when given, returns the analysis if it is
+    available without a model call (e.g. ``leave_analysis.cached_analysis``)
+    or None; a ready analysis is used instead of ``analyze()`` and nothing is
+    speculated. When ``on_mail_progress`` is given, ``generate_mail``
+    is called with ``on_chunk=`` and partial mail text is relayed to
+    ``on_mail_progress`` on the calling thread. Returns
+    ``(analysis, leave_mail_or_None)``.
+    """
+    _count("submissions")
+
+    analysis = ready() if ready is not None else None
+    if analysis is not None:
+        _count("ready")
+    elif not speculative:
+        analysis = analyze()
+    if analysis is not None:
+        if analysis['leave_type'] not in LEAVE_TYPES:
+            return analysis, None
+        if on_mail_progress is None:
+            return analysis, generate_mail()
+        return analysis, generate_mail(on_chunk=on_mail_progress)
+
+    chunks = queue.Queue()
+    if on_mail_progress is None:
+        future = _EXECUTOR.submit(generate_mail)
+    else:
+        future = _EXECUTOR.submit(generate_mail, on_chunk=chunks.put)
+    _count("speculative_calls")
+    try:
+        analysis = analyze()
+    except BaseException:
+        future.cancel()
+        raise
+
+    if analysis['leave_type'] in LEAVE_TYPES:
+        _count("used")
+        if on_mail_progress is not None:
+            _relay(chunks, future, on_mail_progress)
+        return analysis, future.result()
+
+    # Not needed: drop it, and record whether the call had already gone out
+    _count("cancelled" if future.cancel() else "wasted")
+    return analysis, None
+
+
+def _relay(chunks, future, callback):
+    # Worker threads cannot write to the page, so partial text is handed over here
+    while True:
+        try:
+            callback(chunks.get(timeout=0.05))
+        except queue.Empty:
+            if future.done():
+                break
+    while not chunks.empty():
+        callback(chunks.get_nowait())
+
+
+def stats():
+    """Speculative mail counters, including the wasted-call ratio."""
+    with _lock:
+        stats = dict(_counters)
+    calls = stats["speculative_calls"]
+    stats["wasted_ratio"] = stats["wasted"] / calls if calls else 0.0
+    return stats
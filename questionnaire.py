@@ -0,0 +1,18 @@
+"""The questionnaire's fields: the sliders and the options of every selectbox.
+
+app.py shows these options in this order, which runs from best to worst
+(``last_break`` from longest ago). The compact history records (``records``)
+store an answer as its position among them.
+"""
+SLIDERS = ('energy', 'sleep', 'work_pressure', 'personal_stress')
+
+OPTIONS = {
+    'mood': ("Excellent", "Good", "Okay", "Struggling", "Overwhelmed", "Exhausted"),
+    'leave_balance': ("20+ days", "15-20 days", "10-15 days", "5-10 days", "1-5 days", "No leave left"),
+    'physical_symptoms': ("None", "Mild tension/headache", "Moderate discomfort", "Severe symptoms"),
+    'last_break': ("Never", "6+ months ago", "2-6 months ago", "1-2 months ago", "Within last month"),
+    'tomorrow_importance': ("Low priority - routine tasks", "Medium - some important items",
+                            "High - major deadlines", "Critical - cannot be postponed"),
+    'support': ("Strong - great family/friend support", "Good - some supportive people",
+                "Limited - few people to talk to", "Weak - feeling quite isolated"),
+}
@@ -0,0 +1,256 @@
+"""Quota-aware wrapper around the Gemini model shared by all sessions.
+
+Every ``generate_content`` call goes through an ``ApiGuard`` which combines:
+
+- a token bucket sized to the API quota (requests per minute),
+- jittered exponential backoff on 429/5xx that honours retry-after hints,
+- a circuit breaker that fails fast while the API is degraded, so callers go
+  straight to the local heuristic instead of queueing behind timeouts.
+"""
+import random
+import re
+import threading
+import time
+
+import registry
+
+_RETRY_AFTER = re.compile(r'retry[_ -]?(?:after|delay)\D{0,20}?(\d+(?:\.\d+)?)', re.IGNORECASE)
+
+
+class RateLimitExceeded(Exception):
+    """The call was not made (or given up on) because of the API quota"""
+
+
+class CircuitOpenError(RateLimitExceeded):
+    """The circuit breaker is open; the API is treated as unavailable"""
+
+
+def is_transient(error):
+    """429s, quota errors and 5xx/timeouts are worth retrying"""
+    text = str(error).lower()
+    if '429' in text or 'quota' in text or 'resource exhausted' in text or 'resourceexhausted' in text:
+        return True
+    return any(marker in text for marker in ('500', '502', '503', '504', 'unavailable', 'deadline', 'timed out'))
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it said so"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+    if value is None:
+        match = _RETRY_AFTER.search(str(error))
+        value = match.group(1) if match else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, up to ``capacity`` saved up"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.held = 0  # tokens promised to calls that have not taken them yet
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how long the caller must wait before using it"""
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        callback = self.on_next_reserve(None)
+        if callback is not None:
+            callback()
+        return wait
+
+    def on_next_reserve(self, callback):
+        """Call ``callback`` once this thread next takes a token (None cancels); returns the one it replaces"""
+        previous = getattr(self._local, 'callback', None)
+        self._local.callback = callback
+        return previous
+
+    def available(self):
+        """Tokens that could be taken right now without waiting"""
+        with self._lock:
+            now = time.monotonic()
+            return min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+
+    def hold(self, spare=0):
+        """Promise a token to a call that takes it later, if more than ``spare``
+        tokens are available and not promised yet; returns whether it did.
+
+        The holder hands the token over with ``on_next_reserve(bucket.unhold)``
+        on the thread that makes the call, and calls ``unhold()`` itself if
+        the call never takes it.
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens - self.held < spare + 1:
+                return False
+            self.held += 1
+            return True
+
+    def unhold(self):
+        with self._lock:
+            self.held -= 1
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def drain(self, seconds):
+        """Server said slow down: stop handing out tokens for ``seconds``"""
+        with self._lock:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures, half-opens after ``reset_timeout``"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now):
+        if self.opened_at is None:
+            return 'closed'
+        if now - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probe_in_flight:
+                # Let a single probe through to test the API
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """The call let through by ``allow()`` was never made; the next one may probe"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class ApiGuard:
+    """Rate limiting, retries and circuit breaking for one upstream API"""
+
+    def __init__(self, requests_per_minute=15, burst=None, max_retries=3, base_delay=1.0,
+                 max_delay=20.0, max_wait=10.0, failure_threshold=5, reset_timeout=30):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst or max(1, requests_per_minute // 4))
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "retries": 0, "throttled": 0, "short_circuited": 0, "failures": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def call(self, fn, *args, **kwargs):
+        """Call ``fn`` within the quota, retrying transient errors with backoff"""
+        deadline = time.monotonic() + self.max_wait
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                raise CircuitOpenError("Gemini API temporarily unavailable (circuit open)")
+
+            wait = self.bucket.reserve()
+            if time.monotonic() + wait > deadline:
+                # Would blow the caller's latency budget; give the token back and degrade
+                self.bucket.refund()
+                self.breaker.release_probe()
+                self._count("throttled")
+                raise RateLimitExceeded("Local quota exhausted for Gemini API")
+
+            self._count("calls")
+            try:
+                if wait:
+                    time.sleep(wait)
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    # The API answered, it just did not like the request
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                self._count("failures")
+                hinted = retry_after(e)
+                if hinted is not None:
+                    self.bucket.drain(hinted)
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.5)
+                delay = max(delay, hinted or 0.0)
+                if attempt == self.max_retries or time.monotonic() + delay > deadline:
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Interrupted (e.g. a Streamlit rerun), so the API gave no answer either way
+                self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+class GuardedModel:
+    """Drop-in replacement for ``genai.GenerativeModel`` that routes calls through an ApiGuard"""
+
+    def __init__(self, model, guard):
+        self.model = model
+        self.guard = guard
+
+    def generate_content(self, *args, **kwargs):
+        return self.guard.call(self.model.generate_content, *args, **kwargs)
+
+
+def get_guard(name, **kwargs):
+    """The process's guard for ``name``, so every session shares one quota"""
+    return registry.shared("API guard", name, ApiGuard, **kwargs)
@@ -0,0 +1,234 @@
+"""Compact assessment records and columnar export of the history.
+
+An assessment entry (the dict ``main()`` saves) repeats long selectbox
+strings such as "Strong - great family/friend support" in every entry.
+``Assessment`` holds the same entry in ``__slots__``: the date as a day
+number and every other field as a small integer code, with categorical
+answers dictionary-encoded as their position among the selectbox options
+(``CATEGORIES``). ``pack()`` turns it into 16 bytes, which is what the
+history stores save. Values that do not fit the codes (an answer that is not
+among the options, a fractional score) and keys the questionnaire does not
+have are kept as they are in ``extra``, so ``to_entry()`` always gives back
+the original entry.
+
+For analytics, ``to_arrow()`` turns records into a pyarrow Table whose
+categorical columns are dictionary arrays over the same options, and
+``write_parquet()`` / ``write_arrow()`` save it. Arrow IPC files are
+memory-mapped by ``read_arrow()``, so a large history is not copied into
+memory to be queried; ``from_arrow()`` goes back to records. pyarrow is an
+optional dependency that only these functions need.
+
+    python records.py export .data/history.sqlite3 history.parquet
+    python records.py import history.arrow .data/history.sqlite3
+"""
+import argparse
+import json
+import struct
+from datetime import date
+
+from questionnaire import OPTIONS, SLIDERS
+from scoring import LEAVE_TYPES
+
+CATEGORIES = {**OPTIONS, 'recommendation': LEAVE_TYPES}
+NUMBERS = ('wellness_score',) + SLIDERS
+FIELDS = NUMBERS + tuple(CATEGORIES)
+
+MISSING = 255  # code of an absent field, or of one whose value is kept in ``extra``
+
+_CODES = {field: {option: code for code, option in enumerate(options)} for field, options in CATEGORIES.items()}
+_FORMAT = struct.Struct('<I' + 'B' * len(FIELDS))
+_FORMAT_KEYS = frozenset(FIELDS + ('date',))
+_EPOCH = date(1970, 1, 1).toordinal()  # Arrow's date32 counts days from here
+
+
+def _encode(field, value):
+    if field in _CODES:
+        try:
+            return _CODES[field].get(value, MISSING)
+        except TypeError:  # unhashable
+            return MISSING
+    return value if type(value) is int and 0 <= value < MISSING else MISSING
+
+
+def _decode(field, code):
+    return CATEGORIES[field][code] if field in CATEGORIES else code
+
+
+class Assessment:
+    """One assessment entry as a date and small integer codes (see the module docstring)."""
+
+    __slots__ = ('day',) + FIELDS + ('extra',)
+
+    def __init__(self, day, codes, extra=None):
+        self.day = day  # date.toordinal(), 0 if unknown
+        for field, code in zip(FIELDS, codes):
+            setattr(self, field, code)
+        self.extra = extra  # dict of values that have no code, or None
+
+    @classmethod
+    def from_entry(cls, entry):
+        codes = []
+        extra = {key: value for key, value in entry.items() if key not in _FORMAT_KEYS}
+        for field in FIELDS:
+            code = _encode(field, entry.get(field))
+            if code == MISSING and field in entry:
+                extra[field] = entry[field]
+            codes.append(code)
+        try:
+            day = date.fromisoformat(entry['date']).toordinal()
+        except (KeyError, TypeError, ValueError):
+            day = 0
+            if 'date' in entry:
+                extra['date'] = entry['date']
+        return cls(day, codes, extra or None)
+
+    def codes(self):
+        return [getattr(self, field) for field in FIELDS]
+
+    def to_entry(self):
+        entry = {
+            field: _decode(field, code)
+            for field, code in zip(FIELDS, self.codes()) if code != MISSING
+        }
+        if self.day:
+            entry['date'] = date.fromordinal(self.day).isoformat()
+        if self.extra:
+            entry.update(self.extra)
+        return entry
+
+    def pack(self):
+        """16 bytes, followed by ``extra`` as compact JSON when there is any"""
+        packed = _FORMAT.pack(self.day, *self.codes())
+        if self.extra:
+            packed += json.dumps(self.extra, ensure_ascii=False, separators=(',', ':')).encode()
+        return packed
+
+    @classmethod
+    def unpack(cls, data):
+        day, *codes = _FORMAT.unpack_from(data)
+        extra = json.loads(bytes(data[_FORMAT.size:])) if len(data) > _FORMAT.size else None
+        return cls(day, codes, extra)
+
+    def __eq__(self, other):
+        if not isinstance(other, Assessment):
+            return NotImplemented
+        return self.day == other.day and self.codes() == other.codes() and self.extra == other.extra
+
+    def __repr__(self):
+        return f"Assessment({self.to_entry()!r})"
+
+
+def pack_entry(entry):
+    return Assessment.from_entry(entry).pack()
+
+
+def unpack_entry(data):
+    return Assessment.unpack(data).to_entry()
+
+
+def to_arrow(records, user_ids=None):
+    """pyarrow Table of ``records``, with a ``user_id`` column if ``user_ids`` is given.
+
+    Categorical fields become dictionary columns over ``CATEGORIES``, numbers
+    uint8 and the date date32; absent fields are nulls, and entries with an
+    ``extra`` carry it as JSON in the ``extra`` column.
+    """
+    import numpy as np
+    import pyarrow as pa
+
+    records = list(records)
+    codes = np.array([record.codes() for record in records], dtype=np.uint8).reshape(len(records), len(FIELDS))
+    days = np.array([record.day for record in records], dtype=np.int64)
+
+    columns = {}
+    if user_ids is not None:
+        columns['user_id'] = pa.array(list(user_ids), pa.string()).dictionary_encode()
+    columns['date'] = pa.array((days - _EPOCH).astype(np.int32), pa.date32(), mask=days == 0)
+    for i, field in enumerate(FIELDS):
+        values = codes[:, i]
+        missing = values == MISSING
+        if field in CATEGORIES:
+            indices = pa.array(values.astype(np.int8), pa.int8(), mask=missing)
+            columns[field] = pa.DictionaryArray.from_arrays(indices, pa.array(CATEGORIES[field], pa.string()))
+        else:
+            columns[field] = pa.array(values, pa.uint8(), mask=missing)
+    columns['extra'] = pa.array(
+        [json.dumps(record.extra, ensure_ascii=False) if record.extra else None for record in records], pa.string()
+    )
+    return pa.table(columns)
+
+
+def from_arrow(table):
+    """(user_ids or None, records) from a Table written by ``to_arrow()``"""
+    user_ids = table.column('user_id').to_pylist() if 'user_id' in table.column_names else None
+    fields = [field for field in FIELDS + ('date',) if field in table.column_names]
+    values = [table.column(field).to_pylist() for field in fields]
+    extras = table.column('extra').to_pylist() if 'extra' in table.column_names else [None] * table.num_rows
+    records = []
+    for row, extra in zip(zip(*values), extras):
+        entry = {field: value for field, value in zip(fields, row) if value is not None}
+        if 'date' in entry:
+            entry['date'] = entry['date'].isoformat()
+        if extra:
+            entry.update(json.loads(extra))
+        records.append(Assessment.from_entry(entry))
+    return user_ids, records
+
+
+def write_parquet(path, records, user_ids=None):
+    import pyarrow.parquet as pq
+
+    pq.write_table(to_arrow(records, user_ids), path)
+
+
+def read_parquet(path):
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, memory_map=True)
+
+
+def write_arrow(path, records, user_ids=None):
+    """Arrow IPC file, which ``read_arrow()`` can memory-map"""
+    import pyarrow as pa
+
+    table = to_arrow(records, user_ids)
+    with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def read_arrow(path):
+    """Zero-copy Table over a memory-mapped Arrow IPC file"""
+    import pyarrow as pa
+
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import the assessment history as Parquet or Arrow")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("source", help="History SQLite file (export) or .parquet/.arrow file (import)")
+    parser.add_argument("destination", help=".parquet/.arrow file (export) or history SQLite file (import)")
+    args = parser.parse_args(argv)
+
+    from history_store import HistoryStore
+
+    if args.command == "export":
+        rows = list(HistoryStore(args.source).dump())
+        user_ids = [user_id for user_id, _ in rows]
+        records = [Assessment.from_entry(entry) for _, entry in rows]
+        write = write_parquet if args.destination.endswith('.parquet') else write_arrow
+        write(args.destination, records, user_ids)
+        print(f"Exported {len(records)} assessments to {args.destination}")
+    else:
+        table = read_parquet(args.source) if args.source.endswith('.parquet') else read_arrow(args.source)
+        user_ids, records = from_arrow(table)
+        if user_ids is None:
+            parser.error(f"{args.source} has no user_id column")
+        HistoryStore(args.destination).extend(
+            (user_id, record.to_entry()) for user_id, record in zip(user_ids, records)
+        )
+        print(f"Imported {len(records)} assessments into {args.destination}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Process-wide instances shared by every session.
+
+Streamlit reruns the script on every interaction and runs one copy per
+session, so components that hold process state (quotas, caches, pools,
+connections) are looked up here rather than created by the script. The
+``get_*`` functions of the other modules are thin wrappers around
+``shared()``. It builds an instance on first use and hands the same one out
+afterwards. Asking for it again with different options raises
+``ConfigConflict``, instead of silently returning the instance built with
+the first options.
+"""
+import threading
+
+_instances = {}  # (kind, key) -> (instance, options it was built with)
+_lock = threading.RLock()  # re-entrant: building one instance may look up another
+
+
+class ConfigConflict(ValueError):
+    """A shared instance was asked for again with different options"""
+
+
+def shared(kind, key, build, **options):
+    """The ``kind`` instance for ``key``, created with ``build(**options)`` on first use"""
+    with _lock:
+        found = _instances.get((kind, key))
+        if found is None:
+            instance = build(**options)
+            _instances[(kind, key)] = (instance, options)
+            return instance
+    instance, built_with = found
+    if built_with != options:
+        # Only the option names: keys and values may hold secrets (URLs with passwords, salts)
+        changed = sorted(name for name in built_with.keys() | options.keys() if built_with.get(name) != options.get(name))
+        raise ConfigConflict(f"The {kind} already exists with another {', '.join(changed)}; restart to apply new settings")
+    return instance
@@ -0,0 +1,402 @@
+"""Organisation-level wellbeing rollups.
+
+HR wants team and department views of how many people are recommended leave
+and how wellness is trending, without anyone reading individual
+assessments. ``RollupStore.record()`` folds every saved assessment into
+pre-bucketed counters at write time: for the whole organisation (``org``),
+the person's department (``dept:<name>``) and team (``team:<name>``), per
+day and per ISO week (weeks start on Monday). Each bucket counts
+
+- ``assessments`` and the ``wellness_sum`` of their scores,
+- ``people``: distinct people with an assessment in the bucket,
+- ``full_day_leave``, ``half_day_leave`` and ``any_leave``: distinct people
+  recommended that kind of leave at least once.
+
+Distinct counts use a marker per bucket and person (a salted hash of the user
+id, never the id itself), so a write is a fixed number of small upserts
+however large the organisation or long the history. Markers are only needed
+while a bucket can still get late entries and are dropped after
+``keep_days``; the counters are kept.
+
+Buckets with fewer than ``min_group`` people are suppressed (their figures
+come back as None), so the answers of a small team cannot be singled out.
+Because a total minus its visible parts describes the hidden ones, more
+buckets are suppressed where that would isolate a single hidden group
+(complementary suppression, ``suppress()``): a department and its teams, the
+organisation and its departments (plus teams without one), and a week and
+its days. For each such total that is shown, if exactly one of its parts is
+hidden (counting the people not in any part, when they are fewer than
+``min_group``), its smallest shown part is hidden too, or the total when no
+part is left; this repeats until nothing changes.
+
+Reads therefore work a week at a time: the week's bucket and its seven days'
+for every group, i.e. eight rows per group whatever the number of employees
+or assessments, fetched in one query (one MGET on a shared backend). The
+counters and what ``suppress()`` hides are then cached per week. Every
+``record()`` adds to the organisation's bucket of its week, so a read only
+looks that one bucket up and recomputes the week when its count has moved:
+closed weeks are computed once, the current one once per new assessment.
+``record()`` also keeps each group's parent (``hierarchy()``).
+
+``SharedRollupStore`` keeps the same counters on a ``shared_state`` backend.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import partial
+
+import registry
+import shared_state
+from db import ThreadLocalConnections
+
+PERIODS = ("day", "week")
+LEAVE_KINDS = ("full_day_leave", "half_day_leave")
+LEVELS = {"org": "org", "department": "dept:", "team": "team:"}
+
+_COUNTERS = ('assessments', 'wellness_sum', 'people', 'full_day_leave', 'half_day_leave', 'any_leave')
+CACHED_WEEKS = 64
+
+
+def period_start(day, period):
+    return day if period == "day" else day - timedelta(days=day.weekday())
+
+
+def hierarchy(team=None, department=None):
+    """The groups an assessment counts towards, each with the group it is part of"""
+    result = {"org": None}
+    if department:
+        result[f"dept:{department}"] = "org"
+    if team:
+        result[f"team:{team}"] = f"dept:{department}" if department else "org"
+    return result
+
+
+def scopes(team=None, department=None):
+    """The groups an assessment counts towards"""
+    return list(hierarchy(team, department))
+
+
+def _kinds(entry):
+    # What a person is counted as once per bucket
+    if entry['recommendation'] in LEAVE_KINDS:
+        return ("people", entry['recommendation'], "any_leave")
+    return ("people",)
+
+
+def _starts(period, count, end):
+    last = period_start(end or date.today(), period)
+    step = timedelta(days=1 if period == "day" else 7)
+    return [(last - step * i).isoformat() for i in reversed(range(count))]
+
+
+def _week_starts(week):
+    monday = date.fromisoformat(week)
+    return [("week", week)] + [("day", (monday + timedelta(days=i)).isoformat()) for i in range(7)]
+
+
+def suppress(cells, totals, min_group):
+    """The cells of ``cells`` (a mapping to counters) that must not be shown.
+
+    ``totals`` holds ``(total, parts)`` pairs of cells; see the module
+    docstring for the rules.
+    """
+    hidden = {cell for cell, counters in cells.items() if counters['people'] < min_group}
+    checks = []  # (total, parts, whether the rest not covered by the parts is a small hidden group)
+    containing = {}  # cell -> indexes of the checks it is a part of
+    for total, parts in totals:
+        if total not in cells:
+            continue
+        parts = [part for part in parts if part in cells]
+        rest = cells[total]['assessments'] - sum(cells[part]['assessments'] for part in parts)
+        # Distinct people can be in several parts, so this undercounts (which only hides more)
+        rest_people = cells[total]['people'] - sum(cells[part]['people'] for part in parts)
+        for part in parts:
+            containing.setdefault(part, []).append(len(checks))
+        checks.append((total, parts, rest > 0 and rest_people < min_group))
+
+    # A check can only change its answer when one of its cells is hidden, so recheck just those
+    pending = list(range(len(checks)))
+    while pending:
+        total, parts, small_rest = checks[pending.pop()]
+        if total in hidden or sum(part in hidden for part in parts) + small_rest != 1:
+            continue
+        shown = [part for part in parts if part not in hidden]
+        cell = min(shown, key=lambda part: (cells[part]['people'], part)) if shown else total
+        hidden.add(cell)
+        pending += containing.get(cell, ())
+    return hidden
+
+
+def publish(scope, period, start, counters, suppressed=False):
+    """What the dashboard may show of one bucket"""
+    row = {'scope': scope, 'period': period, 'start': start}
+    if not counters or suppressed:
+        row.update(suppressed=True, people=None, assessments=None, mean_wellness=None,
+                   full_day_leave=None, half_day_leave=None, leave_share=None)
+        return row
+    row.update(
+        suppressed=False,
+        people=counters['people'],
+        assessments=counters['assessments'],
+        mean_wellness=round(counters['wellness_sum'] / counters['assessments'], 1),
+        full_day_leave=counters['full_day_leave'],
+        half_day_leave=counters['half_day_leave'],
+        leave_share=round(counters['any_leave'] / counters['people'], 3),
+    )
+    return row
+
+
+class _Rollups:
+    def __init__(self, min_group=5, salt="", keep_days=35):
+        self.min_group = min_group
+        self.salt = salt
+        self.keep_days = keep_days
+        self._weeks = OrderedDict()  # week -> (assessments in the org's week bucket, (cells, hidden))
+        self._weeks_lock = threading.Lock()
+
+    def _person(self, user_id):
+        return hashlib.sha256(f"{self.salt}:{user_id}".encode()).hexdigest()[:16]
+
+    def _week(self, week):
+        # Counters of every group for the week and its days, and the (scope, period, start) cells to hide
+        org = self._bucket("org", "week", week)
+        version = org['assessments'] if org else 0
+        with self._weeks_lock:
+            cached = self._weeks.get(week)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        parents = self._parents()
+        starts = _week_starts(week)
+        cells = self._week_cells(starts, parents)
+        parts = {}
+        for scope, period, start in sorted(cells):
+            parts.setdefault((parents.get(scope), period, start), []).append((scope, period, start))
+        totals = [(total, cells_of) for total, cells_of in parts.items() if total[0]]
+        for scope, period, start in sorted(cells):
+            if period == "week":
+                totals.append(((scope, period, start), [(scope, *day) for day in starts[1:]]))
+        result = cells, suppress(cells, totals, self.min_group)
+
+        # A write racing this read leaves a newer week than ``version``, which only costs a recompute
+        with self._weeks_lock:
+            self._weeks[week] = (version, result)
+            self._weeks.move_to_end(week)
+            while len(self._weeks) > CACHED_WEEKS:
+                self._weeks.popitem(last=False)
+        return result
+
+    def series(self, scope, period="week", count=12, end=None):
+        """The last ``count`` buckets of ``scope`` up to ``end`` (default today), oldest first"""
+        weeks = {}
+        rows = []
+        for start in _starts(period, count, end):
+            week = period_start(date.fromisoformat(start), "week").isoformat()
+            if week not in weeks:
+                weeks[week] = self._week(week)
+            cells, hidden = weeks[week]
+            cell = (scope, period, start)
+            rows.append(publish(scope, period, start, cells.get(cell), cell in hidden))
+        return rows
+
+    def overview(self, level="team", period="week", start=None):
+        """One bucket per group of ``level`` (team, department or org) for the period holding ``start``"""
+        start = period_start(start or date.today(), period).isoformat()
+        cells, hidden = self._week(period_start(date.fromisoformat(start), "week").isoformat())
+        rows = []
+        for (scope, cell_period, cell_start), counters in cells.items():
+            if (cell_period, cell_start) == (period, start) and scope.startswith(LEVELS[level]):
+                rows.append(publish(scope, period, start, counters, (scope, period, start) in hidden))
+        return sorted(rows, key=lambda row: row['scope'])
+
+
+class RollupStore(_Rollups):
+    """Rollup counters in SQLite, next to the history."""
+
+    def __init__(self, path, min_group=5, salt="", keep_days=35):
+        super().__init__(min_group, salt, keep_days)
+        self._connections = ThreadLocalConnections(path)
+        self._pruned_before = None
+        self._known_parents = {}
+        conn = self._connections.get()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollups ("
+            " scope TEXT NOT NULL,"
+            " period TEXT NOT NULL,"
+            " start TEXT NOT NULL,"
+            " assessments INTEGER NOT NULL,"
+            " wellness_sum REAL NOT NULL,"
+            " people INTEGER NOT NULL,"
+            " full_day_leave INTEGER NOT NULL,"
+            " half_day_leave INTEGER NOT NULL,"
+            " any_leave INTEGER NOT NULL,"
+            " PRIMARY KEY (scope, period, start)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS rollups_period ON rollups(period, start, scope)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rollup_seen ("
+            " period TEXT NOT NULL,"
+            " start TEXT NOT NULL,"
+            " scope TEXT NOT NULL,"
+            " person TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " PRIMARY KEY (period, start, scope, person, kind)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS rollup_groups (scope TEXT PRIMARY KEY, parent TEXT) WITHOUT ROWID")
+
+    def record(self, user_id, entry, team=None, department=None):
+        """Fold one saved assessment into the counters of every group and period it belongs to"""
+        self.record_many([(user_id, entry, team, department)])
+
+    def record_many(self, rows):
+        """``record()`` for many ``(user_id, entry, team, department)`` rows in one transaction (backfills)"""
+        conn = self._connections.get()
+        # IMMEDIATE takes the write lock up front so concurrent sessions don't lose updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            newest = None
+            for user_id, entry, team, department in rows:
+                self._fold(conn, self._person(user_id), entry, team, department)
+                newest = max(newest or entry['date'], entry['date'])
+            if newest is not None:
+                self._prune(conn, date.fromisoformat(newest))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _fold(self, conn, person, entry, team, department):
+        day = date.fromisoformat(entry['date'])
+        kinds = _kinds(entry)
+        groups = hierarchy(team, department)
+        for scope, parent in groups.items():
+            if self._known_parents.get(scope, "") != parent:
+                conn.execute("INSERT OR REPLACE INTO rollup_groups VALUES (?, ?)", (scope, parent))
+                self._known_parents[scope] = parent
+        for scope in groups:
+            for period in PERIODS:
+                start = period_start(day, period).isoformat()
+                new = {
+                    kind: conn.execute(
+                        "INSERT OR IGNORE INTO rollup_seen VALUES (?, ?, ?, ?, ?)", (period, start, scope, person, kind)
+                    ).rowcount
+                    for kind in kinds
+                }
+                conn.execute(
+                    "INSERT INTO rollups VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (scope, period, start) DO UPDATE SET"
+                    " assessments = assessments + 1,"
+                    " wellness_sum = wellness_sum + excluded.wellness_sum,"
+                    " people = people + excluded.people,"
+                    " full_day_leave = full_day_leave + excluded.full_day_leave,"
+                    " half_day_leave = half_day_leave + excluded.half_day_leave,"
+                    " any_leave = any_leave + excluded.any_leave",
+                    (scope, period, start, entry['wellness_score'], new['people'],
+                     new.get('full_day_leave', 0), new.get('half_day_leave', 0), new.get('any_leave', 0)),
+                )
+
+    def _prune(self, conn, newest):
+        # Distinct-person markers are only needed while late entries can still arrive
+        cutoff = (newest - timedelta(days=self.keep_days)).isoformat()
+        if self._pruned_before is None or cutoff > self._pruned_before:
+            conn.execute("DELETE FROM rollup_seen WHERE period IN ('day', 'week') AND start < ?", (cutoff,))
+            self._pruned_before = cutoff
+
+    def _bucket(self, scope, period, start):
+        row = self._connections.get().execute(
+            "SELECT assessments, wellness_sum, people, full_day_leave, half_day_leave, any_leave"
+            " FROM rollups WHERE scope = ? AND period = ? AND start = ?",
+            (scope, period, start),
+        ).fetchone()
+        return _counters(row) if row else None
+
+    def _week_cells(self, starts, parents):
+        (_, week), days = starts[0], starts[1:]
+        rows = self._connections.get().execute(
+            "SELECT scope, period, start, assessments, wellness_sum, people, full_day_leave, half_day_leave, any_leave"
+            " FROM rollups WHERE period = 'week' AND start = ?"
+            " UNION ALL SELECT scope, period, start, assessments, wellness_sum, people, full_day_leave, half_day_leave, any_leave"
+            " FROM rollups WHERE period = 'day' AND start BETWEEN ? AND ?",
+            (week, days[0][1], days[-1][1]),
+        )
+        return {tuple(row[:3]): _counters(row[3:]) for row in rows}
+
+    def _parents(self):
+        return dict(self._connections.get().execute("SELECT scope, parent FROM rollup_groups"))
+
+
+def _counters(values):
+    return dict(zip(_COUNTERS, values))
+
+
+class SharedRollupStore(_Rollups):
+    """RollupStore on a shared_state backend: one key per bucket, plus the groups and their parents."""
+
+    def __init__(self, backend, min_group=5, salt="", keep_days=35):
+        super().__init__(min_group, salt, keep_days)
+        self.backend = backend
+        self._known_parents = {}
+
+    def record(self, user_id, entry, team=None, department=None):
+        """Fold one saved assessment into the counters of every group and period it belongs to"""
+        person = self._person(user_id)
+        day = date.fromisoformat(entry['date'])
+        groups = hierarchy(team, department)
+        kinds = _kinds(entry)
+        for period in PERIODS:
+            start = period_start(day, period).isoformat()
+            new = set()
+
+            def mark(seen):
+                # May run more than once if another replica writes concurrently
+                seen = set(seen or ())
+                new.clear()
+                new.update(f"{scope}|{kind}" for scope in groups for kind in kinds if f"{scope}|{kind}" not in seen)
+                return sorted(seen | new)
+
+            self.backend.update(f"rollup_seen:{period}:{start}:{person}", mark, ttl=self.keep_days * 86400)
+            for scope in groups:
+                self.backend.update(
+                    f"rollup:{scope}:{period}:{start}",
+                    lambda counters, scope=scope: _add(counters, entry, {kind for kind in kinds if f"{scope}|{kind}" in new}),
+                )
+        for scope, parent in groups.items():
+            if self._known_parents.get(scope, "") != parent:
+                self.backend.update("rollup_groups", lambda known, scope=scope, parent=parent: {**(known or {}), scope: parent})
+                self._known_parents[scope] = parent
+
+    def record_many(self, rows):
+        for user_id, entry, team, department in rows:
+            self.record(user_id, entry, team, department)
+
+    def _bucket(self, scope, period, start):
+        return self.backend.get(f"rollup:{scope}:{period}:{start}")
+
+    def _week_cells(self, starts, parents):
+        cells = [(scope, period, start) for scope in parents for period, start in starts]
+        found = self.backend.get_many([f"rollup:{scope}:{period}:{start}" for scope, period, start in cells])
+        return {cell: counters for cell, counters in zip(cells, found) if counters}
+
+    def _parents(self):
+        return self.backend.get("rollup_groups") or {}
+
+
+def _add(counters, entry, new_kinds):
+    counters = counters or dict.fromkeys(_COUNTERS, 0)
+    counters['assessments'] += 1
+    counters['wellness_sum'] += entry['wellness_score']
+    for kind in new_kinds:
+        counters[kind] += 1
+    return counters
+
+
+def _open(path, **kwargs):
+    if shared_state.is_url(path):
+        return SharedRollupStore(shared_state.get_backend(path), **kwargs)
+    return RollupStore(path, **kwargs)
+
+
+def get_rollups(path, **kwargs):
+    """The process's rollup store for ``path``, a SQLite file or a shared_state URL"""
+    return registry.shared("rollup store", path, partial(_open, path), **kwargs)
@@ -0,0 +1,188 @@
+"""Deterministic wellness scoring model (the local fallback heuristic).
+
+``score()`` scores one questionnaire record and ``fallback_analysis()`` turns
+that into the answer the app falls back to when Gemini is unavailable.
+``score_batch()`` applies exactly the same model to a whole DataFrame (or
+Arrow table) with NumPy, for bulk scoring of survey exports and for checking
+LLM answers against the local model.
+
+    python scoring.py pulse_survey.csv scored.csv
+"""
+import argparse
+
+LEAVE_TYPES = ("full_day_leave", "half_day_leave", "work_with_care", "work_normally")
+
+INPUT_COLUMNS = ("work_pressure", "personal_stress", "energy", "sleep", "leave_balance")
+
+
+def parse_leave_days(leave_balance_text):
+    """Map the leave balance selectbox text to a number of days"""
+    if '20+' in leave_balance_text:
+        return 20
+    elif '15-20' in leave_balance_text:
+        return 15
+    elif '10-15' in leave_balance_text:
+        return 10
+    elif '5-10' in leave_balance_text:
+        return 5
+    else:
+        return 2
+
+
+def score(data):
+    """Score one questionnaire record.
+
+    Returns a dict with wellness_score, leave_type, stress_factor and leave_days.
+    """
+    stress_factor = (data['work_pressure'] + data['personal_stress']) / 2
+    energy_factor = data['energy']
+    sleep_factor = data['sleep']
+    leave_days = parse_leave_days(data['leave_balance'])
+
+    # Calculate wellness score with leave balance consideration
+    wellness = 100 - (stress_factor * 10) - ((10 - energy_factor) * 8) - ((10 - sleep_factor) * 6)
+
+    # Adjust based on leave balance
+    if leave_days < 5:
+        wellness += 10  # More conservative if low leave balance
+    elif leave_days > 15:
+        wellness -= 5   # More flexible if high leave balance
+
+    wellness = max(5, min(100, int(wellness)))
+
+    # Decision logic based on multiple factors
+    if wellness < 25 or (stress_factor > 8 and energy_factor < 3):
+        leave_type = "full_day_leave"
+    elif wellness < 45 or (stress_factor > 6 and sleep_factor < 5):
+        leave_type = "half_day_leave"
+    elif wellness < 65:
+        leave_type = "work_with_care"
+    else:
+        leave_type = "work_normally"
+
+    return {
+        "wellness_score": wellness,
+        "leave_type": leave_type,
+        "stress_factor": stress_factor,
+        "leave_days": leave_days,
+    }
+
+
+DECISION_SUMMARIES = {
+    "full_day_leave": "Your stress levels are critically high and energy is depleted. A full day of rest is essential to prevent burnout.",
+    "half_day_leave": "Moderate stress levels suggest you need some recovery time. Consider taking half day or leaving early.",
+    "work_with_care": "You can work tomorrow but need to be very careful with your energy and stress management.",
+    "work_normally": "You're in good shape to work tomorrow. Focus on maintaining your current positive state.",
+}
+
+
+def fallback_analysis(data):
+    """Full analysis dict (same shape as the Gemini response) from the local model"""
+    result = score(data)
+    return {
+        "wellness_score": result['wellness_score'],
+        "leave_type": result['leave_type'],
+        "confidence": 75,
+        "main_reason": f"Stress level {result['stress_factor']:.1f}/10, Energy {data['energy']}/10, Leave balance: {result['leave_days']} days",
+        "decision_summary": DECISION_SUMMARIES[result['leave_type']],
+        "work_activities": ["Take regular breaks every hour", "Prioritize only essential tasks", "Stay hydrated and eat well"],
+        "work_avoid": ["Overtime or extra commitments", "Perfectionism on minor tasks", "Skipping lunch break"],
+        "leave_activities": ["Sleep until naturally awake", "Light exercise or walk", "Do something you enjoy", "Connect with supportive people"],
+        "leave_avoid": ["Checking work emails", "Intensive physical activities", "Making major decisions"],
+        "warning_signs": ["Panic attacks", "Complete inability to focus", "Persistent physical symptoms"],
+        "recovery_estimate": "1-3 days with proper rest"
+    }
+
+
+def score_arrays(work_pressure, personal_stress, energy, sleep, leave_days):
+    """Vectorised core of ``score()``.
+
+    Takes equal-length numeric arrays and returns ``(wellness_score, leave_code)``
+    where ``leave_code`` indexes into ``LEAVE_TYPES``.
+    """
+    import numpy as np
+
+    work_pressure = np.asarray(work_pressure, dtype=np.float64)
+    personal_stress = np.asarray(personal_stress, dtype=np.float64)
+    energy = np.asarray(energy, dtype=np.float64)
+    sleep = np.asarray(sleep, dtype=np.float64)
+    leave_days = np.asarray(leave_days)
+
+    stress = (work_pressure + personal_stress) / 2
+    wellness = 100 - stress * 10 - (10 - energy) * 8 - (10 - sleep) * 6
+    wellness += np.where(leave_days < 5, 10, np.where(leave_days > 15, -5, 0))
+    # int() truncates toward zero before clamping, same as the scalar path
+    wellness = np.clip(np.trunc(wellness), 5, 100).astype(np.int16)
+
+    leave_code = np.select(
+        [
+            (wellness < 25) | ((stress > 8) & (energy < 3)),
+            (wellness < 45) | ((stress > 6) & (sleep < 5)),
+            wellness < 65,
+        ],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int8)
+    return wellness, leave_code
+
+
+def score_batch(frame):
+    """Score every row of a DataFrame or Arrow table with the columns in ``INPUT_COLUMNS``.
+
+    Returns a DataFrame (same index) with ``wellness_score`` and a categorical
+    ``leave_type`` column.
+    """
+    import numpy as np
+    import pandas as pd
+
+    if not isinstance(frame, pd.DataFrame):
+        frame = frame.to_pandas()  # pyarrow.Table
+
+    missing = [column for column in INPUT_COLUMNS if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+    # Only a handful of distinct leave balance strings exist, so parse each once
+    codes, uniques = pd.factorize(frame['leave_balance'].astype(str), sort=False)
+    leave_days = np.array([parse_leave_days(text) for text in uniques], dtype=np.int16)[codes]
+
+    wellness, leave_code = score_arrays(
+        frame['work_pressure'].to_numpy(),
+        frame['personal_stress'].to_numpy(),
+        frame['energy'].to_numpy(),
+        frame['sleep'].to_numpy(),
+        leave_days,
+    )
+    return pd.DataFrame(
+        {
+            'wellness_score': wellness,
+            'leave_type': pd.Categorical.from_codes(leave_code, categories=LEAVE_TYPES),
+        },
+        index=frame.index,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score questionnaire rows with the local heuristic")
+    parser.add_argument("input", help="CSV, JSONL or Parquet file with questionnaire columns")
+    parser.add_argument("output", help="CSV or Parquet file to write")
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    if args.input.endswith('.parquet'):
+        frame = pd.read_parquet(args.input)
+    elif args.input.endswith('.jsonl'):
+        frame = pd.read_json(args.input, lines=True)
+    else:
+        frame = pd.read_csv(args.input)
+
+    scored = frame.join(score_batch(frame))
+    if args.output.endswith('.parquet'):
+        scored.to_parquet(args.output, index=False)
+    else:
+        scored.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,531 @@
+"""Shared state backends, so several app replicas can serve the same users.
+
+The stores (assessment history, trends, analysis cache) and the forecast
+cache's second level only need a small key-value and sorted-set interface,
+implemented by three backends:
+
+- ``memory://``: in this process only (single replica, tests),
+- ``sqlite:///relative/path.sqlite3`` (``sqlite:////absolute/...``): one file
+  shared by the replicas on a host or on a shared volume,
+- ``redis://host:port/db``: any server speaking the Redis protocol (RESP).
+  The client is a small stdlib one, so no extra dependency is needed.
+
+Values are stored with ``encode()``/``decode()``, a compact binary format
+(tagged, varint-length) that is independent of the Python version.
+
+``get_backend(url)`` returns one backend per URL and process;
+``is_url(location)`` tells a backend URL from a plain SQLite path.
+"""
+import bisect
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from urllib.parse import unquote, urlparse
+
+import registry
+from db import ThreadLocalConnections
+
+SCHEMES = ("memory", "sqlite", "redis")
+
+
+class StateBackendError(Exception):
+    """The shared state backend failed or answered with an error"""
+
+
+# What the stores (history, trends, rollups, caches) raise when their storage fails,
+# on a shared backend or on a SQLite file (e.g. "database is locked")
+STORAGE_ERRORS = (StateBackendError, sqlite3.Error)
+
+
+# --- Compact binary serialization -----------------------------------------
+
+_NONE, _FALSE, _TRUE, _INT, _NEG, _FLOAT, _STR, _BYTES, _LIST, _DICT = range(10)
+_DOUBLE = struct.Struct('>d')
+
+
+def _write_varint(out, n):
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _encode(value, out):
+    if value is None:
+        out.append(_NONE)
+    elif value is True or value is False:
+        out.append(_TRUE if value else _FALSE)
+    elif isinstance(value, int):
+        out.append(_INT if value >= 0 else _NEG)
+        _write_varint(out, value if value >= 0 else -value)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out.append(_STR)
+        _write_varint(out, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(_BYTES)
+        _write_varint(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _encode(key, out)
+            _encode(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+def encode(value):
+    """Serialize None/bool/int/float/str/bytes and lists, tuples and dicts of them"""
+    out = bytearray()
+    _encode(value, out)
+    return bytes(out)
+
+
+def _decode(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag in (_FALSE, _TRUE):
+        return tag == _TRUE, pos
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(data, pos)[0], pos + 8
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    if tag == _INT:
+        return n, pos
+    if tag == _NEG:
+        return -n, pos
+    if tag == _STR:
+        return str(data[pos:pos + n], 'utf-8'), pos + n
+    if tag == _BYTES:
+        return bytes(data[pos:pos + n]), pos + n
+    if tag == _LIST:
+        items = []
+        for _ in range(n):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        items = {}
+        for _ in range(n):
+            key, pos = _decode(data, pos)
+            items[key], pos = _decode(data, pos)
+        return items, pos
+    raise ValueError(f"Unknown tag {tag}")
+
+
+def decode(data):
+    """Inverse of ``encode()`` (tuples come back as lists)"""
+    value, _ = _decode(memoryview(data), 0)
+    return value
+
+
+# --- Backends ---------------------------------------------------------------
+#
+# get/set/delete/update work on single values, the z* methods on sorted sets
+# of values ordered by a float score. Score ranges are [min_score, max_score).
+
+
+class MemoryBackend:
+    """Process-local backend; bounded LRU of ``max_keys`` keys."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._values = OrderedDict()  # key -> (expires_at or None, value or sorted [(score, encoded)])
+        self._lock = threading.RLock()
+
+    def _live(self, key):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        if entry[0] is not None and entry[0] <= time.time():
+            del self._values[key]
+            return None
+        self._values.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, ttl=None):
+        self._values[key] = (time.time() + ttl if ttl else None, value)
+        self._values.move_to_end(key)
+        while len(self._values) > self.max_keys:
+            self._values.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+        return decode(entry[1]) if entry is not None else None
+
+    def get_many(self, keys):
+        """The values of ``keys`` (None where missing), in order"""
+        with self._lock:
+            entries = [self._live(key) for key in keys]
+        return [decode(entry[1]) if entry is not None else None for entry in entries]
+
+    def set(self, key, value, ttl=None):
+        data = encode(value)
+        with self._lock:
+            self._store(key, data, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def update(self, key, fn, ttl=None):
+        """Atomically replace the value with ``fn(old value or None)`` and return it"""
+        with self._lock:
+            entry = self._live(key)
+            value = fn(decode(entry[1]) if entry is not None else None)
+            self._store(key, encode(value), ttl)
+        return value
+
+    def _zset(self, key, create=False):
+        entry = self._live(key)
+        if entry is None:
+            if not create:
+                return []
+            self._store(key, [])
+            entry = self._values[key]
+        return entry[1]
+
+    def zadd(self, key, score, value):
+        data = encode(value)
+        with self._lock:
+            members = self._zset(key, create=True)
+            index = next((i for i, (_, member) in enumerate(members) if member == data), None)
+            if index is not None:
+                del members[index]
+            bisect.insort(members, (float(score), data))
+
+    def zrange(self, key, min_score, max_score, reverse=False, limit=None):
+        with self._lock:
+            members = self._zset(key)
+            lo = bisect.bisect_left(members, (min_score,))
+            hi = bisect.bisect_left(members, (max_score,))
+            selected = members[lo:hi]
+        if reverse:
+            selected = selected[::-1]
+        if limit is not None:
+            selected = selected[:limit]
+        return [decode(data) for _, data in selected]
+
+    def zremrange(self, key, min_score, max_score):
+        with self._lock:
+            members = self._zset(key)
+            lo = bisect.bisect_left(members, (min_score,))
+            hi = bisect.bisect_left(members, (max_score,))
+            del members[lo:hi]
+            return hi - lo
+
+    def zcard(self, key):
+        with self._lock:
+            return len(self._zset(key))
+
+
+class SQLiteBackend:
+    """Backend in one SQLite file (WAL mode), shared by the processes on a host."""
+
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self._connections = ThreadLocalConnections(path)
+        self._writes = 0
+        self._lock = threading.Lock()
+        conn = self._connections.get()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " expires_at REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS zsets ("
+            " key TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " member BLOB NOT NULL,"
+            " PRIMARY KEY (key, member))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS zsets_key_score ON zsets(key, score)")
+
+    def _conn(self):
+        return self._connections.get()
+
+    def _written(self):
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.purge_every == 0
+        if due:
+            self._conn().execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return decode(row[0]) if row else None
+
+    def get_many(self, keys):
+        found = {}
+        now = time.time()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            found.update(self._conn().execute(
+                f"SELECT key, value FROM kv WHERE key IN ({', '.join('?' * len(chunk))})"
+                " AND (expires_at IS NULL OR expires_at > ?)",
+                (*chunk, now),
+            ))
+        return [decode(found[key]) if key in found else None for key in keys]
+
+    def set(self, key, value, ttl=None):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, encode(value), time.time() + ttl if ttl else None),
+        )
+        self._written()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, key, fn, ttl=None):
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front so concurrent writers don't lose updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = fn(self.get(key))
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, encode(value), time.time() + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def zadd(self, key, score, value):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO zsets (key, score, member) VALUES (?, ?, ?)",
+            (key, float(score), encode(value)),
+        )
+
+    def zrange(self, key, min_score, max_score, reverse=False, limit=None):
+        sql = (
+            "SELECT member FROM zsets WHERE key = ? AND score >= ? AND score < ?"
+            f" ORDER BY score {'DESC' if reverse else 'ASC'}, member {'DESC' if reverse else 'ASC'}"
+        )
+        params = [key, min_score, max_score]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [decode(row[0]) for row in self._conn().execute(sql, params)]
+
+    def zremrange(self, key, min_score, max_score):
+        return self._conn().execute(
+            "DELETE FROM zsets WHERE key = ? AND score >= ? AND score < ?", (key, min_score, max_score)
+        ).rowcount
+
+    def zcard(self, key):
+        return self._conn().execute("SELECT COUNT(*) FROM zsets WHERE key = ?", (key,)).fetchone()[0]
+
+
+class RespBackend:
+    """Backend on a Redis-protocol server, with one connection per thread.
+
+    Keys are namespaced with ``prefix``. ``update()`` is optimistic
+    (WATCH/MULTI/EXEC, retried when another client changed the key or the
+    connection dropped, which loses the WATCH).
+    """
+
+    UPDATE_RECONNECTS = 3
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, prefix="leave:", timeout=2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _call(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._local.sock.sendall(b''.join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the state server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise StateBackendError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise StateBackendError(f"Unexpected reply: {line!r}")
+
+    def command(self, *args, reconnect=True):
+        """Send one command and return the decoded reply.
+
+        Reconnects once on a dropped connection; with ``reconnect=False`` (inside
+        a transaction, whose state the connection holds) the ConnectionError or
+        OSError is raised instead.
+        """
+        for attempt in (0, 1):
+            try:
+                if getattr(self._local, 'sock', None) is None:
+                    self._connect()
+                return self._call(*args)
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if not reconnect:
+                    raise
+                if attempt:
+                    raise StateBackendError(f"State server unavailable: {e}") from e
+
+    def get(self, key):
+        data = self.command('GET', self.prefix + key)
+        return decode(data) if data is not None else None
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [decode(data) if data is not None else None
+                for data in self.command('MGET', *(self.prefix + key for key in keys))]
+
+    def set(self, key, value, ttl=None):
+        if ttl:
+            self.command('SET', self.prefix + key, encode(value), 'PX', int(ttl * 1000))
+        else:
+            self.command('SET', self.prefix + key, encode(value))
+
+    def delete(self, key):
+        self.command('DEL', self.prefix + key)
+
+    def update(self, key, fn, ttl=None):
+        name = self.prefix + key
+        reconnects = 0
+        while True:
+            self.command('WATCH', name)
+            try:
+                data = self.command('GET', name, reconnect=False)
+                value = fn(decode(data) if data is not None else None)
+                self.command('MULTI', reconnect=False)
+                if ttl:
+                    self.command('SET', name, encode(value), 'PX', int(ttl * 1000), reconnect=False)
+                else:
+                    self.command('SET', name, encode(value), reconnect=False)
+                if self.command('EXEC', reconnect=False) is not None:
+                    return value
+            except (OSError, ConnectionError) as e:
+                # The WATCH went with the connection; start over on a new one
+                reconnects += 1
+                if reconnects > self.UPDATE_RECONNECTS:
+                    raise StateBackendError(f"State server unavailable: {e}") from e
+            except BaseException:
+                # Dropping the connection discards the WATCH and any queued MULTI
+                self._close()
+                raise
+
+    def zadd(self, key, score, value):
+        self.command('ZADD', self.prefix + key, repr(float(score)), encode(value))
+
+    def zrange(self, key, min_score, max_score, reverse=False, limit=None):
+        low, high = repr(float(min_score)), '(' + repr(float(max_score))
+        if reverse:
+            args = ['ZREVRANGEBYSCORE', self.prefix + key, high, low]
+        else:
+            args = ['ZRANGEBYSCORE', self.prefix + key, low, high]
+        if limit is not None:
+            args += ['LIMIT', 0, limit]
+        return [decode(data) for data in self.command(*args)]
+
+    def zremrange(self, key, min_score, max_score):
+        return self.command('ZREMRANGEBYSCORE', self.prefix + key,
+                            repr(float(min_score)), '(' + repr(float(max_score)))
+
+    def zcard(self, key):
+        return self.command('ZCARD', self.prefix + key)
+
+
+def is_url(location):
+    """Whether ``location`` names a backend (``scheme://...``) rather than a SQLite path"""
+    return isinstance(location, str) and location.split('://', 1)[0] in SCHEMES and '://' in location
+
+
+def open_backend(url):
+    """New backend for ``url`` (memory://, sqlite:///path or redis://[:password@]host[:port][/db])"""
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        return MemoryBackend()
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(unquote(parsed.path[1:]))
+    if parsed.scheme == "redis":
+        db = parsed.path.strip('/')
+        return RespBackend(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(db) if db else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+        )
+    # The scheme only: the rest of the URL may hold a password
+    raise ValueError(f"Unknown state backend scheme {parsed.scheme!r} (expected one of {', '.join(SCHEMES)})")
+
+
+def get_backend(url):
+    """The process's backend for ``url``"""
+    return registry.shared("state backend", url, partial(open_backend, url))
@@ -0,0 +1,124 @@
+"""Coalescing of identical in-flight calls ("single flight").
+
+At a submission spike many people send exactly the same answers (the
+questionnaire is a small discrete space). The analysis cache only helps once
+the first answer is back; until then every duplicate would make its own
+Gemini call. ``SingleFlight.do(key, fn)`` runs ``fn`` once per key at a time:
+the first caller (the leader) makes the call, callers that arrive while it is
+in flight (followers) wait for it and get the same result, or the same
+exception.
+
+Streaming is shared too. Events the leader's call emits are replayed to each
+follower's ``on_event`` on the follower's own thread (Streamlit only lets a
+session write to its page from its script thread), starting with the events
+emitted before the follower joined.
+"""
+import copy
+import queue
+import threading
+
+import registry
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.events = []
+        self.listeners = []
+        self.result = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Per-key coalescing of concurrent calls, shared by all sessions in the process."""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {"calls": 0, "coalesced": 0, "failures": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def do(self, key, fn, on_event=None):
+        """Return ``fn(on_event)``, sharing one in-flight call per ``key``.
+
+        ``fn`` is called with the event callback to stream through (None if
+        the caller does not stream) and must return the result or raise.
+        """
+        while True:
+            listener = queue.Queue()
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+                elif on_event is not None:
+                    for event in flight.events:
+                        listener.put(event)
+                    flight.listeners.append(listener)
+            if leader:
+                return self._lead(key, flight, fn, on_event)
+
+            self._count("coalesced")
+            self._follow(flight, listener, on_event)
+            if flight.abandoned:
+                # The leader's script run was stopped mid-call; try again (maybe as the leader)
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+    def _lead(self, key, flight, fn, on_event):
+        def publish(*event):
+            with self._lock:
+                flight.events.append(event)
+                listeners = list(flight.listeners)
+            for listener in listeners:
+                listener.put(event)
+            on_event(*event)
+
+        self._count("calls")
+        try:
+            flight.result = fn(publish if on_event is not None else None)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            self._count("failures")
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _follow(self, flight, listener, on_event):
+        if on_event is None:
+            flight.done.wait()
+            return
+        while True:
+            try:
+                on_event(*listener.get(timeout=0.05))
+            except queue.Empty:
+                if flight.done.is_set():
+                    break
+        while not listener.empty():
+            on_event(*listener.get_nowait())
+
+    def stats(self):
+        """Leader calls, coalesced followers and the share of requests that were coalesced."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = len(self._flights)
+        requests = stats["calls"] + stats["coalesced"]
+        stats["coalesced_ratio"] = stats["coalesced"] / requests if requests else 0.0
+        return stats
+
+
+def get_single_flight(name):
+    """The process's SingleFlight called ``name``"""
+    return registry.shared("single flight", name, SingleFlight)
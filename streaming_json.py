@@ -0,0 +1,125 @@
+"""Incremental parser for a single JSON object arriving in chunks.
+
+Used to paint the analysis as Gemini streams it: every top-level field is
+reported as soon as its value is complete, and items of top-level arrays are
+reported one at a time while the array is still open.
+"""
+import json
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class IncrementalObjectParser:
+    """Feed text chunks, get back ``("field", key, value)`` and ``("item", key, value)`` events.
+
+    Anything before the first ``{`` (for example a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.pos = 0
+        self.state = 'start'  # start -> key -> colon -> value | array -> key ... -> done
+        self.key = None
+        self.items = None  # items parsed so far when the current value is an array
+        self.fields = {}
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        events = []
+        while self._step(events):
+            pass
+        return events
+
+    def _skip_ws(self):
+        while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+            self.pos += 1
+        return self.pos < len(self.buffer)
+
+    def _decode(self, allow_number):
+        """Decode one complete JSON value at ``pos`` or return ``(False, None)`` if incomplete."""
+        try:
+            value, end = _decoder.raw_decode(self.buffer, self.pos)
+        except json.JSONDecodeError:
+            return False, None
+        if not allow_number and not isinstance(value, (str, list, dict)):
+            # Bare numbers/literals may still be growing ("4" -> "45"); need a delimiter after them
+            if end >= len(self.buffer):
+                return False, None
+        self.pos = end
+        return True, value
+
+    def _step(self, events):
+        if self.state == 'done':
+            return False
+
+        if self.state == 'start':
+            start = self.buffer.find('{', self.pos)
+            if start < 0:
+                self.pos = len(self.buffer)
+                return False
+            self.pos = start + 1
+            self.state = 'key'
+            return True
+
+        if not self._skip_ws():
+            return False
+        char = self.buffer[self.pos]
+
+        if self.state == 'key':
+            if char == '}':
+                self.pos += 1
+                self.state = 'done'
+                return False
+            if char == ',':
+                self.pos += 1
+                return True
+            ok, key = self._decode(allow_number=False)
+            if not ok:
+                return False
+            self.key = key
+            self.state = 'colon'
+            return True
+
+        if self.state == 'colon':
+            if char != ':':
+                raise ValueError(f"Expected ':' at position {self.pos}")
+            self.pos += 1
+            self.state = 'value'
+            return True
+
+        if self.state == 'value':
+            if char == '[' and self.items is None:
+                self.pos += 1
+                self.items = []
+                self.state = 'array'
+                return True
+            ok, value = self._decode(allow_number=False)
+            if not ok:
+                return False
+            self._finish_field(value, events)
+            return True
+
+        if self.state == 'array':
+            if char == ']':
+                self.pos += 1
+                value, self.items = self.items, None
+                self._finish_field(value, events)
+                return True
+            if char == ',':
+                self.pos += 1
+                return True
+            ok, item = self._decode(allow_number=False)
+            if not ok:
+                return False
+            self.items.append(item)
+            events.append(('item', self.key, item))
+            return True
+
+        return False
+
+    def _finish_field(self, value, events):
+        self.fields[self.key] = value
+        events.append(('field', self.key, value))
+        self.key = None
+        self.state = 'key'
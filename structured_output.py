@@ -0,0 +1,239 @@
+"""Structured output for the analysis call.
+
+Two layers keep a paid Gemini call from ending up in the local fallback just
+because its answer was not clean JSON:
+
+- ``GENERATION_CONFIG`` asks Gemini for schema-constrained JSON (JSON MIME
+  type plus a response schema for the eleven analysis fields). The schema's
+  properties reach the API as a map, so Gemini emits them alphabetically;
+  streamed calls use ``STREAMING_GENERATION_CONFIG`` instead, which only
+  sets the MIME type and leaves the order to the prompt so the decision
+  fields arrive first,
+- ``parse_analysis()`` runs a tolerant single-pass extractor over whatever
+  came back. It skips prose and code fences before the first ``{``, drops
+  trailing commas, escapes raw newlines inside strings and closes a
+  truncated object at the last complete value. The result is then validated
+  and coerced against the typed field list below.
+
+Parse outcomes are counted per process (see ``stats()``).
+"""
+import json
+import threading
+
+from scoring import LEAVE_TYPES
+
+# field -> (type, required)
+FIELDS = {
+    "wellness_score": (int, True),
+    "leave_type": (str, True),
+    "confidence": (int, True),
+    "main_reason": (str, True),
+    "decision_summary": (str, True),
+    "work_activities": (list, False),
+    "work_avoid": (list, False),
+    "leave_activities": (list, False),
+    "leave_avoid": (list, False),
+    "warning_signs": (list, False),
+    "recovery_estimate": (str, False),
+}
+
+_SCHEMA_TYPES = {int: "integer", str: "string", list: "array"}
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        field: (
+            {"type": "array", "items": {"type": "string"}} if kind is list
+            else {"type": "string", "enum": list(LEAVE_TYPES)} if field == "leave_type"
+            else {"type": _SCHEMA_TYPES[kind]}
+        )
+        for field, (kind, _) in FIELDS.items()
+    },
+    "required": [field for field, (_, required) in FIELDS.items() if required],
+}
+
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": RESPONSE_SCHEMA,
+}
+
+STREAMING_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+}
+
+
+class AnalysisParseError(ValueError):
+    """The response held no usable analysis object."""
+
+
+_lock = threading.Lock()
+_counters = {"responses": 0, "clean": 0, "repaired": 0, "failures": 0}
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def extract_json_object(text):
+    """Return ``(obj, repaired)`` for the first JSON object in ``text``.
+
+    Raises AnalysisParseError if there is no object or it cannot be repaired.
+    """
+    start = text.find('{')
+    if start < 0:
+        raise AnalysisParseError("No JSON object in response")
+
+    out = []
+    stack = []          # '{' / '[' currently open
+    expect_key = []     # per open object: is the next string a key?
+    in_string = escape = False
+    string_is_value = False
+    repaired = False
+    safe = (0, 0)       # (len(out), len(stack)) after the last complete value
+
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+                out.append(char)
+                if string_is_value:
+                    safe = (len(out), len(stack))
+                continue
+            elif char == '\n':
+                out.append('\\n')
+                repaired = True
+                continue
+            elif char in '\r\t':
+                out.append('\\r' if char == '\r' else '\\t')
+                repaired = True
+                continue
+            out.append(char)
+            continue
+
+        if char == '"':
+            in_string = True
+            string_is_value = not (stack and stack[-1] == '{' and expect_key[-1])
+        elif char in '{[':
+            stack.append(char)
+            if char == '{':
+                expect_key.append(True)
+            out.append(char)
+            safe = (len(out), len(stack))
+            continue
+        elif char in '}]':
+            if not stack:
+                break
+            if _drop_trailing_comma(out):
+                repaired = True
+            if stack.pop() == '{':
+                expect_key.pop()
+            out.append('}' if char == '}' else ']')
+            safe = (len(out), len(stack))
+            if not stack:
+                break
+            continue
+        elif char == ',':
+            if _last_significant(out) in ',{[':
+                repaired = True  # doubled or leading comma
+                continue
+            safe = (len(out), len(stack))
+            if stack[-1] == '{':
+                expect_key[-1] = True
+        elif char == ':':
+            if stack[-1] == '{':
+                expect_key[-1] = False
+        out.append(char)
+
+    if stack:
+        # Truncated: cut back to the last complete value and close what is open there
+        # (a dangling key or comma always lies after that point)
+        length, depth = safe
+        del out[length:]
+        out.extend('}' if bracket == '{' else ']' for bracket in reversed(stack[:depth]))
+        repaired = True
+
+    candidate = ''.join(out)
+    try:
+        obj = json.loads(candidate)
+    except json.JSONDecodeError as e:
+        raise AnalysisParseError(f"Unrecoverable JSON: {e}") from e
+    if not isinstance(obj, dict):
+        raise AnalysisParseError("Response is not a JSON object")
+    return obj, repaired
+
+
+def _last_significant(out):
+    for piece in reversed(out):
+        stripped = piece.strip()
+        if stripped:
+            return stripped[-1]
+    return ''
+
+
+def _drop_trailing_comma(out):
+    """Remove a comma directly before a closing bracket; True if there was one"""
+    for index in range(len(out) - 1, -1, -1):
+        if out[index].strip():
+            if out[index] == ',':
+                del out[index]
+                return True
+            return False
+    return False
+
+
+def validate_analysis(obj):
+    """Coerce ``obj`` to the analysis field types; raises AnalysisParseError"""
+    result = {}
+    for field, (kind, required) in FIELDS.items():
+        if field not in obj or obj[field] is None:
+            if required:
+                raise AnalysisParseError(f"Missing required field: {field}")
+            result[field] = [] if kind is list else ""
+            continue
+        value = obj[field]
+        try:
+            if kind is int:
+                value = max(0, min(100, int(round(float(value)))))
+            elif kind is list:
+                if isinstance(value, str):
+                    value = [value]
+                value = [str(item) for item in value if item is not None and str(item).strip()]
+            else:
+                value = str(value).strip()
+        except (TypeError, ValueError) as e:
+            raise AnalysisParseError(f"Bad value for {field}: {value!r}") from e
+        result[field] = value
+
+    leave_type = result["leave_type"].lower().replace('-', '_').replace(' ', '_')
+    if leave_type not in LEAVE_TYPES:
+        raise AnalysisParseError(f"Unknown leave_type: {result['leave_type']!r}")
+    result["leave_type"] = leave_type
+    return result
+
+
+def parse_analysis(response_text):
+    """Extract, repair and validate an analysis from the model's answer"""
+    _count("responses")
+    try:
+        obj, repaired = extract_json_object(response_text)
+        result = validate_analysis(obj)
+    except AnalysisParseError:
+        _count("failures")
+        raise
+    _count("repaired" if repaired else "clean")
+    return result
+
+
+def stats():
+    """Parse outcome counters, including the failure rate."""
+    with _lock:
+        stats = dict(_counters)
+    responses = stats["responses"]
+    stats["failure_rate"] = stats["failures"] / responses if responses else 0.0
+    return stats
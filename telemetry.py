@@ -0,0 +1,267 @@
+"""Latency spans, metrics export and opt-in rerun profiling.
+
+- ``span(name)`` / ``@traced(name)`` time a block or function into a
+  per-name histogram (fixed exponential buckets, so memory stays constant).
+  p50/p95/p99 are estimated from the buckets the way Prometheus'
+  ``histogram_quantile`` does.
+- ``register_collector(name, fn)`` adds the numeric values of ``fn()`` (a
+  ``stats()`` dict) to the export.
+- ``export_text()`` renders everything in the Prometheus text format. It can
+  be served with ``start_http_server(port)`` or written periodically to a file
+  for a textfile collector with ``start_file_writer(path)``.
+- ``profile_rerun(...)`` wraps one Streamlit rerun in cProfile or
+  pyinstrument (optional dependency) and dumps the profile to a directory.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+PREFIX = "leave"
+
+# Upper bounds in seconds: 1 ms .. ~65 s
+BUCKETS = tuple(0.001 * 2 ** i for i in range(17))
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def quantile(self, q):
+        """Estimate by linear interpolation inside the bucket holding the q-th observation"""
+        counts, _, count = self.snapshot()
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+_histograms = {}
+_collectors = {}
+_lock = threading.Lock()
+
+
+def histogram(name):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        return hist
+
+
+@contextmanager
+def span(name):
+    """Time the enclosed block into the ``name`` histogram (also when it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name).observe(time.perf_counter() - started)
+
+
+def traced(name):
+    """Decorator form of ``span``"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_collector(name, collect):
+    """Export the numeric values of ``collect()`` as ``leave_<name>_<key>``"""
+    with _lock:
+        _collectors[name] = collect
+
+
+def quantiles(name):
+    hist = histogram(name)
+    return {f"p{int(q * 100)}": hist.quantile(q) for q in (0.5, 0.95, 0.99)}
+
+
+def _metric_name(*parts):
+    return "_".join(str(part).replace('-', '_').replace('.', '_') for part in parts)
+
+
+def _flatten(prefix, values):
+    for key, value in values.items():
+        if isinstance(value, dict):
+            yield from _flatten(f"{prefix}_{key}", value)
+        elif isinstance(value, bool):
+            yield f"{prefix}_{key}", int(value)
+        elif isinstance(value, (int, float)):
+            yield f"{prefix}_{key}", value
+
+
+def export_text():
+    """All spans and collectors in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        histograms = dict(_histograms)
+        collectors = dict(_collectors)
+
+    metric = f"{PREFIX}_span_seconds"
+    if histograms:
+        lines.append(f"# HELP {metric} Duration of traced spans.")
+        lines.append(f"# TYPE {metric} histogram")
+    for name, hist in sorted(histograms.items()):
+        counts, total, count = hist.snapshot()
+        cumulative = 0
+        for bound, bucket_count in zip(hist.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            le = "+Inf" if bound == math.inf else f"{bound:g}"
+            lines.append(f'{metric}_bucket{{span="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{span="{name}"}} {total:.6f}')
+        lines.append(f'{metric}_count{{span="{name}"}} {count}')
+
+    quantile_metric = f"{PREFIX}_span_quantile_seconds"
+    if histograms:
+        lines.append(f"# HELP {quantile_metric} p50/p95/p99 estimated from the span histogram.")
+        lines.append(f"# TYPE {quantile_metric} gauge")
+    for name, hist in sorted(histograms.items()):
+        for q in (0.5, 0.95, 0.99):
+            value = hist.quantile(q)
+            if value is not None:
+                lines.append(f'{quantile_metric}{{span="{name}",quantile="{q}"}} {value:.6f}')
+
+    for name, collect in sorted(collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            continue
+        for key, value in _flatten(_metric_name(PREFIX, name), values):
+            lines.append(f"{_metric_name(key)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+_servers = {}
+_file_writers = set()
+_servers_lock = threading.Lock()
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve ``export_text()`` at http://host:port/metrics (once per process and port)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/metrics'):
+                self.send_error(404)
+                return
+            body = export_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    with _servers_lock:
+        if port not in _servers:
+            server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            _servers[port] = server
+        return _servers[port]
+
+
+def write_textfile(path):
+    """Atomically write ``export_text()`` to ``path``"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as handle:
+        handle.write(export_text())
+    os.replace(tmp, path)
+
+
+def start_file_writer(path, interval=15.0):
+    """Rewrite ``path`` every ``interval`` seconds (once per process and path)"""
+    with _servers_lock:
+        if path in _file_writers:
+            return
+        _file_writers.add(path)
+
+    def loop():
+        while True:
+            try:
+                write_textfile(path)
+            except OSError:
+                pass
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-file", daemon=True).start()
+
+
+@contextmanager
+def profile_rerun(directory, profiler="cprofile", label="rerun", keep=50):
+    """Profile the enclosed block and dump it to ``directory``.
+
+    ``profiler`` is "cprofile" (``.prof``, open with pstats/snakeviz) or
+    "pyinstrument" (``.html``). Only the newest ``keep`` profiles are kept.
+    """
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{time.perf_counter_ns() % 1000000:06d}"
+    if profiler == "pyinstrument":
+        from pyinstrument import Profiler
+
+        profile = Profiler()
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(os.path.join(directory, f"{label}-{stamp}.html"), "w", encoding="utf-8") as handle:
+                handle.write(profile.output_html())
+    else:
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(os.path.join(directory, f"{label}-{stamp}.prof"))
+
+    dumps = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.startswith(f"{label}-")),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in dumps[:-keep]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,81 @@
+"""Token accounting for Gemini calls.
+
+Every analysis and leave-mail call reports its input/output token counts
+(from the response's ``usage_metadata``) and wall-clock latency here. The
+process-wide ``METER`` aggregates them per call kind; set
+``METER.input_price`` / ``METER.output_price`` (USD per million tokens) to
+get a cost estimate as well. Extra consumers (logging, metrics exporters)
+can subscribe with ``add_hook()``.
+"""
+import threading
+import time
+
+
+def usage_of(response):
+    """``(prompt_tokens, output_tokens)`` of a response or stream chunk, or None"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+    output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+    if not prompt_tokens and not output_tokens:
+        return None
+    return prompt_tokens, output_tokens
+
+
+class TokenMeter:
+    """Per-kind call, token and latency totals."""
+
+    def __init__(self, input_price=0.0, output_price=0.0):
+        self.input_price = input_price
+        self.output_price = output_price
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def record(self, kind, usage, latency):
+        with self._lock:
+            totals = self._kinds.setdefault(
+                kind, {'calls': 0, 'metered_calls': 0, 'prompt_tokens': 0, 'output_tokens': 0, 'latency_s': 0.0}
+            )
+            totals['calls'] += 1
+            totals['latency_s'] += latency
+            if usage is not None:
+                totals['metered_calls'] += 1
+                totals['prompt_tokens'] += usage[0]
+                totals['output_tokens'] += usage[1]
+
+    def stats(self):
+        with self._lock:
+            kinds = {kind: dict(totals) for kind, totals in self._kinds.items()}
+        for totals in kinds.values():
+            metered = totals['metered_calls']
+            totals['mean_latency_ms'] = round(totals.pop('latency_s') / totals['calls'] * 1000, 1)
+            totals['mean_prompt_tokens'] = round(totals['prompt_tokens'] / metered, 1) if metered else None
+            totals['mean_output_tokens'] = round(totals['output_tokens'] / metered, 1) if metered else None
+            cost = (totals['prompt_tokens'] * self.input_price + totals['output_tokens'] * self.output_price) / 1e6
+            totals['cost_usd'] = round(cost, 6)
+            totals['cost_per_call_usd'] = round(cost / metered, 8) if metered else None
+        return kinds
+
+    def reset(self):
+        with self._lock:
+            self._kinds.clear()
+
+
+METER = TokenMeter()
+
+_hooks = []
+
+
+def add_hook(hook):
+    """Call ``hook(kind, prompt_tokens, output_tokens, latency_s)`` after every recorded call"""
+    _hooks.append(hook)
+
+
+def record(kind, usage, started):
+    """Record one finished call; ``started`` is its ``time.perf_counter()`` start"""
+    latency = time.perf_counter() - started
+    METER.record(kind, usage, latency)
+    prompt_tokens, output_tokens = usage if usage is not None else (None, None)
+    for hook in _hooks:
+        hook(kind, prompt_tokens, output_tokens, latency)
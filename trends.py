@@ -0,0 +1,262 @@
+"""Incremental trend analytics over a user's assessment history.
+
+Aggregates are updated once per saved assessment instead of being recomputed
+from the full history on every rerun. Per user we keep:
+
+- daily buckets for the last 30 days, giving 7- and 30-day moving averages of
+  wellness, stress and sleep (the work per update is bounded by the window,
+  not the history length),
+- the current and longest burnout streak (consecutive days with a leave
+  recommendation or a wellness score below ``BURNOUT_SCORE``),
+- how often each leave type has been recommended.
+
+After every update the moving averages for that day are stored as one row
+of ``trend_points``, and the trend chart is drawn from those rows. ``latest()``
+measures the windows and the streak up to the current date, so someone
+coming back after a break does not see figures from weeks ago as current.
+``SharedTrendStore`` keeps the same state on a ``shared_state`` backend.
+"""
+import json
+from datetime import date, timedelta
+from functools import partial
+
+import registry
+import shared_state
+from db import ThreadLocalConnections
+
+WINDOWS = (7, 30)
+BURNOUT_SCORE = 40
+BURNOUT_TYPES = ("full_day_leave", "half_day_leave")
+
+
+def _stress(entry):
+    return (entry['work_pressure'] + entry['personal_stress']) / 2
+
+
+class RollingTrends:
+    """Rolling aggregates for one user; serialisable to a small JSON dict."""
+
+    def __init__(self, state=None):
+        state = state or {}
+        # date -> [count, wellness_sum, stress_sum, sleep_sum]
+        self.buckets = state.get('buckets', {})
+        self.last_date = state.get('last_date')
+        self.streak = state.get('streak', 0)
+        self.longest_streak = state.get('longest_streak', 0)
+        self.streak_date = state.get('streak_date')
+        self.recommendations = state.get('recommendations', {})
+        self.total = state.get('total', 0)
+
+    def add(self, entry):
+        day = date.fromisoformat(entry['date'])
+        if self.last_date is None or day > date.fromisoformat(self.last_date):
+            self.last_date = day.isoformat()
+        newest = date.fromisoformat(self.last_date)
+
+        # Moving-average buckets (late entries older than the widest window only count below)
+        if (newest - day).days < max(WINDOWS):
+            bucket = self.buckets.setdefault(day.isoformat(), [0, 0, 0, 0])
+            bucket[0] += 1
+            bucket[1] += entry['wellness_score']
+            bucket[2] += _stress(entry)
+            bucket[3] += entry['sleep']
+        cutoff = newest - timedelta(days=max(WINDOWS) - 1)
+        for key in [key for key in self.buckets if date.fromisoformat(key) < cutoff]:
+            del self.buckets[key]
+
+        # Burnout streak over consecutive calendar days
+        burnout = entry['recommendation'] in BURNOUT_TYPES or entry['wellness_score'] < BURNOUT_SCORE
+        streak_day = date.fromisoformat(self.streak_date) if self.streak_date else None
+        if burnout:
+            if streak_day == day:
+                self.streak = self.streak or 1
+            elif streak_day is not None and (day - streak_day).days == 1 and self.streak:
+                self.streak += 1
+            elif streak_day is None or day > streak_day:
+                self.streak = 1
+            if streak_day is None or day >= streak_day:
+                self.streak_date = day.isoformat()
+            self.longest_streak = max(self.longest_streak, self.streak)
+        elif streak_day is None or day > streak_day:
+            self.streak = 0
+            self.streak_date = day.isoformat()
+
+        self.recommendations[entry['recommendation']] = self.recommendations.get(entry['recommendation'], 0) + 1
+        self.total += 1
+
+    def moving_averages(self, today=None):
+        """``{window: {'wellness': .., 'stress': .., 'sleep': .., 'count': ..}}`` for the
+        ``window`` days up to ``today`` (default: the latest assessment's date)"""
+        result = {}
+        if self.last_date is None:
+            return result
+        newest = today or date.fromisoformat(self.last_date)
+        for window in WINDOWS:
+            count = wellness = stress = sleep = 0
+            for key, (n, w, s, sl) in self.buckets.items():
+                if 0 <= (newest - date.fromisoformat(key)).days < window:
+                    count += n
+                    wellness += w
+                    stress += s
+                    sleep += sl
+            result[window] = {
+                'count': count,
+                'wellness': round(wellness / count, 1) if count else None,
+                'stress': round(stress / count, 1) if count else None,
+                'sleep': round(sleep / count, 1) if count else None,
+            }
+        return result
+
+    def current_streak(self, today=None):
+        """The burnout streak, or 0 if it has not gone on up to yesterday or ``today``"""
+        if today is None or not self.streak_date:
+            return self.streak
+        return self.streak if (today - date.fromisoformat(self.streak_date)).days <= 1 else 0
+
+    def snapshot(self, today=None):
+        """Aggregates as of ``today``, or of the latest assessment's date if not given"""
+        return {
+            'date': self.last_date,
+            'moving_averages': self.moving_averages(today),
+            'burnout_streak': self.current_streak(today),
+            'longest_burnout_streak': self.longest_streak,
+            'recommendations': dict(self.recommendations),
+            'total': self.total,
+        }
+
+    def to_dict(self):
+        return {
+            'buckets': self.buckets,
+            'last_date': self.last_date,
+            'streak': self.streak,
+            'longest_streak': self.longest_streak,
+            'streak_date': self.streak_date,
+            'recommendations': self.recommendations,
+            'total': self.total,
+        }
+
+
+class TrendStore:
+    """Persists each user's RollingTrends and the daily series used for charts."""
+
+    def __init__(self, path):
+        self._connections = ThreadLocalConnections(path)
+        conn = self._connections.get()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS trend_state ("
+            " user_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS trend_points ("
+            " user_id TEXT NOT NULL,"
+            " date TEXT NOT NULL,"
+            " wellness_7 REAL, wellness_30 REAL,"
+            " stress_7 REAL, stress_30 REAL,"
+            " sleep_7 REAL, sleep_30 REAL,"
+            " burnout_streak INTEGER NOT NULL,"
+            " PRIMARY KEY (user_id, date))"
+        )
+
+    def record(self, user_id, entry):
+        """Fold one new assessment into the user's aggregates and return the snapshot"""
+        conn = self._connections.get()
+        # IMMEDIATE takes the write lock up front so concurrent sessions don't lose updates
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state FROM trend_state WHERE user_id = ?", (user_id,)).fetchone()
+            trends = RollingTrends(json.loads(row[0]) if row else None)
+            trends.add(entry)
+            conn.execute(
+                "INSERT OR REPLACE INTO trend_state (user_id, state) VALUES (?, ?)",
+                (user_id, json.dumps(trends.to_dict(), separators=(',', ':'))),
+            )
+            snapshot = trends.snapshot()
+            averages = snapshot['moving_averages']
+            conn.execute(
+                "INSERT OR REPLACE INTO trend_points VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user_id, snapshot['date'],
+                    averages[7]['wellness'], averages[30]['wellness'],
+                    averages[7]['stress'], averages[30]['stress'],
+                    averages[7]['sleep'], averages[30]['sleep'],
+                    snapshot['burnout_streak'],
+                ),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return snapshot
+
+    def latest(self, user_id, today=None):
+        """The user's aggregates as of ``today`` (default: the current date), or None"""
+        row = self._connections.get().execute(
+            "SELECT state FROM trend_state WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return RollingTrends(json.loads(row[0])).snapshot(today or date.today()) if row else None
+
+    def series(self, user_id, days=90):
+        """Precomputed daily points for the last ``days`` days, oldest first"""
+        rows = self._connections.get().execute(
+            "SELECT date, wellness_7, wellness_30, stress_7, stress_30, sleep_7, sleep_30, burnout_streak"
+            " FROM trend_points WHERE user_id = ? ORDER BY date DESC LIMIT ?",
+            (user_id, days),
+        ).fetchall()
+        columns = ('date', 'wellness_7', 'wellness_30', 'stress_7', 'stress_30',
+                   'sleep_7', 'sleep_30', 'burnout_streak')
+        return [dict(zip(columns, row)) for row in reversed(rows)]
+
+
+class SharedTrendStore:
+    """TrendStore on a shared_state backend (state per user, points in a sorted set by date)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def record(self, user_id, entry):
+        """Fold one new assessment into the user's aggregates and return the snapshot"""
+        folded = {}
+
+        def fold(state):
+            trends = RollingTrends(state)
+            trends.add(entry)
+            folded['snapshot'] = trends.snapshot()
+            return trends.to_dict()
+
+        # Atomic read-modify-write, so concurrent sessions on other replicas don't lose updates
+        self.backend.update(f"trends:{user_id}", fold)
+        snapshot = folded['snapshot']
+        averages = snapshot['moving_averages']
+        day = date.fromisoformat(snapshot['date']).toordinal()
+        point = {
+            'date': snapshot['date'],
+            'wellness_7': averages[7]['wellness'], 'wellness_30': averages[30]['wellness'],
+            'stress_7': averages[7]['stress'], 'stress_30': averages[30]['stress'],
+            'sleep_7': averages[7]['sleep'], 'sleep_30': averages[30]['sleep'],
+            'burnout_streak': snapshot['burnout_streak'],
+        }
+        self.backend.zremrange(f"trend_points:{user_id}", day, day + 1)
+        self.backend.zadd(f"trend_points:{user_id}", day, point)
+        return snapshot
+
+    def latest(self, user_id, today=None):
+        """The user's aggregates as of ``today`` (default: the current date), or None"""
+        state = self.backend.get(f"trends:{user_id}")
+        return RollingTrends(state).snapshot(today or date.today()) if state else None
+
+    def series(self, user_id, days=90):
+        """Precomputed daily points for the last ``days`` days, oldest first"""
+        points = self.backend.zrange(f"trend_points:{user_id}", 0, float('inf'), reverse=True, limit=days)
+        return points[::-1]
+
+
+def _open(path):
+    if shared_state.is_url(path):
+        return SharedTrendStore(shared_state.get_backend(path))
+    return TrendStore(path)
+
+
+def get_trend_store(path):
+    """The process's trend store for ``path``, a SQLite file or a shared_state URL"""
+    return registry.shared("trend store", path, partial(_open, path))
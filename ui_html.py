@@ -0,0 +1,454 @@
+"""HTML templates for the Streamlit page.
+
+All styling lives in one CSS class block (``PAGE_CSS``) that is injected once
+per page, instead of repeating long inline ``style=""`` attributes on every
+element. Templates are compiled once per process when this module is
+imported. Rendered output is memoized per process too: app.py is re-executed
+on every rerun, so these caches have to live outside it.
+"""
+import json
+import re
+from collections import namedtuple
+from functools import lru_cache
+from string import Template
+
+_PAGE_CSS_SOURCE = """
+<style>
+    @import url('https://fonts.googleapis.com/css2?family=Lexend+Deca:wght@300;400;500;600;700&display=swap');
+
+    .stApp {
+        background-color: white;
+        font-family: 'Lexend Deca', sans-serif;
+    }
+
+    .main-title, .subtitle, .section-heading, .decision-card, .list-heading,
+    .do-item, .dont-item, .recommendation, .mail-heading, .weather-card,
+    .loading-box, .footer-note {
+        font-family: 'Lexend Deca', sans-serif !important;
+    }
+
+    .main-title {
+        font-size: 2.5rem !important;
+        font-weight: 600 !important;
+        text-align: center;
+        color: #1a1a1a !important;
+        margin-bottom: 0.5rem;
+    }
+
+    .subtitle {
+        font-size: 1.2rem;
+        text-align: center;
+        color: #666 !important;
+        margin-bottom: 3rem;
+    }
+
+    .section-heading, .list-heading, .mail-heading {
+        color: #1a1a1a !important;
+        font-weight: 600 !important;
+    }
+
+    .mail-heading {
+        margin-top: 2rem;
+    }
+
+    .decision-card {
+        background: #007aff;
+        border-radius: 16px;
+        padding: 2rem;
+        color: white;
+        text-align: center;
+        margin: 2rem 0;
+        box-shadow: 0 4px 20px rgba(0, 122, 255, 0.15);
+    }
+
+    .decision-card h2 {
+        margin: 0;
+        font-weight: 600 !important;
+        color: white !important;
+        font-family: inherit !important;
+    }
+
+    .decision-card .summary {
+        font-size: 1.1rem;
+        opacity: 0.9;
+        margin: 1rem 0;
+        color: white;
+    }
+
+    .decision-card .confidence {
+        font-size: 0.9rem;
+        opacity: 0.8;
+        color: white;
+    }
+
+    .recommendation {
+        background: #f8f9fa;
+        border-radius: 12px;
+        padding: 1.5rem;
+        margin: 1rem 0;
+        color: #1a1a1a;
+        border: 1px solid #dee2e6;
+        font-weight: 500;
+    }
+
+    .recommendation strong {
+        color: #1a1a1a;
+    }
+
+    .do-item {
+        background: #d4edda;
+        border-radius: 8px;
+        padding: 1rem;
+        margin: 0.5rem 0;
+        color: #1a1a1a;
+        font-weight: 500;
+        border-left: 3px solid #28a745;
+    }
+
+    .dont-item {
+        background: #f8d7da;
+        border-radius: 8px;
+        padding: 1rem;
+        margin: 0.5rem 0;
+        color: #1a1a1a;
+        font-weight: 500;
+        border-left: 3px solid #dc3545;
+    }
+
+    .mail-box {
+        background: #f8f9fa;
+        border-radius: 12px;
+        padding: 1.5rem;
+        margin: 1rem 0;
+        border: 1px solid #dee2e6;
+        font-family: 'Courier New', monospace;
+        font-size: 0.9rem;
+        color: #1a1a1a;
+        white-space: pre-line;
+    }
+
+    .weather-card {
+        background: #f8f9fa;
+        border-radius: 12px;
+        padding: 1.5rem;
+        margin: 1rem 0;
+        color: #1a1a1a;
+        text-align: center;
+        border: 1px solid #dee2e6;
+    }
+
+    .weather-card h3 {
+        margin: 0;
+        color: #1a1a1a !important;
+        font-weight: 600 !important;
+        font-family: inherit !important;
+    }
+
+    .weather-card .weather-icon {
+        font-size: 2rem;
+        margin: 0.5rem 0;
+    }
+
+    .weather-card p {
+        font-size: 1.1rem;
+        margin: 0.5rem 0;
+        color: #1a1a1a;
+    }
+
+    .weather-card strong {
+        color: #1a1a1a;
+    }
+
+    @keyframes rain-drop {
+        0% { transform: translateY(-5px); opacity: 0.7; }
+        50% { transform: translateY(2px); opacity: 1; }
+        100% { transform: translateY(-5px); opacity: 0.7; }
+    }
+
+    @keyframes cloud-drift {
+        0% { transform: translateX(-3px); }
+        50% { transform: translateX(3px); }
+        100% { transform: translateX(-3px); }
+    }
+
+    @keyframes sun-glow {
+        0% { transform: scale(1); opacity: 0.8; }
+        50% { transform: scale(1.05); opacity: 1; }
+        100% { transform: scale(1); opacity: 0.8; }
+    }
+
+    @keyframes gentle-float {
+        0% { transform: translateY(-2px); }
+        50% { transform: translateY(2px); }
+        100% { transform: translateY(-2px); }
+    }
+
+    .rain-animation {
+        animation: rain-drop 2s ease-in-out infinite;
+    }
+
+    .cloud-animation {
+        animation: cloud-drift 4s ease-in-out infinite;
+    }
+
+    .sun-animation {
+        animation: sun-glow 3s ease-in-out infinite;
+    }
+
+    .default-animation {
+        animation: gentle-float 3s ease-in-out infinite;
+    }
+
+    .loading-box {
+        text-align: center;
+        padding: 1rem;
+        background: #f8f9fa;
+        border-radius: 8px;
+        margin: 1rem 0;
+        border: 1px solid #dee2e6;
+    }
+
+    .loading-box .spinner {
+        display: inline-block;
+        width: 16px;
+        height: 16px;
+        border: 2px solid #007aff;
+        border-radius: 50%;
+        border-top-color: transparent;
+        animation: spin 1s linear infinite;
+        margin-right: 8px;
+    }
+
+    .loading-box span {
+        color: #1a1a1a;
+        font-size: 0.9rem;
+    }
+
+    @keyframes spin {
+        to { transform: rotate(360deg); }
+    }
+
+    .footer-note {
+        text-align: center;
+        color: #666;
+        font-size: 0.9rem;
+        padding: 1.5rem;
+    }
+
+    .footer-note strong {
+        color: #666;
+    }
+
+    .stButton > button,
+    .stFormSubmitButton > button {
+        width: 100%;
+        background: #007aff;
+        color: white;
+        border: none;
+        border-radius: 12px;
+        padding: 1rem;
+        font-weight: 600;
+        font-size: 1rem;
+        margin-top: 1.5rem;
+        font-family: 'Lexend Deca', sans-serif;
+    }
+
+    /* Fix for input labels to be black */
+    .stSelectbox label,
+    .stSlider label,
+    .stSelectbox > div > label,
+    .stSlider > div > label,
+    label[data-testid="stWidgetLabel"] {
+        color: #1a1a1a !important;
+        font-family: 'Lexend Deca', sans-serif !important;
+        font-weight: 500 !important;
+    }
+
+    /* Additional targeting for labels */
+    .stSelectbox > label,
+    .stSlider > label {
+        color: #1a1a1a !important;
+    }
+</style>
+"""
+
+
+def _compact_css(css):
+    """Drop comments and indentation; the block is resent on every rerun"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return re.sub(r'\s+', ' ', css).strip()
+
+
+PAGE_CSS = _compact_css(_PAGE_CSS_SOURCE)
+
+# Compiled once per process
+_HEADER = Template('<h1 class="main-title">$title</h1><p class="subtitle">$subtitle</p>')
+_WEATHER_CARD = Template(
+    '<div class="weather-card"><h3>Tomorrow\'s Weather in $place</h3>'
+    '<div class="weather-icon $animation">$icon</div>'
+    '<p><strong>$temp_high°C / $temp_low°C</strong><br>$condition • $rain_chance% chance of rain</p></div>'
+)
+_SECTION_HEADING = Template('<h3 class="section-heading">$text</h3>')
+_DECISION_CARD = Template('<div class="decision-card"><h2>$title</h2><p class="summary">$summary</p>$confidence</div>')
+_CONFIDENCE = Template('<p class="confidence">Confidence: $confidence%</p>')
+_LIST_HEADING = Template('<p class="list-heading">$text</p>')
+_ITEM = Template('<div class="$css_class">$item</div>')
+_WARNING_SIGNS = Template('<div class="recommendation"><strong>Watch for these warning signs:</strong><br>$signs</div>')
+_RECOVERY = Template('<div class="recommendation"><strong>Expected recovery time:</strong> $estimate</div>')
+_MAIL_BOX = Template('<div class="mail-box">$text</div>')
+_COPY_BUTTON = Template("""
+<div>
+  <button id="copyBtn" style="background:#007aff;color:#fff;border:none;border-radius:8px;padding:8px 12px;font-weight:600;cursor:pointer;">📋 Copy Email</button>
+  <span id="copyStatus" style="margin-left:8px;color:#1a1a1a;font-size:0.9rem;"></span>
+</div>
+<script>
+  const text = $text;
+  const btn = document.getElementById('copyBtn');
+  const status = document.getElementById('copyStatus');
+  btn.addEventListener('click', async () => {
+    try {
+      await navigator.clipboard.writeText(text);
+      status.textContent = 'Copied!';
+      setTimeout(() => status.textContent = '', 2000);
+    } catch (e) {
+      status.textContent = 'Copy failed. Please select and copy manually.';
+    }
+  });
+</script>
+""")
+
+MAIL_HEADING = '<h4 class="mail-heading">📧 AI-Generated Leave Application</h4>'
+LOADING = '<div class="loading-box"><div class="spinner"></div><span>Analyzing...</span></div>'
+FOOTER = (
+    '<div class="footer-note"><strong>Your wellbeing matters.</strong> This tool provides guidance, not medical advice.<br>'
+    'For serious mental health concerns, please consult a healthcare professional.</div>'
+)
+
+_ITEM_CLASSES = {'do': 'do-item', 'avoid': 'dont-item'}
+
+
+def page_css():
+    return PAGE_CSS
+
+
+@lru_cache(maxsize=1)
+def header_html():
+    return _HEADER.substitute(
+        title="Should I Take Leave Tomorrow?",
+        subtitle="AI-powered decision making for your work-life balance",
+    )
+
+
+def weather_icon(condition):
+    """Icon and animation class for a forecast summary"""
+    condition = condition.lower()
+    if 'rain' in condition or 'shower' in condition:
+        return "🌧️", "rain-animation"
+    elif 'cloud' in condition:
+        return "☁️", "cloud-animation"
+    elif 'sun' in condition or 'clear' in condition:
+        return "☀️", "sun-animation"
+    return "🌤️", "default-animation"
+
+
+@lru_cache(maxsize=256)
+def weather_card_html(temp_high, temp_low, condition, rain_chance, place="Dhaka"):
+    icon, animation_class = weather_icon(condition)
+    return _WEATHER_CARD.substitute(
+        place=place, icon=icon, animation=animation_class, temp_high=temp_high,
+        temp_low=temp_low, condition=condition, rain_chance=rain_chance,
+    )
+
+
+@lru_cache(maxsize=32)
+def section_heading_html(text):
+    return _SECTION_HEADING.substitute(text=text)
+
+
+def loading_html():
+    return LOADING
+
+
+@lru_cache(maxsize=512)
+def decision_card_html(decision_text, decision_summary, confidence):
+    confidence_html = _CONFIDENCE.substitute(confidence=confidence) if confidence is not None else ''
+    return _DECISION_CARD.substitute(title=decision_text, summary=decision_summary, confidence=confidence_html)
+
+
+@lru_cache(maxsize=16)
+def list_heading_html(text):
+    return _LIST_HEADING.substitute(text=text)
+
+
+@lru_cache(maxsize=2048)
+def item_html(kind, item):
+    return _ITEM.substitute(css_class=_ITEM_CLASSES[kind], item=item)
+
+
+def item_list_html(kind, items):
+    """All items of one list as a single HTML block (one element instead of one per item)"""
+    return ''.join(item_html(kind, item) for item in items)
+
+
+@lru_cache(maxsize=512)
+def warning_signs_html(signs):
+    return _WARNING_SIGNS.substitute(signs=' • '.join(signs))
+
+
+@lru_cache(maxsize=256)
+def recovery_html(estimate):
+    return _RECOVERY.substitute(estimate=estimate)
+
+
+def mail_heading_html():
+    return MAIL_HEADING
+
+
+def mail_box_html(text):
+    # Not memoized: streamed mail text changes on every chunk
+    return _MAIL_BOX.substitute(text=text)
+
+
+@lru_cache(maxsize=256)
+def copy_button_html(text):
+    return _COPY_BUTTON.substitute(text=json.dumps(text))
+
+
+def footer_html():
+    return FOOTER
+
+
+AnalysisHtml = namedtuple('AnalysisHtml', 'card left right warnings recovery mail')
+
+_LEAVE_TYPES = ('full_day_leave', 'half_day_leave')
+
+
+def analysis_html(analysis, decision_text, leave_mail=None):
+    """Every HTML block of the results panel, memoized on the analysis content"""
+    key = json.dumps(analysis, sort_keys=True, ensure_ascii=False)
+    return _analysis_html(key, decision_text, leave_mail)
+
+
+@lru_cache(maxsize=512)
+def _analysis_html(analysis_key, decision_text, leave_mail):
+    analysis = json.loads(analysis_key)
+    if analysis['leave_type'] in _LEAVE_TYPES:
+        left = list_heading_html("Recovery Activities:") + item_list_html('do', analysis.get('leave_activities', []))
+        right = list_heading_html("Avoid During Leave:") + item_list_html('avoid', analysis.get('leave_avoid', []))
+    else:
+        left = list_heading_html("If You Work Tomorrow:") + item_list_html('do', analysis.get('work_activities', []))
+        right = list_heading_html("Avoid While Working:") + item_list_html('avoid', analysis.get('work_avoid', []))
+    warnings = warning_signs_html(tuple(analysis['warning_signs'])) if analysis.get('warning_signs') else None
+    recovery = recovery_html(analysis['recovery_estimate']) if analysis.get('recovery_estimate') else None
+    mail = None
+    if analysis['leave_type'] in _LEAVE_TYPES and leave_mail:
+        mail = MAIL_HEADING + mail_box_html(leave_mail)
+    return AnalysisHtml(
+        card=decision_card_html(decision_text, analysis['decision_summary'], analysis['confidence']),
+        left=left,
+        right=right,
+        warnings=warnings,
+        recovery=recovery,
+        mail=mail,
+    )
@@ -0,0 +1,152 @@
+"""Process-wide forecast cache shared by every Streamlit session.
+
+Streamlit re-executes app.py on every rerun, so anything that has to survive
+between reruns (and be shared between sessions) lives in this module instead.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ForecastCache:
+    """TTL cache keyed by (lat, lon, forecast date) with stale-while-revalidate.
+
+    - Fresh entries (younger than ``ttl``) are served straight from memory.
+    - Stale entries (younger than ``ttl + stale_ttl``) are served immediately
+      while a single background thread refreshes them.
+    - Misses are single-flight: concurrent callers for the same key wait for
+      one upstream request instead of each firing their own.
+    - With ``shared`` (a shared_state backend) set, a miss first looks for a
+      fresh forecast another replica fetched, and every fetch is published
+      there, so N replicas make one upstream request per cell, not N.
+    """
+
+    def __init__(self, ttl=1800, stale_ttl=6 * 3600, max_entries=256, shared=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (fetched_at, value)
+        self._inflight = {}  # key -> threading.Event
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "stale_hits": 0, "misses": 0, "shared_hits": 0, "refreshes": 0, "errors": 0}
+
+    def get(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` when needed.
+
+        ``loader`` must raise on failure; failures are never cached.
+        """
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    age = now - entry[0]
+                    if age < self.ttl:
+                        self._entries.move_to_end(key)
+                        self._counters["hits"] += 1
+                        return entry[1]
+                    if age < self.ttl + self.stale_ttl:
+                        self._entries.move_to_end(key)
+                        self._counters["stale_hits"] += 1
+                        if key not in self._refreshing:
+                            self._refreshing.add(key)
+                            threading.Thread(
+                                target=self._refresh, args=(key, loader), daemon=True
+                            ).start()
+                        return entry[1]
+
+                event = self._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    self._counters["misses"] += 1
+                    owner = True
+                else:
+                    owner = False
+
+            if not owner:
+                # Someone else is fetching this key; wait and re-check the cache
+                event.wait()
+                with self._lock:
+                    if key not in self._entries:
+                        # The owner failed; surface that to the caller rather than stampeding
+                        raise LookupError(f"forecast unavailable for {key}")
+                continue
+
+            try:
+                return self._load(key, loader)
+            except Exception:
+                with self._lock:
+                    self._counters["errors"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+    def _load(self, key, loader):
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(_shared_key(key))
+            except Exception:
+                entry = None  # the upstream API is still there
+            if entry is not None and time.time() - entry[0] < self.ttl:
+                age = max(0.0, time.time() - entry[0])
+                self._store(key, entry[1], age)
+                with self._lock:
+                    self._counters["shared_hits"] += 1
+                return entry[1]
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def _refresh(self, key, loader):
+        try:
+            self.put(key, loader())
+            with self._lock:
+                self._counters["refreshes"] += 1
+        except Exception:
+            with self._lock:
+                self._counters["errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def put(self, key, value):
+        """Store a freshly fetched value (also used by the bulk prefetcher)"""
+        self._store(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(_shared_key(key), [time.time(), value], ttl=self.ttl + self.stale_ttl)
+            except Exception:
+                pass
+
+    def _store(self, key, value, age=0.0):
+        with self._lock:
+            self._entries[key] = (time.monotonic() - age, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Hit/miss/refresh counters plus the current number of entries."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _shared_key(key):
+    return "forecast:" + ":".join(str(part) for part in key)
+
+
+# One cache per process, shared by all sessions
+FORECAST_CACHE = ForecastCache()
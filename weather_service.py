@@ -0,0 +1,237 @@
+"""Location-aware forecasts with grid snapping and a scheduled bulk prefetch.
+
+- Users pick their office location; coordinates are snapped to a grid
+  (``GRID_DEGREES``, about 11 km) so everyone in the same cell shares one
+  cache entry and upstream calls grow with the number of distinct cells,
+  not the number of users.
+- Every lookup marks its cell as active. A ``Prefetcher`` fetches all
+  configured and recently active cells concurrently over one pooled HTTP
+  session, at startup and at the scheduled times before the morning peak,
+  shortly before midnight (when the cached date moves on) and often enough
+  that entries never expire, so user requests are served from the cache
+  instead of waiting on the API.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+
+import registry
+import telemetry
+from weather_cache import FORECAST_CACHE
+
+GRID_DEGREES = 0.1
+
+# name -> (lat, lon); the app can override this with the WEATHER_LOCATIONS secret
+LOCATIONS = {
+    "Dhaka": (23.8103, 90.4125),
+    "Chattogram": (22.3569, 91.7832),
+    "Sylhet": (24.8949, 91.8687),
+    "Khulna": (22.8456, 89.5403),
+    "Rajshahi": (24.3745, 88.6042),
+}
+DEFAULT_LOCATION = "Dhaka"
+
+DEFAULT_FORECAST = {
+    "temp_high": 30,
+    "temp_low": 24,
+    "condition": "Partly cloudy",
+    "rain_chance": 20
+}
+
+
+def snap(lat, lon, grid=GRID_DEGREES):
+    """Centre of the grid cell containing (lat, lon)"""
+    return round(round(lat / grid) * grid, 4), round(round(lon / grid) * grid, 4)
+
+
+def forecast_date(now=None):
+    return ((now or datetime.now()) + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+class WeatherClient:
+    """Pirate Weather client on one pooled ``requests.Session``."""
+
+    def __init__(self, api_key, timeout=3, pool_size=16, base_url="https://api.pirateweather.net"):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                import requests  # only needed once something is fetched
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    @telemetry.traced("weather_fetch")
+    def fetch(self, lat, lon, days_ahead=1):
+        """Fetch the forecast for ``days_ahead`` days from today, tomorrow by default (raises on failure)"""
+        url = f"{self.base_url}/forecast/{self.api_key}/{lat},{lon}"
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        tomorrow = data["daily"]["data"][days_ahead] if "daily" in data else data["currently"]
+        return {
+            "temp_high": round((tomorrow.get("temperatureHigh", 85) - 32) * 5/9),
+            "temp_low": round((tomorrow.get("temperatureLow", 75) - 32) * 5/9),
+            "condition": tomorrow.get("summary", "Partly cloudy"),
+            "rain_chance": round(tomorrow.get("precipProbability", 0) * 100)
+        }
+
+
+class ActiveCells:
+    """Grid cells looked up recently, for the prefetcher."""
+
+    def __init__(self, max_idle=7 * 24 * 3600):
+        self.max_idle = max_idle
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def touch(self, cell):
+        with self._lock:
+            self._seen[cell] = time.time()
+
+    def cells(self):
+        cutoff = time.time() - self.max_idle
+        with self._lock:
+            for cell in [cell for cell, seen in self._seen.items() if seen < cutoff]:
+                del self._seen[cell]
+            return list(self._seen)
+
+
+ACTIVE_CELLS = ActiveCells()
+
+
+def get_forecast(client, lat, lon, cache=FORECAST_CACHE, grid=GRID_DEGREES):
+    """Tomorrow's forecast for the grid cell of (lat, lon), through the shared cache"""
+    cell = snap(lat, lon, grid)
+    ACTIVE_CELLS.touch(cell)
+    return cache.get((*cell, forecast_date()), lambda: client.fetch(*cell))
+
+
+class Prefetcher:
+    """Fetches every known cell concurrently at startup and at the given local times each day.
+
+    Between those runs it also keeps the cache from running dry:
+    - ``rollover_lead`` seconds before midnight it fetches the forecast that
+      becomes "tomorrow's" at midnight, since the cache key holds the date,
+    - it refreshes before ``cache.ttl + cache.stale_ttl / 2`` has passed,
+      so entries are fresh or stale (served at once) but never expired.
+    """
+
+    def __init__(self, client, locations=None, times=("07:30",), cache=FORECAST_CACHE,
+                 grid=GRID_DEGREES, concurrency=8, rollover_lead=600, retry_delay=300):
+        self.client = client
+        self.locations = dict(locations or LOCATIONS)
+        self.times = sorted(times)
+        self.cache = cache
+        self.grid = grid
+        self.concurrency = concurrency
+        self.rollover_lead = rollover_lead
+        self.retry_delay = retry_delay
+        self._fetched = {}  # forecast date -> when it was last prefetched
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {"runs": 0, "fetched": 0, "errors": 0}
+        self.last_run = None
+        self.last_duration = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+                self._thread.start()
+        return self
+
+    def cells(self):
+        configured = {snap(lat, lon, self.grid) for lat, lon in self.locations.values()}
+        return sorted(configured | set(ACTIVE_CELLS.cells()))
+
+    def prefetch(self, date=None):
+        """Fetch all cells now (concurrently) for the forecast ``date``, tomorrow by default, into the cache"""
+        started = time.monotonic()
+        now = datetime.now()
+        date = date or forecast_date(now)
+        days_ahead = (datetime.fromisoformat(date).date() - now.date()).days
+        cells = self.cells()
+
+        def fetch(cell):
+            try:
+                self.cache.put((*cell, date), self.client.fetch(*cell, days_ahead=days_ahead))
+                return True
+            except Exception:
+                return False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="weather-fetch") as pool:
+            results = list(pool.map(fetch, cells))
+        with self._lock:
+            self._counters["runs"] += 1
+            self._counters["fetched"] += sum(results)
+            self._counters["errors"] += len(results) - sum(results)
+            self.last_run = now.isoformat(timespec='seconds')
+            self.last_duration = round(time.monotonic() - started, 3)
+            if any(results) or not results:
+                self._fetched[date] = now
+            else:
+                # Nothing could be fetched: try again after retry_delay rather than a full refresh interval
+                self._fetched[date] = now - self.refresh_every() + timedelta(seconds=self.retry_delay)
+            for old in [old for old in self._fetched if old < forecast_date(now)]:
+                del self._fetched[old]
+        return sum(results), len(results)
+
+    def refresh_every(self):
+        """Longest gap between prefetches of a date, well before its entries expire"""
+        return timedelta(seconds=self.cache.ttl + self.cache.stale_ttl / 2)
+
+    def next_run(self, now=None):
+        """(seconds until the next prefetch, forecast date it fetches)"""
+        now = now or datetime.now()
+        tomorrow = forecast_date(now)
+        runs = []
+        for value in self.times:
+            hour, minute = map(int, value.split(':'))
+            at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            runs.append((at if at > now else at + timedelta(days=1), None))
+        with self._lock:
+            fetched = dict(self._fetched)
+        runs.append((fetched[tomorrow] + self.refresh_every() if tomorrow in fetched else now, tomorrow))
+        midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        after_midnight = forecast_date(midnight)
+        if after_midnight not in fetched:
+            runs.append((max(now, midnight - timedelta(seconds=self.rollover_lead)), after_midnight))
+        at, date = min(runs, key=lambda run: run[0])
+        return max(0.0, (at - now).total_seconds()), date
+
+    def _run(self):
+        while True:
+            delay, date = self.next_run()
+            time.sleep(delay)
+            self.prefetch(date)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats["last_run"] = self.last_run
+            stats["last_duration_s"] = self.last_duration
+        stats["cells"] = len(self.cells())
+        return stats
+
+
+def _start(api_key, base_url, **kwargs):
+    return Prefetcher(WeatherClient(api_key, base_url=base_url), **kwargs).start()
+
+
+def get_prefetcher(api_key, base_url="https://api.pirateweather.net", **kwargs):
+    """The process's prefetcher for ``base_url``, started on first use"""
+    # The API key is compared like an option instead of being part of the registry key
+    return registry.shared("weather prefetcher", base_url, partial(_start, base_url=base_url), api_key=api_key, **kwargs)